@@ -0,0 +1,1030 @@
+from typing import Callable
+from collections.abc import Mapping
+from functools import partial
+import numpy as np
+from numpy import ndarray
+from .utils import get_similar_year_rankings, Properties
+from . import kernels
+from .parallel import share_array, attach_shared_array, map_batches
+from .percentiles import SortedSamples, DROUGHT_SEVERITY_PERCENTILES, TERCILE_PERCENTILES
+
+# Number of places computed at once, which bounds the memory of the
+# temporary places x years x sub-periods arrays
+BLOCK_PLACES = 4096
+
+# Sub-periods of the curve statistics that an output can read on their own
+CURRENT_SUB_PERIOD = 'current'
+LAST_SUB_PERIOD = 'last'
+
+# Parameters that define the seasons of the places, every result depends on
+# them
+SEASON_PARAMETERS = ('period_unit', 'cross_years', 'is_forecast', 'precision', 'mask_missing_data',
+                     'max_missing_periods', 'min_valid_years')
+# In the masked mode, the gaps are checked and filled over the monitoring
+# season and the climatology, so the seasons depend on them too
+MASKED_SEASON_PARAMETERS = ('season_start', 'season_end', 'climatology_start', 'climatology_end')
+
+# Parameters that each part of the results depends on, see
+# `get_invalidated_results`
+RESULT_DEPENDENCIES = {
+    'seasons': SEASON_PARAMETERS,
+    'similar years': SEASON_PARAMETERS + ('use_pearson',),
+    'selected years': SEASON_PARAMETERS + ('use_pearson', 'selected_years'),
+    'accumulations': SEASON_PARAMETERS + ('season_start', 'season_end'),
+    'current accumulations': SEASON_PARAMETERS + ('season_start', 'season_end'),
+    'climatology years': SEASON_PARAMETERS + ('climatology_start', 'climatology_end'),
+    'climatology stats': SEASON_PARAMETERS + ('season_start', 'season_end', 'climatology_start', 'climatology_end'),
+    # the shared statistics of the selected years are those of the climatology
+    'selected stats': SEASON_PARAMETERS + ('season_start', 'season_end', 'climatology_start', 'climatology_end',
+                                           'use_pearson', 'selected_years'),
+}
+
+# Parts of the results that depend on the current season, computed again
+# when sub-periods are appended to it, see `Dataset.update`. The climatology
+# years and the normals over them are kept while the windows do not change
+CURRENT_SEASON_RESULTS = ('similar years', 'selected years', 'current accumulations', 'climatology stats', 'selected stats')
+
+def get_invalidated_results(previous, parameters) -> set[str]:
+    """Returns the parts of the results of a dataset that change with its 
+    parameters.
+
+    Args:
+        previous (Parameters): The parameters of the computed results.
+        parameters (Parameters): The new parameters.
+
+    Returns:
+        set[str]: The parts of `RESULT_DEPENDENCIES` to be computed again, 
+            the rest can be reused.
+    """
+    changed = {name for names in RESULT_DEPENDENCIES.values() for name in names
+               if getattr(previous, name) != getattr(parameters, name)}
+    if parameters.mask_missing_data and changed.intersection(MASKED_SEASON_PARAMETERS):
+        return set(RESULT_DEPENDENCIES)
+    return {part for part, names in RESULT_DEPENDENCIES.items() if changed.intersection(names)}
+
+# Inputs given by `BatchedStats.get_block_stats` for a block of places and a
+# subset of years, the rest are computed from the registry
+BLOCK_INPUTS = ('all accumulations', 'all ensembles', 'seasons', 'current seasons', 'current accumulations',
+                'forecast values', 'valid seasons', 'sub-periods', 'indexes', 'counts')
+
+def get_subset_indexes(masks: ndarray) -> tuple[ndarray, ndarray]:
+    """Converts the boolean masks of a subset of years to padded indexes.
+
+    Args:
+        masks (ndarray): Boolean array of shape (places, years), True for the
+            years in the subset of each place.
+
+    Returns:
+        indexes (ndarray): Array of shape (places, max. subset size) with the
+            indexes of the years of each subset in year order, padded with
+            the index of a year out of the subset.
+        counts (ndarray): Size of the subset of each place.
+    """
+    counts = np.count_nonzero(masks, axis=1)
+    subset_size = counts.max() if counts.size > 0 else 0
+    indexes = np.argsort(~masks, axis=1, kind='stable')[:, :subset_size]
+    return indexes, counts
+
+def gather_subset(data: ndarray, indexes: ndarray, counts: ndarray) -> ndarray:
+    """Gathers the years of a subset from an array of places by years.
+
+    Args:
+        data (ndarray): Array of shape (places, years, ...).
+        indexes (ndarray): Padded indexes returned by `get_subset_indexes`.
+        counts (ndarray): Subset sizes returned by `get_subset_indexes`.
+
+    Returns:
+        ndarray: Array of shape (places, max. subset size, ...), with NaN in
+            the padding of the smaller subsets. It is a view of `data` when
+            every place has the same range of consecutive years, as the
+            climatology usually is.
+    """
+    if indexes.shape[0] > 0 and indexes.shape[1] > 0:
+        first, size = indexes[0, 0], indexes.shape[1]
+        if np.all(counts == size) and np.all(indexes == np.arange(first, first + size)):
+            return data[:, first:first+size]
+    indexes = indexes.reshape(indexes.shape + (1,) * (data.ndim - 2))
+    return pad_subset(np.take_along_axis(data, indexes, axis=1), counts)
+
+def pad_subset(subset: ndarray, counts: ndarray) -> ndarray:
+    """Sets to NaN, in place, the padding of the smaller subsets of an array.
+
+    Args:
+        subset (ndarray): Array of shape (places, max. subset size, ...).
+        counts (ndarray): Subset sizes returned by `get_subset_indexes`.
+
+    Returns:
+        ndarray: `subset`.
+    """
+    padding = np.arange(subset.shape[1]) >= counts[:, np.newaxis]
+    if padding.any():
+        subset[padding] = np.nan
+    return subset
+
+def accumulate(values: ndarray, axis: int) -> ndarray:
+    """Cumulative sum along an axis, accumulated in float64 and returned in 
+    the dtype of `values`.
+
+    The sums are computed over blocks of places, so a reduced-precision 
+    array never has a float64 copy of its whole size.
+
+    Args:
+        values (ndarray): Array whose first axis is the place.
+        axis (int): Axis of the sum.
+
+    Returns:
+        ndarray: Array of the shape and dtype of `values`.
+    """
+    if values.dtype == np.float64:
+        return np.cumsum(values, axis=axis)
+    accumulations = np.empty(values.shape, dtype=values.dtype)
+    for start in range(0, values.shape[0], BLOCK_PLACES):
+        block = slice(start, start + BLOCK_PLACES)
+        accumulations[block] = np.cumsum(values[block], axis=axis, dtype=np.float64)
+    return accumulations
+
+def get_mean(values: ndarray, ragged: bool) -> ndarray:
+    """Mean over the years, accumulated in float64 and returned in the dtype 
+    of `values`."""
+    return (np.nanmean if ragged else np.mean)(values, axis=1, dtype=np.float64).astype(values.dtype, copy=False)
+
+def get_std(values: ndarray, ragged: bool) -> ndarray:
+    """Standard deviation over the years, accumulated in float64 and 
+    returned in the dtype of `values`."""
+    return (np.nanstd if ragged else np.std)(values, axis=1, dtype=np.float64).astype(values.dtype, copy=False)
+
+def get_ensembles(current_accumulations: ndarray, seasons: ndarray, use_numba=False) -> ndarray:
+    """Batched version of `get_ensemble`, from the accumulated current season.
+
+    An ensemble trace is the accumulation of the current season up to its 
+    last sub-period, followed by the cumulative sum of the rest of a past 
+    season from the current total. The sums are added in the order of 
+    `get_ensemble`, so the NumPy traces have the same bits, which matters 
+    when the ensemble medians tie with the season totals.
+
+    Args:
+        current_accumulations (ndarray): Array of shape (places, current
+            length) with the accumulated current season of each place.
+        seasons (ndarray): Array of shape (places, years, sub-periods) with
+            the values of the seasons.
+        use_numba (bool, optional): Whether to use the compiled kernel of 
+            `kernels.get_ensembles` when numba is installed, whose traces 
+            match up to rounding. Defaults to False.
+
+    Returns:
+        ndarray: Array of the shape of `seasons` with the ensemble of the
+            current season of each place with each of its seasons.
+    """
+    if use_numba and kernels.is_available():
+        return kernels.get_ensembles(current_accumulations, seasons)
+    current_length = current_accumulations.shape[1]
+    if current_length == 0:
+        return accumulate(seasons, axis=2)
+    ensembles = np.empty(seasons.shape, dtype=current_accumulations.dtype)
+    ensembles[:, :, :current_length] = current_accumulations[:, np.newaxis, :]
+    tails = np.empty(seasons.shape[:2] + (seasons.shape[2] - current_length + 1,), dtype=seasons.dtype)
+    tails[:, :, 0] = current_accumulations[:, np.newaxis, -1]
+    tails[:, :, 1:] = seasons[:, :, current_length:]
+    ensembles[:, :, current_length-1:] = accumulate(tails, axis=2)
+    return ensembles
+
+class StatsRequest:
+    """The statistics read by the outputs of a run.
+
+    Attributes:
+        names (frozenset[str]): Names of the statistics, as in `place_stats`.
+        sub_periods (frozenset[str] | None): Sub-periods of the curve
+            statistics that are read, `CURRENT_SUB_PERIOD` and/or
+            `LAST_SUB_PERIOD`, or None for the whole curves.
+    """
+    def __init__(self, names, sub_periods=None) -> None:
+        """Constructor
+
+        Args:
+            names (Iterable[str]): Names of the statistics.
+            sub_periods (Iterable[str], optional): Sub-periods of the curve
+                statistics that are read. Defaults to None, meaning all of
+                them.
+        """
+        self.names = frozenset(names)
+        self.sub_periods = None if sub_periods is None else frozenset(sub_periods)
+
+    def __or__(self, other: 'StatsRequest') -> 'StatsRequest':
+        """Returns the request of the statistics read by either output."""
+        sub_periods = [request.sub_periods for request in (self, other) if request.names]
+        if any(request_sub_periods is None for request_sub_periods in sub_periods):
+            return StatsRequest(self.names | other.names)
+        return StatsRequest(self.names | other.names, frozenset().union(*sub_periods))
+
+    def covers(self, other: 'StatsRequest') -> bool:
+        """Whether the statistics of another request are all in this one."""
+        if not other.names <= self.names:
+            return False
+        return self.sub_periods is None or (other.sub_periods is not None and other.sub_periods <= self.sub_periods)
+
+class StatDefinition:
+    """A statistic, or an intermediate array, and the inputs it is computed 
+    from.
+
+    Attributes:
+        name (str): Name of the statistic.
+        inputs (tuple[str]): Names of the statistics, intermediate arrays or
+            `BLOCK_INPUTS` passed to `function`, in order.
+        function (Callable): Function that computes the statistic for a block
+            of places.
+        shared (bool): Whether it does not depend on the subset of years, so
+            it is computed once over the climatology for both subsets.
+        curve (bool): Whether it has one value per sub-period of the season,
+            so it can be computed for some sub-periods only.
+        stored (bool): Whether it is a statistic of the places, or an
+            intermediate array that is discarded.
+    """
+    def __init__(self, name: str, inputs: tuple, function: Callable, shared: bool, curve: bool, stored: bool) -> None:
+        """Constructor"""
+        self.name = name
+        self.inputs = inputs
+        self.function = function
+        self.shared = shared
+        self.curve = curve
+        self.stored = stored
+
+# The statistics and intermediate arrays, in the order they are stored
+STAT_REGISTRY: dict[str, StatDefinition] = {}
+
+def register_stat(name: str, inputs: tuple, function: Callable, shared=False, curve=False, stored=True) -> None:
+    """Adds a statistic to `STAT_REGISTRY`, see `StatDefinition`."""
+    STAT_REGISTRY[name] = StatDefinition(name, tuple(inputs), function, shared, curve, stored)
+
+def resolve_stats(names) -> list[str]:
+    """Returns the statistics and intermediate arrays needed to compute some
+    statistics, each one after its inputs.
+
+    Args:
+        names (Iterable[str]): Names of the statistics.
+
+    Raises:
+        ValueError: If a statistic is not registered.
+
+    Returns:
+        list[str]: Names in the order they must be computed.
+    """
+    order = []
+    def visit(name):
+        if name in BLOCK_INPUTS or name in order:
+            return
+        if name not in STAT_REGISTRY:
+            raise ValueError(f'Unknown statistic: {name}')
+        for input_name in STAT_REGISTRY[name].inputs:
+            visit(input_name)
+        order.append(name)
+    for name in names:
+        visit(name)
+    return order
+
+def get_all_stats_request() -> StatsRequest:
+    """Returns the request of all the stored statistics, with whole curves."""
+    return StatsRequest(name for name, definition in STAT_REGISTRY.items() if definition.stored)
+
+def take_sub_periods(values: ndarray, sub_periods: ndarray | slice) -> ndarray:
+    """Returns some sub-periods of an array of places by years by sub-periods.
+
+    `np.take` keeps the sub-periods as the contiguous axis, so the reductions
+    over the years add the values in the same order as over the whole array.
+    """
+    if isinstance(sub_periods, slice):
+        return values[:, :, sub_periods]
+    return np.take(values, sub_periods, axis=2)
+
+def get_ensemble_probabilities(ensemble_sums: ndarray, seasonal_pctls: ndarray, counts: ndarray) -> ndarray:
+    """Returns the fraction of the ensemble below, between and above the
+    terciles of each place."""
+    lower_pctls, upper_pctls = seasonal_pctls[:, [0]], seasonal_pctls[:, [1]]
+    return np.stack([
+        np.count_nonzero(ensemble_sums < lower_pctls, axis=1) / counts,
+        np.count_nonzero((ensemble_sums >= lower_pctls) & (ensemble_sums < upper_pctls), axis=1) / counts,
+        np.count_nonzero(ensemble_sums >= upper_pctls, axis=1) / counts,
+    ], axis=1)
+
+def get_sum_samples(accumulations: ndarray, sub_period: int, valid_seasons: ndarray) -> SortedSamples:
+    """Returns the sorted accumulations of all the valid seasons up to a
+    sub-period."""
+    sums = accumulations[:, :, sub_period]
+    ignore_nan = not valid_seasons.all()
+    if ignore_nan:
+        sums = np.where(valid_seasons, sums, np.nan)
+    return SortedSamples(sums, ignore_nan)
+
+def get_current_sum_samples(accumulations: ndarray, current_accumulations: ndarray, valid_seasons: ndarray) -> SortedSamples:
+    """Returns the sorted accumulations of all the valid seasons up to the
+    current sub-period."""
+    return get_sum_samples(accumulations, current_accumulations.shape[1]-1, valid_seasons)
+
+# intermediate arrays of a subset of years, the arrays of the subset are
+# views or gathers of the arrays of all the seasons
+register_stat('ragged', ('indexes', 'counts'), lambda indexes, counts: bool(np.any(counts != indexes.shape[1])), stored=False)
+register_stat('accumulations', ('all accumulations', 'sub-periods', 'indexes', 'counts'),
+              lambda accumulations, sub_periods, indexes, counts: gather_subset(take_sub_periods(accumulations, sub_periods), indexes, counts), stored=False)
+register_stat('ensembles', ('all ensembles', 'sub-periods', 'indexes', 'counts'),
+              lambda ensembles, sub_periods, indexes, counts: gather_subset(take_sub_periods(ensembles, sub_periods), indexes, counts), stored=False)
+register_stat('ensemble sums', ('ensembles',), lambda ensembles: ensembles[:, :, -1], stored=False)
+register_stat('samples', ('accumulations', 'ragged'), lambda accumulations, ragged: SortedSamples(accumulations[:, :, -1], ragged), stored=False)
+register_stat('current sum samples', ('all accumulations', 'current accumulations', 'valid seasons'), get_current_sum_samples, shared=True, stored=False)
+
+# statistics of the places
+register_stat('Current Season Pctl.', ('current sum samples', 'Current Season Accumulation'),
+              lambda samples, current_accumulations: samples.percentiles_of(current_accumulations[:, -1]), shared=True)
+register_stat('Drought Severity Pctls.', ('current sum samples',), lambda samples: samples.values_at(DROUGHT_SEVERITY_PERCENTILES), shared=True)
+register_stat('Pctls.', ('samples',), lambda samples: samples.values_at(TERCILE_PERCENTILES), shared=True)
+register_stat('Median', ('accumulations', 'ragged'),
+              lambda accumulations, ragged: (np.nanmedian if ragged else np.median)(accumulations, axis=1), curve=True)
+register_stat('LTA', ('accumulations', 'ragged'), get_mean, curve=True)
+register_stat('C. Dk./LTA', ('Current Season Accumulation', 'LTA'),
+              lambda current_accumulations, lta: current_accumulations/lta[:, :current_accumulations.shape[1]])
+register_stat('Avg.', ('seasons', 'indexes', 'counts', 'ragged'),
+              lambda seasons, indexes, counts, ragged: get_mean(gather_subset(seasons, indexes, counts), ragged), shared=True)
+register_stat('Ensemble Med.', ('ensembles', 'ragged'),
+              lambda ensembles, ragged: (np.nanmedian if ragged else np.median)(ensembles, axis=1), curve=True)
+register_stat('E. LTA', ('ensembles', 'ragged'), get_mean, curve=True)
+register_stat('Ensemble Med./LTA', ('Ensemble Med.', 'LTA'), lambda ensemble_median, lta: ensemble_median/lta)
+register_stat('Ensemble Med. Pctl.', ('samples', 'Ensemble Med.'), lambda samples, ensemble_median: samples.percentiles_of(ensemble_median[:, -1]))
+register_stat('E. Pctls.', ('ensemble sums', 'ragged'), lambda sums, ragged: SortedSamples(sums, ragged).values_at(TERCILE_PERCENTILES))
+register_stat('E. Probabilities', ('ensemble sums', 'Pctls.', 'counts'), get_ensemble_probabilities)
+register_stat('St. Dev.', ('accumulations', 'ragged'), get_std, curve=True)
+register_stat('Current Season', ('current seasons',), lambda current_seasons: current_seasons, shared=True)
+register_stat('Current Season Accumulation', ('current accumulations',), lambda current_accumulations: current_accumulations, shared=True)
+register_stat('forecast', ('forecast values',), lambda forecast_values: forecast_values, shared=True)
+
+# Statistics over the climatology that only depend on the past seasons, so
+# they can be computed once and reused while the current season goes on, see
+# `BatchedStats.get_normals`
+NORMAL_STATS = ('Pctls.', 'Median', 'LTA', 'Avg.', 'St. Dev.')
+# Statistics over all the past seasons up to the current sub-period, which
+# are kept for every sub-period of the season
+SUB_PERIOD_NORMAL_STATS = ('Drought Severity Pctls.',)
+
+class StatsTable(Mapping):
+    """The statistics of all the places, stored as one array per statistic
+    whose first axis is the place.
+
+    It maps the names of the statistics to their arrays, so a statistic can
+    be sliced for all the places at once, and `row` gives the statistics of
+    a single place without copying them.
+
+    Attributes:
+        columns (dict[str, ndarray]): Array of each statistic, in the order
+            of `STAT_REGISTRY`.
+    """
+    __slots__ = ('columns',)
+
+    def __init__(self, columns: dict[str, ndarray]=None) -> None:
+        """Constructor
+
+        Args:
+            columns (dict[str, ndarray], optional): Array of each statistic.
+                Defaults to None, meaning an empty table.
+        """
+        self.columns = {} if columns is None else columns
+
+    def __getitem__(self, name: str) -> ndarray:
+        return self.columns[name]
+
+    def __iter__(self):
+        return iter(self.columns)
+
+    def __len__(self) -> int:
+        return len(self.columns)
+
+    def row(self, row: int) -> 'StatsRow':
+        """Returns the statistics of the place of a row."""
+        return StatsRow(self, row)
+
+class StatsRow(Mapping):
+    """The statistics of one place, as views of the rows of a `StatsTable`.
+
+    Attributes:
+        table (StatsTable): The statistics of all the places.
+        row (int): Row of the place.
+    """
+    __slots__ = ('table', 'row')
+
+    def __init__(self, table: StatsTable, row: int) -> None:
+        """Constructor"""
+        self.table = table
+        self.row = row
+
+    def __getitem__(self, name: str) -> ndarray:
+        return self.table.columns[name][self.row]
+
+    def __iter__(self):
+        return iter(self.table.columns)
+
+    def __len__(self) -> int:
+        return len(self.table.columns)
+
+class SeasonRows(Mapping):
+    """The seasons of one place in an array of places by years, by year ID.
+
+    Attributes:
+        values (ndarray): Array of shape (years, sub-periods) of the place.
+        year_ids (list[str]): IDs of the years of the second axis.
+        indexes (ndarray): Indexes of the years that are mapped.
+    """
+    __slots__ = ('values', 'year_ids', 'indexes')
+
+    def __init__(self, values: ndarray, year_ids: list[str], indexes: ndarray) -> None:
+        """Constructor"""
+        self.values = values
+        self.year_ids = year_ids
+        self.indexes = indexes
+
+    def __getitem__(self, year_id: str) -> ndarray:
+        index = self.year_ids.index(year_id)
+        if index not in self.indexes:
+            raise KeyError(year_id)
+        return self.values[index]
+
+    def __iter__(self):
+        return (self.year_ids[i] for i in self.indexes)
+
+    def __len__(self) -> int:
+        return len(self.indexes)
+
+    def items(self):
+        return ((self.year_ids[i], self.values[i]) for i in self.indexes)
+
+class DatasetLayout:
+    """The parts of a dataset that define its seasons, sent to the workers
+    that compute batches of its places instead of the whole dataset.
+
+    It has the attributes of `Dataset` read by `BatchedStats`.
+    """
+    def __init__(self, dataset) -> None:
+        """Constructor
+
+        Args:
+            dataset (Dataset): The dataset.
+        """
+        properties = dataset.properties
+        self.properties = Properties({
+            'year_ids': properties.year_ids,
+            'climatology_year_ids': properties.climatology_year_ids,
+            'selected_years': properties.selected_years,
+        })
+        self.parameters = dataset.parameters
+        self.season_shift = dataset.season_shift
+        self.climatology_end_index = dataset.climatology_end_index
+        self.split_quantity = dataset.split_quantity
+        self.season_start_index = dataset.season_start_index
+        self.season_end_index = dataset.season_end_index
+        self.current_season_trim_index = dataset.current_season_trim_index
+
+def compute_batch(layout: DatasetLayout, values: ndarray, valid_seasons: ndarray, required_stats: 'StatsRequest',
+                  normals: dict=None) -> dict:
+    """Computes the statistics of a batch of places, see 
+    `BatchedStats.get_results`."""
+    return BatchedStats(layout, values, valid_seasons, required_stats, normals=normals).get_results()
+
+def compute_shared_batch(handle: tuple, layout: DatasetLayout, required_stats: 'StatsRequest', batch: tuple) -> dict:
+    """Computes, in a worker process, the statistics of a batch of places of 
+    a value matrix in shared memory.
+
+    Args:
+        handle (tuple): Handle of the value matrix, see `share_array`.
+        layout (DatasetLayout): The seasons of the dataset.
+        required_stats (StatsRequest): The statistics to be computed.
+        batch (tuple): The rows of the batch, their valid seasons and their 
+            normals.
+
+    Returns:
+        dict: See `BatchedStats.get_results`.
+    """
+    rows, valid_seasons, normals = batch
+    shared_memory, values = attach_shared_array(handle)
+    try:
+        # only the rows of the batch are copied, so that the results do not 
+        # hold views of the shared memory once it is closed
+        values = values[rows].copy()
+    finally:
+        shared_memory.close()
+    return compute_batch(layout, values, valid_seasons, required_stats, normals)
+
+def set_subset_masks(masks: ndarray, indexes: ndarray, counts: ndarray) -> None:
+    """Sets, in place, the boolean masks of the subsets of years given by 
+    `get_subset_indexes`."""
+    in_subset = np.arange(indexes.shape[1]) < counts[:, np.newaxis]
+    rows = np.broadcast_to(np.arange(counts.size)[:, np.newaxis], indexes.shape)
+    masks[rows[in_subset], indexes[in_subset]] = True
+
+class BatchedStats:
+    """The statistics of all the places of a dataset, computed at once.
+
+    The dataset is reshaped into a cube of places by years by sub-periods,
+    and the statistics of `Place.get_stats` are computed with axis-wise
+    operations over blocks of places. Every statistic is an array whose first
+    axis is the place, so the statistics of a place are views of its rows.
+    Only the requested statistics and their inputs in `STAT_REGISTRY` are
+    computed.
+
+    The places can also be split into batches computed by a pool of threads
+    or processes, which give the same results as the serial computation.
+    When the statistics of the same values were computed with other
+    parameters, only the parts of the results that depend on the changed
+    parameters are computed again, see `RESULT_DEPENDENCIES`. The normals of
+    the past seasons, see `NORMAL_STATS`, can also be given instead of being
+    computed.
+
+    Attributes:
+        similar_indexes (ndarray): Indexes of the years of each place ranked
+            by similarity to the current season, padded with -1.
+        similar_counts (ndarray): Number of ranked years of each place.
+        selected_indexes (ndarray): Padded indexes of the selected years of
+            each place, in year order.
+        selected_counts (ndarray): Number of selected years of each place.
+        seasonal_accumulations (ndarray): Accumulations of the monitoring
+            season of every year, of shape (places, years, sub-periods).
+        seasonal_ensembles (ndarray): Ensembles of the current season with
+            every year, of shape (places, years, sub-periods).
+        stat_order (list[str]): The statistics and intermediate arrays that
+            are computed, in order.
+        sub_periods (ndarray | slice): Sub-periods of the season over which
+            the curve statistics are computed, the rest are NaN.
+        place_stats (StatsTable): Statistics over the climatology.
+        selected_years_place_stats (StatsTable): Statistics over the selected
+            years.
+        normals (dict[str, ndarray]): The given normals, see `get_normals`.
+    """
+    def __init__(self, parent, values: ndarray, valid_seasons: ndarray=None, required_stats: StatsRequest=None,
+                 executor='serial', max_workers: int=None, batch_places: int=BLOCK_PLACES, results: dict=None,
+                 previous: 'BatchedStats'=None, normals: dict[str, ndarray]=None, invalidated: set[str]=None) -> None:
+        """Constructor
+
+        Args:
+            parent (Dataset | DatasetLayout): The dataset, which defines the 
+                seasons.
+            values (ndarray): Value matrix of shape (places, timestamps).
+            valid_seasons (ndarray, optional): Boolean array of shape
+                (places, years), True for the seasons used in the statistics.
+                Defaults to None, meaning all of them.
+            required_stats (StatsRequest, optional): The statistics read by
+                the outputs. Defaults to None, meaning all of them.
+            executor (str, optional): How the places are computed, one of 
+                `EXECUTOR_TYPES`. Defaults to 'serial'.
+            max_workers (int, optional): Maximum number of threads or 
+                processes. Defaults to the number of CPUs.
+            batch_places (int, optional): Number of places of each batch of 
+                the thread and process executors, rounded up to a multiple of 
+                `BLOCK_PLACES` so that the blocks are those of the serial 
+                computation. Defaults to BLOCK_PLACES.
+            results (dict, optional): Results of a previous computation of 
+                the same values and request, see `get_results`, which are 
+                restored instead of being computed. Defaults to None.
+            previous (BatchedStats, optional): The statistics of the same 
+                values computed with other parameters, whose parts that do 
+                not depend on the changed parameters are reused. They are 
+                computed serially. Defaults to None.
+            normals (dict[str, ndarray], optional): Normals of the same past 
+                seasons, see `get_normals`, which are used instead of being 
+                computed. Defaults to None.
+            invalidated (set[str], optional): Parts of `previous` computed 
+                again besides those that depend on the changed parameters, 
+                e.g. `CURRENT_SEASON_RESULTS` when the current season has new 
+                sub-periods. Defaults to None.
+        """
+        self.parent = parent
+        self.normals = {} if normals is None else normals
+        place_count = values.shape[0]
+        year_ids = parent.properties.year_ids
+        self.seasons = values[:, parent.season_shift:parent.climatology_end_index].reshape(place_count, parent.split_quantity, -1)
+        self.current_seasons = values[:, parent.climatology_end_index:]
+        if parent.parameters.is_forecast:
+            self.forecast_values = self.current_seasons[:, -1:]
+            self.current_seasons = self.current_seasons[:, :-1]
+        else:
+            self.forecast_values = np.full((place_count, 1), None, dtype=object)
+        self.monitoring_seasons = self.seasons[:, :, parent.season_start_index:parent.season_end_index]
+        self.current_monitoring_seasons = self.current_seasons[:, parent.season_start_index:parent.current_season_trim_index]
+        self.valid_seasons = np.ones((place_count, len(year_ids)), dtype=bool) if valid_seasons is None else valid_seasons
+
+        if required_stats is None:
+            required_stats = get_all_stats_request()
+        self.required_stats = required_stats
+        self.stat_order = resolve_stats(required_stats.names)
+        self.sub_periods = self.get_sub_period_indexes(required_stats.sub_periods)
+
+        if previous is None:
+            invalidated = set(RESULT_DEPENDENCIES)
+        else:
+            invalidated = get_invalidated_results(previous.parent.parameters, parent.parameters).union(invalidated or ())
+        batch_places = -(-max(batch_places, 1) // BLOCK_PLACES) * BLOCK_PLACES
+        if results is not None:
+            self.merge_batches([slice(None)], [results])
+        elif 'seasons' not in invalidated:
+            self.compute_stats(previous, invalidated)
+        elif executor == 'serial' or place_count <= batch_places:
+            self.compute_stats()
+        else:
+            self.compute_batches(values, executor, max_workers, batch_places)
+
+    def compute_stats(self, previous: 'BatchedStats'=None, invalidated: set[str]=None) -> None:
+        """Computes the year subsets and the statistics of all the places.
+
+        Args:
+            previous (BatchedStats, optional): The statistics of the same 
+                values computed with other parameters. Defaults to None.
+            invalidated (set[str], optional): The parts of `previous` that 
+                are computed again, see `get_invalidated_results`. Defaults 
+                to None.
+        """
+        parent = self.parent
+        place_count = self.valid_seasons.shape[0]
+        year_ids = parent.properties.year_ids
+        if previous is None:
+            invalidated = set(RESULT_DEPENDENCIES)
+
+        # year subsets
+        if 'similar years' in invalidated:
+            self.similar_indexes, self.similar_counts = self.rank_similar_years()
+        else:
+            self.similar_indexes, self.similar_counts = previous.similar_indexes, previous.similar_counts
+        if 'selected years' in invalidated:
+            selected_masks = np.zeros((place_count, len(year_ids)), dtype=bool)
+            if isinstance(parent.properties.selected_years, str):
+                similar_indexes = self.similar_indexes[:, :int(parent.properties.selected_years)]
+                rows = np.broadcast_to(np.arange(place_count)[:, np.newaxis], similar_indexes.shape)
+                selected_masks[rows[similar_indexes >= 0], similar_indexes[similar_indexes >= 0]] = True
+            else:
+                selected_masks[:] = np.isin(year_ids, parent.properties.selected_years)
+            selected_masks &= self.valid_seasons
+            self.selected_indexes, self.selected_counts = get_subset_indexes(selected_masks)
+        else:
+            self.selected_indexes, self.selected_counts = previous.selected_indexes, previous.selected_counts
+        if 'climatology years' in invalidated:
+            climatology_masks = np.isin(year_ids, parent.properties.climatology_year_ids)[np.newaxis, :] & self.valid_seasons
+            self.climatology_indexes, self.climatology_counts = get_subset_indexes(climatology_masks)
+        else:
+            self.climatology_indexes, self.climatology_counts = previous.climatology_indexes, previous.climatology_counts
+
+        if 'accumulations' in invalidated:
+            self.seasonal_accumulations = accumulate(self.monitoring_seasons, axis=2)
+        else:
+            self.seasonal_accumulations = previous.seasonal_accumulations
+        if 'accumulations' in invalidated or 'current accumulations' in invalidated:
+            self.current_accumulations = accumulate(self.current_monitoring_seasons, axis=1)
+            self.seasonal_ensembles = get_ensembles(self.current_accumulations, self.monitoring_seasons, parent.parameters.use_numba)
+        else:
+            self.current_accumulations = previous.current_accumulations
+            self.seasonal_ensembles = previous.seasonal_ensembles
+
+        # the statistics are reused when they were computed for at least the 
+        # requested ones, in the same order as if they were computed
+        stored_names = [name for name in STAT_REGISTRY if name in self.stat_order and STAT_REGISTRY[name].stored]
+        climatology_columns = None
+        if 'climatology stats' not in invalidated and previous.required_stats.covers(self.required_stats):
+            climatology_columns = {name: previous.place_stats[name] for name in stored_names}
+            if 'selected stats' not in invalidated:
+                self.place_stats = StatsTable(climatology_columns)
+                self.selected_years_place_stats = StatsTable({name: previous.selected_years_place_stats[name] for name in stored_names})
+                return
+        self.place_stats = StatsTable(None if climatology_columns is None else dict(climatology_columns))
+        self.selected_years_place_stats = StatsTable()
+        for start in range(0, place_count, BLOCK_PLACES):
+            block = slice(start, start + BLOCK_PLACES)
+            self.store_stats(block, *self.get_block_stats(block, climatology_columns), climatology_columns is None)
+
+    def compute_batches(self, values: ndarray, executor: str, max_workers: int, batch_places: int) -> None:
+        """Computes the places in batches with a pool of workers and gathers 
+        their results in the order of the batches.
+
+        The process workers read the value matrix from shared memory, so it 
+        is copied once instead of once per batch.
+
+        Args:
+            values (ndarray): Value matrix of shape (places, timestamps).
+            executor (str): 'thread' or 'process'.
+            max_workers (int): Maximum number of workers.
+            batch_places (int): Number of places of each batch.
+        """
+        place_count = values.shape[0]
+        batches = [slice(start, start + batch_places) for start in range(0, place_count, batch_places)]
+        layout = DatasetLayout(self.parent)
+        if executor != 'process':
+            function = lambda batch: compute_batch(layout, values[batch], self.valid_seasons[batch], self.required_stats,
+                                                   self.get_batch_normals(batch))
+            self.merge_batches(batches, map_batches(function, batches, executor, max_workers))
+            return
+        shared_memory, handle = share_array(values)
+        try:
+            function = partial(compute_shared_batch, handle, layout, self.required_stats)
+            jobs = [(batch, self.valid_seasons[batch], self.get_batch_normals(batch)) for batch in batches]
+            self.merge_batches(batches, map_batches(function, jobs, executor, max_workers))
+        finally:
+            shared_memory.close()
+            shared_memory.unlink()
+
+    def get_batch_normals(self, batch: slice) -> dict[str, ndarray]:
+        """Returns the normals of a batch of places."""
+        return {name: normals[batch] for name, normals in self.normals.items()}
+
+    def get_results(self) -> dict:
+        """Returns the computed arrays, to be merged by `merge_batches` or 
+        restored later with the `results` argument."""
+        return {
+            'similar_indexes': self.similar_indexes,
+            'similar_counts': self.similar_counts,
+            'selected_indexes': self.selected_indexes,
+            'selected_counts': self.selected_counts,
+            'climatology_indexes': self.climatology_indexes,
+            'climatology_counts': self.climatology_counts,
+            'seasonal_accumulations': self.seasonal_accumulations,
+            'current_accumulations': self.current_accumulations,
+            'seasonal_ensembles': self.seasonal_ensembles,
+            'place_stats': self.place_stats.columns,
+            'selected_years_place_stats': self.selected_years_place_stats.columns,
+        }
+
+    def merge_batches(self, batches: list[slice], results) -> None:
+        """Gathers the results of the batches into arrays of all the places.
+
+        The padded indexes of the year subsets are rebuilt for all the places, 
+        since their width depends on the largest subset of each batch.
+
+        Args:
+            batches (list[slice]): Rows of each batch.
+            results (Iterable[dict]): Results of each batch, in the same order.
+        """
+        place_count, year_count = self.valid_seasons.shape
+        selected_masks = np.zeros((place_count, year_count), dtype=bool)
+        climatology_masks = np.zeros((place_count, year_count), dtype=bool)
+        merged = {}
+        self.place_stats = StatsTable()
+        self.selected_years_place_stats = StatsTable()
+        for batch, result in zip(batches, results):
+            for key in ('similar_indexes', 'similar_counts', 'seasonal_accumulations', 'current_accumulations', 'seasonal_ensembles'):
+                value = result[key]
+                if key not in merged:
+                    merged[key] = np.empty((place_count,) + value.shape[1:], dtype=value.dtype)
+                merged[key][batch] = value
+            set_subset_masks(selected_masks[batch], result['selected_indexes'], result['selected_counts'])
+            set_subset_masks(climatology_masks[batch], result['climatology_indexes'], result['climatology_counts'])
+            self.store_stats(batch, result['place_stats'], result['selected_years_place_stats'])
+        self.similar_indexes, self.similar_counts = merged['similar_indexes'], merged['similar_counts']
+        self.seasonal_accumulations = merged['seasonal_accumulations']
+        self.current_accumulations = merged['current_accumulations']
+        self.seasonal_ensembles = merged['seasonal_ensembles']
+        self.selected_indexes, self.selected_counts = get_subset_indexes(selected_masks)
+        self.climatology_indexes, self.climatology_counts = get_subset_indexes(climatology_masks)
+
+    def store_stats(self, block: slice, climatology_stats: dict, selected_stats: dict, store_climatology=True) -> None:
+        """Stores the statistics of a block of places in the tables of all 
+        the places.
+
+        Args:
+            block (slice): Rows of the places.
+            climatology_stats (dict): Statistics of the block over the 
+                climatology.
+            selected_stats (dict): Statistics of the block over the selected 
+                years.
+            store_climatology (bool, optional): Whether to store the 
+                climatology statistics, which are otherwise already in 
+                `place_stats`. Defaults to True.
+        """
+        place_count = self.valid_seasons.shape[0]
+        place_columns, selected_columns = self.place_stats.columns, self.selected_years_place_stats.columns
+        if store_climatology:
+            for key, value in climatology_stats.items():
+                if key not in place_columns:
+                    place_columns[key] = np.empty((place_count,) + value.shape[1:], dtype=value.dtype)
+                place_columns[key][block] = value
+        for key, value in selected_stats.items():
+            if value is climatology_stats[key]:
+                # the statistics shared by both subsets are stored once
+                selected_columns[key] = place_columns[key]
+                continue
+            if key not in selected_columns:
+                selected_columns[key] = np.empty((place_count,) + value.shape[1:], dtype=value.dtype)
+            selected_columns[key][block] = value
+
+    def rank_similar_years(self) -> tuple[ndarray, ndarray]:
+        """Ranks the valid years of every place by similarity to its current 
+        season.
+
+        The places whose valid years differ are ranked in groups of the same 
+        number of valid years, so each ranking is the one `get_similar_years` 
+        gives for the valid years of the place.
+
+        Returns:
+            indexes (ndarray): Array of shape (places, years) with the indexes 
+                of the years of each place from the most to the least similar, 
+                padded with -1.
+            counts (ndarray): Number of ranked years of each place.
+        """
+        use_pearson = self.parent.parameters.use_pearson
+        use_numba = self.parent.parameters.use_numba
+        place_count, year_count = self.valid_seasons.shape
+        rankings = np.full((place_count, year_count), -1, dtype=np.int64)
+        valid_indexes, valid_counts = get_subset_indexes(self.valid_seasons)
+        for count in np.unique(valid_counts):
+            rows = np.flatnonzero(valid_counts == count)
+            for start in range(0, rows.size, BLOCK_PLACES):
+                block = rows[start:start + BLOCK_PLACES]
+                indexes = valid_indexes[block, :count]
+                seasons = np.take_along_axis(self.seasons[block], indexes[:, :, np.newaxis], axis=1)
+                block_rankings = get_similar_year_rankings(self.current_seasons[block], seasons, use_pearson, use_numba)
+                rankings[block, :count] = np.take_along_axis(indexes, block_rankings, axis=1)
+        return rankings, valid_counts
+
+    def get_similar_seasons(self, row: int) -> list[str]:
+        """Returns the years of a place ranked by similarity."""
+        year_ids = self.parent.properties.year_ids
+        return [year_ids[i] for i in self.similar_indexes[row, :self.similar_counts[row]]]
+
+    def get_selected_years(self, row: int) -> list[str]:
+        """Returns the selected years of a place."""
+        selected_years = self.parent.properties.selected_years
+        if isinstance(selected_years, str):
+            return self.get_similar_seasons(row)[:int(selected_years)]
+        return selected_years
+
+    def get_sub_period_indexes(self, sub_periods) -> ndarray | slice:
+        """Returns the indexes in the season of the requested sub-periods.
+
+        The last sub-period is always included, since the season totals are 
+        computed from it, and so is the first one.
+
+        Args:
+            sub_periods (frozenset[str] | None): Requested sub-periods, see 
+                `StatsRequest`.
+
+        Returns:
+            ndarray | slice: Sorted indexes of the sub-periods, or a slice of 
+                all of them.
+        """
+        if sub_periods is None:
+            return slice(None)
+        indexes = {self.monitoring_seasons.shape[2]-1}
+        current_index = self.current_monitoring_seasons.shape[1]-1
+        if CURRENT_SUB_PERIOD in sub_periods and current_index >= 0:
+            indexes.add(current_index)
+        # numpy sums a single sub-period along the years in another order, 
+        # which would change the last digits of the statistics
+        indexes.add(0)
+        return np.array(sorted(indexes))
+
+    def get_block_stats(self, block: slice, climatology_columns: dict=None) -> tuple[dict, dict]:
+        """Computes the statistics of a block of places.
+
+        The shared statistics are computed over the climatology and reused by 
+        the selected years.
+
+        Args:
+            block (slice): Rows of the places.
+            climatology_columns (dict, optional): The climatology statistics 
+                of all the places, when they are reused instead of being 
+                computed. Defaults to None.
+
+        Returns:
+            tuple: The climatology and selected years statistics of the block.
+        """
+        block_inputs = {
+            'all accumulations': self.seasonal_accumulations[block],
+            'all ensembles': self.seasonal_ensembles[block],
+            'seasons': self.seasons[block],
+            'current seasons': self.current_seasons[block],
+            'current accumulations': self.current_accumulations[block],
+            'forecast values': self.forecast_values[block],
+            'valid seasons': self.valid_seasons[block],
+            'sub-periods': self.sub_periods,
+        }
+        if climatology_columns is None:
+            climatology_stats = {**block_inputs, 'indexes': self.climatology_indexes[block], 'counts': self.climatology_counts[block]}
+            climatology_stats.update(self.get_block_normals(block))
+            climatology_stats = self.evaluate_stats(climatology_stats)
+        else:
+            climatology_stats = {name: column[block] for name, column in climatology_columns.items()}
+        selected_stats = {**block_inputs, 'indexes': self.selected_indexes[block], 'counts': self.selected_counts[block]}
+        # the shared intermediates of reused statistics are computed again
+        selected_stats.update((name, climatology_stats[name]) for name in self.stat_order
+                              if STAT_REGISTRY[name].shared and name in climatology_stats)
+        selected_stats = self.evaluate_stats(selected_stats)
+        return ({name: climatology_stats[name] for name in STAT_REGISTRY if name in climatology_stats and STAT_REGISTRY[name].stored},
+                {name: selected_stats[name] for name in STAT_REGISTRY if name in selected_stats and STAT_REGISTRY[name].stored})
+
+    def get_block_normals(self, block: slice) -> dict[str, ndarray]:
+        """Returns the given normals of a block of places that are 
+        requested, as if they were computed by `evaluate_stats`."""
+        block_normals = {}
+        for name, normals in self.normals.items():
+            if name not in self.stat_order:
+                continue
+            if name in SUB_PERIOD_NORMAL_STATS:
+                normals = normals[:, self.current_accumulations.shape[1]-1]
+            normals = normals[block]
+            if STAT_REGISTRY[name].curve and isinstance(self.sub_periods, ndarray):
+                normals = self.expand_curve(normals[:, self.sub_periods])
+            block_normals[name] = normals
+        return block_normals
+
+    def get_normals(self, sub_period_normals=True) -> dict[str, ndarray]:
+        """Returns the normals computed for all the places, which were not 
+        given.
+
+        They are the `NORMAL_STATS` of `place_stats`, the curves only when 
+        they were computed over all the sub-periods, and the 
+        `SUB_PERIOD_NORMAL_STATS` at every sub-period of the season, of 
+        shape (places, sub-periods, ...). They only depend on the past 
+        seasons, so they can be given to the computations of the following 
+        sub-periods of the current season.
+
+        Args:
+            sub_period_normals (bool, optional): Whether to compute the 
+                `SUB_PERIOD_NORMAL_STATS` that were not given. Defaults to 
+                True.
+
+        Returns:
+            dict[str, ndarray]: The normals by statistic name.
+        """
+        normals = {}
+        for name in NORMAL_STATS:
+            if name in self.normals or name not in self.place_stats:
+                continue
+            if STAT_REGISTRY[name].curve and not isinstance(self.sub_periods, slice):
+                continue
+            normals[name] = self.place_stats[name]
+        if sub_period_normals and 'Drought Severity Pctls.' in self.place_stats and 'Drought Severity Pctls.' not in self.normals:
+            normals['Drought Severity Pctls.'] = self.get_drought_severity_normals()
+        return normals
+
+    def get_drought_severity_normals(self) -> ndarray:
+        """Computes the Drought Severity Pctls. at every sub-period of the 
+        season, over the same blocks of places as `get_block_stats`.
+
+        Returns:
+            ndarray: Array of shape (places, sub-periods, percentiles).
+        """
+        place_count, _, season_length = self.seasonal_accumulations.shape
+        normals = None
+        for start in range(0, place_count, BLOCK_PLACES):
+            block = slice(start, start + BLOCK_PLACES)
+            for sub_period in range(season_length):
+                samples = get_sum_samples(self.seasonal_accumulations[block], sub_period, self.valid_seasons[block])
+                value = samples.values_at(DROUGHT_SEVERITY_PERCENTILES)
+                if normals is None:
+                    normals = np.empty((place_count, season_length) + value.shape[1:], dtype=value.dtype)
+                normals[block, sub_period] = value
+        if normals is None:
+            normals = np.empty((place_count, season_length, len(DROUGHT_SEVERITY_PERCENTILES)))
+        return normals
+
+    def expand_curve(self, value: ndarray) -> ndarray:
+        """Returns a curve computed over `sub_periods` with all the 
+        sub-periods of the season, the rest being NaN."""
+        curve = np.full((value.shape[0], self.seasonal_accumulations.shape[2]), np.nan)
+        curve[:, self.sub_periods] = value
+        return curve
+
+    def evaluate_stats(self, context: dict) -> dict:
+        """Computes, in place, the statistics of `stat_order` missing from a 
+        context.
+
+        Args:
+            context (dict): The `BLOCK_INPUTS` of a block of places and a 
+                subset of years, and the statistics already computed.
+
+        Returns:
+            dict: `context`.
+        """
+        for name in self.stat_order:
+            if name in context:
+                continue
+            definition = STAT_REGISTRY[name]
+            value = definition.function(*(context[input_name] for input_name in definition.inputs))
+            if definition.curve and isinstance(self.sub_periods, ndarray):
+                # the sub-periods that were not computed are left as NaN
+                value = self.expand_curve(value)
+            context[name] = value
+        return context
+
+    @property
+    def seasonal_stats(self) -> dict[str, ndarray]:
+        """The seasonal statistics of all the places, of shape (places, 
+        years, sub-periods)."""
+        return {'Sum': self.seasonal_accumulations, 'Ensemble Sum': self.seasonal_ensembles}
+
+    def get_seasonal_stats(self, row: int, selected=False) -> dict[str, SeasonRows]:
+        """Returns the seasonal statistics of a place.
+
+        Args:
+            row (int): Row of the place.
+            selected (bool, optional): Whether to return the statistics of the
+                selected years instead of all the years. Defaults to False.
+
+        Returns:
+            dict: The seasonal statistics, as in `Place.get_seasonal_stats`, 
+                with the seasons of the place by year ID.
+        """
+        year_ids = self.parent.properties.year_ids
+        if selected:
+            indexes = self.selected_indexes[row, :self.selected_counts[row]]
+        else:
+            indexes = range(len(year_ids))
+        return {key: SeasonRows(value[row], year_ids, indexes) for key, value in self.seasonal_stats.items()}
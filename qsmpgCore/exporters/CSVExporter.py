@@ -1,50 +1,94 @@
 import os
+import numpy as np
 import pandas as pd
 from ..structures import Dataset
+from ..hindcast import Hindcast
+from ..engine import StatsRequest, CURRENT_SUB_PERIOD, LAST_SUB_PERIOD
+
+# statistics read by `wrap_stats` and `wrap_summary`, which only read the
+# current and last sub-periods of the curves
+CSV_REQUIRED_STATS = StatsRequest(
+    ('LTA', 'Median', 'Pctls.', 'St. Dev.', 'Current Season Accumulation', 'Ensemble Med.', 'E. Pctls.',
+     'C. Dk./LTA', 'Ensemble Med./LTA', 'E. Probabilities', 'Ensemble Med. Pctl.', 'Current Season Pctl.'),
+    (CURRENT_SUB_PERIOD, LAST_SUB_PERIOD),
+)
+
+def round_values(values):
+    """Rounds a value, or the values of all places, to integers.
+
+    Args:
+        values (float | np.ndarray): A value or an array of values.
+
+    Returns:
+        int | pd.arrays.IntegerArray: The rounded value, or the rounded values
+            with the ones that are not finite left empty.
+    """
+    if np.ndim(values) == 0:
+        return round(float(values))
+    rounded = np.round(values)
+    return pd.array(np.where(np.isfinite(rounded), rounded, np.nan)).astype('Int64')
 
 def wrap_stats(stats):
     """Wraps the statistical data for a place in a dictionary.
 
     Args:
-        stats (dict): The statistical data for a place.
+        stats (Mapping): The statistical data for a place, or for all places
+            at once as a `StatsTable`.
 
     Returns:
         wrapped_stats (dict): A dictionary of statistical data with some 
             additional formatting.
     """
     return {
-            'LTA': round(stats['LTA'][-1]),
-            'LTA up to Current Season': round(stats['LTA'][stats['Current Season Accumulation'].size-1]),
-            'Median': round(stats['Median'][-1]),
-            '33 Pctl.': round(stats['Pctls.'][0]),
-            '67 Pctl.': round(stats['Pctls.'][1]),
-            'St. Dev.': round(stats['St. Dev.'][-1]),
-            'Current Season Sum': round(stats['Current Season Accumulation'][-1]),
-            'Ensemble Med.': round(stats['Ensemble Med.'][-1]),
-            '33 E. Pctl.': round(stats['E. Pctls.'][0]),
-            '67 E. Pctl.': round(stats['E. Pctls.'][1]),
+            'LTA': round_values(stats['LTA'][..., -1]),
+            'LTA up to Current Season': round_values(stats['LTA'][..., stats['Current Season Accumulation'].shape[-1]-1]),
+            'Median': round_values(stats['Median'][..., -1]),
+            '33 Pctl.': round_values(stats['Pctls.'][..., 0]),
+            '67 Pctl.': round_values(stats['Pctls.'][..., 1]),
+            'St. Dev.': round_values(stats['St. Dev.'][..., -1]),
+            'Current Season Sum': round_values(stats['Current Season Accumulation'][..., -1]),
+            'Ensemble Med.': round_values(stats['Ensemble Med.'][..., -1]),
+            '33 E. Pctl.': round_values(stats['E. Pctls.'][..., 0]),
+            '67 E. Pctl.': round_values(stats['E. Pctls.'][..., 1]),
         }
 
 def wrap_summary(stats):
     """Wraps the summary data for a place in a dictionary.
 
     Args:
-        stats (dict): The summary data for a place.
+        stats (Mapping): The summary data for a place, or for all places at 
+            once as a `StatsTable`.
 
     Returns:
         wrapped_stats (dict): A dictionary of summary data with some additional 
             formatting.
     """
     return {
-            'C. Dk./LTA Pct.': round(stats['C. Dk./LTA'][-1]*100),
-            'Ensemble Med./LTA Pct.': round(stats['Ensemble Med./LTA'][-1]*100),
-            'Probability Below Normal': round(stats['E. Probabilities'][0]*100),
-            'Probability in Normal': round(stats['E. Probabilities'][1]*100),
-            'Probability Above Normal': round(stats['E. Probabilities'][2]*100),
-            'Ensemble Med. Pctl.': round(stats['Ensemble Med. Pctl.'][0]),
-            'Current Season Pctl.': round(stats['Current Season Pctl.'][0]),
+            'C. Dk./LTA Pct.': round_values(stats['C. Dk./LTA'][..., -1]*100),
+            'Ensemble Med./LTA Pct.': round_values(stats['Ensemble Med./LTA'][..., -1]*100),
+            'Probability Below Normal': round_values(stats['E. Probabilities'][..., 0]*100),
+            'Probability in Normal': round_values(stats['E. Probabilities'][..., 1]*100),
+            'Probability Above Normal': round_values(stats['E. Probabilities'][..., 2]*100),
+            'Ensemble Med. Pctl.': round_values(stats['Ensemble Med. Pctl.'][..., 0]),
+            'Current Season Pctl.': round_values(stats['Current Season Pctl.'][..., 0]),
         }
 
+def get_similar_seasons_table(dataset: Dataset) -> np.ndarray:
+    """Returns the years of every place ranked by similarity.
+
+    Args:
+        dataset (Dataset): The dataset.
+
+    Returns:
+        np.ndarray: Object array of shape (places, max. ranked years), padded 
+            with None.
+    """
+    indexes, counts = dataset.stats.similar_indexes, dataset.stats.similar_counts
+    indexes = indexes[:, :counts.max() if counts.size > 0 else 0]
+    year_ids = np.array(dataset.properties.year_ids + [None], dtype=object)
+    # the padding index -1 picks the None at the end
+    return year_ids[indexes]
+
 def export_to_csv_files(destination_path, dataset: Dataset, subFolderName='Statistics'):
     """
     Exports the statistical and summary data for a dataset to CSV files in a 
@@ -63,19 +107,13 @@ def export_to_csv_files(destination_path, dataset: Dataset, subFolderName='Stati
     filename_suffix = f' [{dataset.name}] [dek{dataset.properties.current_season_id}{dataset.properties.current_season_length}]'
     stats_subfolder_path = os.path.join(destination_path, subFolderName)
     os.makedirs(stats_subfolder_path, exist_ok=True)
-    headers = []
-    climatology_stats = []
-    climatology_summary = []
-    selected_years_stats = []
-    selected_years_summary = []
-    similar_seasons = []
-    for place_id, place in dataset.places.items():
-        headers.append(place_id)
-        climatology_stats.append(wrap_stats(place.place_stats))
-        climatology_summary.append(wrap_summary(place.place_stats))
-        selected_years_stats.append(wrap_stats(place.selected_years_place_stats))
-        selected_years_summary.append(wrap_summary(place.selected_years_place_stats))
-        similar_seasons.append(place.similar_seasons)
+    # the tables are built from the statistics of all places at once
+    headers = list(dataset.places)
+    climatology_stats = wrap_stats(dataset.stats.place_stats)
+    climatology_summary = wrap_summary(dataset.stats.place_stats)
+    selected_years_stats = wrap_stats(dataset.stats.selected_years_place_stats)
+    selected_years_summary = wrap_summary(dataset.stats.selected_years_place_stats)
+    similar_seasons = get_similar_seasons_table(dataset)
 
     data_path_relation = {
         'climatology_stats': [climatology_stats, f'{stats_subfolder_path}/climatology_stats{filename_suffix}.csv'],
@@ -85,8 +123,46 @@ def export_to_csv_files(destination_path, dataset: Dataset, subFolderName='Stati
     }
 
     for v in data_path_relation.values():
-        pd.DataFrame.from_records(v[0], index=headers).to_csv(v[1])
+        pd.DataFrame(v[0], index=headers).to_csv(v[1])
     pd.DataFrame(similar_seasons, index=headers).to_csv(f'{stats_subfolder_path}/similar_seasons{filename_suffix}.csv')
 
     # return path to selected years summary table
-    return data_path_relation['selected_years_summary'][1]
\ No newline at end of file
+    return data_path_relation['selected_years_summary'][1]
+
+def export_hindcast_to_csv_file(destination_path, hindcast: Hindcast, dataset_name: str, subFolderName='Hindcast'):
+    """
+    Exports the outlooks of a hindcast to a CSV file, with a row for each 
+    place, year and sub-period after which the season is cut. The observed 
+    tercile is 0 below normal, 1 normal and 2 above normal, and is left empty 
+    for the seasons with no outlook.
+
+    Args:
+        destination_path (str): The path to the folder where the CSV file will 
+            be saved.
+        hindcast (Hindcast): The hindcast of a computed dataset.
+        dataset_name (str): The name of the dataset, added to the file name.
+        subFolderName (str, optional): The name of the subfolder where the CSV 
+            file will be saved. Defaults to 'Hindcast'.
+
+    Returns:
+        str: the path to the hindcast file.
+    """
+    subfolder_path = os.path.join(destination_path, subFolderName)
+    os.makedirs(subfolder_path, exist_ok=True)
+    stats = hindcast.stats
+    sub_period_count = len(hindcast.sub_period_ids)
+    index = pd.MultiIndex.from_product([hindcast.place_ids, hindcast.year_ids, hindcast.sub_period_ids],
+                                       names=['ID', 'Year', 'Sub-period'])
+    observed_terciles = np.repeat(hindcast.observed_terciles.ravel(), sub_period_count)
+    table = {
+        'Ensemble Med.': round_values(stats['Ensemble Med.'].ravel()),
+        'Ensemble Med. Pctl.': round_values(stats['Ensemble Med. Pctl.'].ravel()),
+        'Probability Below Normal': round_values(stats['E. Probabilities'][..., 0].ravel()*100),
+        'Probability in Normal': round_values(stats['E. Probabilities'][..., 1].ravel()*100),
+        'Probability Above Normal': round_values(stats['E. Probabilities'][..., 2].ravel()*100),
+        'Observed Tercile': pd.array(np.where(observed_terciles < 0, np.nan, observed_terciles)).astype('Int64'),
+        'RPS': np.round(stats['RPS'].ravel(), 3),
+    }
+    path = f'{subfolder_path}/hindcast [{dataset_name}].csv'
+    pd.DataFrame(table, index=index).to_csv(path)
+    return path
@@ -7,6 +7,14 @@ mplstyle.use('fast')
 plt.switch_backend('agg')
 # plt.switch_backend('Cairo')
 from ..structures import Dataset, Place
+from ..engine import StatsRequest
+
+# statistics read by the plots and tables of the reports
+IMAGE_REQUIRED_STATS = StatsRequest((
+    'Avg.', 'C. Dk./LTA', 'Current Season', 'Current Season Accumulation', 'Drought Severity Pctls.', 'E. LTA',
+    'E. Pctls.', 'E. Probabilities', 'Ensemble Med.', 'Ensemble Med./LTA', 'LTA', 'Median', 'Pctls.', 'St. Dev.',
+    'forecast',
+))
 
 def fix_filename(sourcestring,  removestring="#%&}{$!\'\"@+`|:/,=.\\[]<>*?\n\t"):
     """
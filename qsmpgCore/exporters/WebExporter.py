@@ -2,6 +2,14 @@ import json
 import os
 import shutil as sh
 from ..structures import Dataset
+from ..engine import StatsRequest
+
+# statistics read by the scripts of the web template
+WEB_REQUIRED_STATS = StatsRequest((
+    'Avg.', 'C. Dk./LTA', 'Current Season', 'Current Season Accumulation', 'Drought Severity Pctls.', 'E. LTA',
+    'E. Pctls.', 'E. Probabilities', 'Ensemble Med.', 'Ensemble Med./LTA', 'LTA', 'Median', 'Pctls.', 'St. Dev.',
+    'forecast',
+))
 
 # workaround for standalone web files
 def data_py_to_js(data: dict, destination_path: str, data_name: str):
@@ -0,0 +1,197 @@
+import numpy as np
+from numpy import ndarray
+from .engine import BLOCK_PLACES, get_ensemble_probabilities
+from .percentiles import SortedSamples, TERCILE_PERCENTILES
+
+# Statistics of the hindcast cube, see `Hindcast`
+HINDCAST_STATS = ('E. Probabilities', 'Ensemble Med.', 'Ensemble Med. Pctl.', 'RPS')
+
+def get_sorted_median(samples: SortedSamples) -> ndarray:
+    """Returns the median of each sample, computed as `np.median` does from
+    the middle values of the sorted sample, or NaN for an empty sample."""
+    counts = np.maximum(samples.counts, 1)
+    lower = np.take_along_axis(samples.sorted_values, ((counts - 1) // 2)[:, np.newaxis], axis=1)[:, 0]
+    upper = np.take_along_axis(samples.sorted_values, (counts // 2)[:, np.newaxis], axis=1)[:, 0]
+    medians = np.where(counts % 2 == 1, lower, (lower + upper) / 2)
+    medians[samples.invalid] = np.nan
+    return medians
+
+def get_observed_terciles(totals: ndarray, seasonal_pctls: ndarray) -> ndarray:
+    """Returns the tercile of season totals, with the bounds of
+    `get_ensemble_probabilities`.
+
+    Args:
+        totals (ndarray): Season total of each place.
+        seasonal_pctls (ndarray): Array of shape (places, 2) with the
+            terciles of each place.
+
+    Returns:
+        ndarray: 0 below normal, 1 normal and 2 above normal, or -1 when the
+            total or the terciles are NaN.
+    """
+    terciles = (totals >= seasonal_pctls[:, 0]).astype(np.int8) + (totals >= seasonal_pctls[:, 1])
+    terciles[np.isnan(totals) | np.isnan(seasonal_pctls).any(axis=1)] = -1
+    return terciles
+
+def get_ranked_probability_scores(probabilities: ndarray, observed_terciles: ndarray) -> ndarray:
+    """Returns the ranked probability score of tercile probabilities.
+
+    It is the sum of the squared differences between the cumulative
+    probabilities and the cumulative observation, divided by the number of
+    categories minus one. So it goes from 0 for a certain right outlook to 1
+    for a certain wrong one.
+
+    Args:
+        probabilities (ndarray): Array of shape (..., categories).
+        observed_terciles (ndarray): Observed category, broadcastable to the
+            shape of `probabilities` without its last axis, -1 if unknown.
+
+    Returns:
+        ndarray: Array of the shape of `probabilities` without its last axis,
+            NaN where the observation is unknown.
+    """
+    category_count = probabilities.shape[-1]
+    observations = np.arange(category_count) >= observed_terciles[..., np.newaxis]
+    differences = np.cumsum(probabilities, axis=-1)[..., :-1] - observations[..., :-1]
+    scores = np.sum(differences ** 2, axis=-1) / (category_count - 1)
+    return np.where(observed_terciles < 0, np.nan, scores)
+
+class Hindcast:
+    """The ensemble outlooks that a computed dataset would have given at
+    every sub-period of its past seasons, to validate them against the
+    observed seasons.
+
+    Each past season is cut after each sub-period of the monitoring season
+    and taken as the current season, as if the dataset ended there. Its
+    ensemble is built with the other climatology years and its terciles are
+    those of the other climatology years, so the year is left out of its own
+    outlook. The ensemble sums start from the accumulation of the year up to
+    the cut-off, and the rest of the season of each other year is added to
+    the sums of all the earlier cut-offs at once, so they are added in the
+    order of `get_ensembles` and have the same bits. All the cut-offs of a
+    year are computed at once over blocks of places.
+
+    The climatology totals of a block are sorted once, and the normals of
+    each year, its terciles and the sample of the ensemble median
+    percentiles, are taken from them by leaving the year out, then shared
+    by all its cut-offs.
+
+    The seasons that are not valid in the masked mode, or that have missing
+    values in the monitoring season, are left out of the ensembles, and the
+    statistics of such a season are NaN.
+
+    Attributes:
+        place_ids (list[str]): IDs of the places, the first axis of the cube.
+        year_ids (list[str]): IDs of the years, the second axis of the cube.
+        sub_period_ids (list[str]): Sub-periods of the monitoring season after
+            which the seasons are cut, the third axis of the cube.
+        observed_terciles (ndarray): Array of shape (places, years) with the
+            observed tercile of each season, see `get_observed_terciles`.
+        stats (dict[str, ndarray]): The `HINDCAST_STATS`, of shape (places,
+            years, sub-periods), with a last axis of the below normal, normal
+            and above normal probabilities for 'E. Probabilities'.
+            'Ensemble Med.' is the median of the ensemble sums, and 'RPS'
+            the ranked probability score of the probabilities. The
+            probabilities and medians are in the precision of the dataset.
+
+    The hindcast is not run by the dialog, it is computed from a script and
+    written with `CSVExporter.export_hindcast_to_csv_file`.
+    """
+    def __init__(self, dataset, year_ids: list[str]=None) -> None:
+        """Constructor
+
+        Args:
+            dataset (Dataset): The computed dataset.
+            year_ids (list[str], optional): Years of the cube. Defaults to
+                None, meaning all the past years of the dataset.
+        """
+        stats = dataset.stats
+        all_year_ids = dataset.properties.year_ids
+        self.place_ids = list(dataset.properties.place_ids)
+        self.year_ids = list(all_year_ids if year_ids is None else year_ids)
+        self.sub_period_ids = list(dataset.properties.sub_season_monitoring_ids)
+        accumulations = stats.seasonal_accumulations
+        place_count, _, season_length = accumulations.shape
+        year_indexes = np.array([all_year_ids.index(year_id) for year_id in self.year_ids], dtype=np.intp)
+        climatology_masks = np.isin(all_year_ids, dataset.properties.climatology_year_ids)[np.newaxis, :] & stats.valid_seasons
+
+        cube_shape = (place_count, len(self.year_ids), season_length)
+        self.observed_terciles = np.full(cube_shape[:2], -1, dtype=np.int8)
+        self.stats = {
+            'E. Probabilities': np.full(cube_shape + (3,), np.nan, dtype=accumulations.dtype),
+            'Ensemble Med.': np.full(cube_shape, np.nan, dtype=accumulations.dtype),
+            'Ensemble Med. Pctl.': np.full(cube_shape, np.nan),
+            'RPS': np.full(cube_shape, np.nan),
+        }
+        for start in range(0, place_count, BLOCK_PLACES):
+            block = slice(start, start + BLOCK_PLACES)
+            # the years are the last axis, so the ensembles of each cut-off
+            # are contiguous
+            cut_accumulations = np.ascontiguousarray(accumulations[block].transpose(0, 2, 1))
+            cut_seasons = np.ascontiguousarray(stats.monitoring_seasons[block].transpose(0, 2, 1))
+            totals = cut_accumulations[:, -1, :]
+            climatology_members = climatology_masks[block] & ~np.isnan(totals)
+            climatology_samples = SortedSamples(np.where(climatology_members, totals, np.nan), ignore_nan=True)
+            for year, year_index in enumerate(year_indexes):
+                members = climatology_members.copy()
+                members[:, year_index] = False
+                samples = climatology_samples.without(totals[:, year_index], climatology_members[:, year_index])
+                self.compute_block(block, year, year_index, cut_accumulations, cut_seasons, members, samples,
+                                   stats.valid_seasons[block, year_index])
+
+    def compute_block(self, block: slice, year: int, year_index: int, cut_accumulations: ndarray, cut_seasons: ndarray,
+                      members: ndarray, samples: SortedSamples, valid_seasons: ndarray) -> None:
+        """Computes the statistics of a block of places for all the cut-offs
+        of a year.
+
+        Args:
+            block (slice): Rows of the places.
+            year (int): Index of the year in `year_ids`.
+            year_index (int): Index of the year in the years of the dataset.
+            cut_accumulations (ndarray): Accumulations of the block, of shape
+                (places, sub-periods, years).
+            cut_seasons (ndarray): Values of the seasons of the block, of the
+                shape of `cut_accumulations`.
+            members (ndarray): Boolean array of shape (places, years), True
+                for the seasons of the ensembles of the year.
+            samples (SortedSamples): Season totals of the `members`, the
+                normals of the year.
+            valid_seasons (ndarray): Whether the season of the year is valid
+                for each place.
+        """
+        block_size, season_length, _ = cut_accumulations.shape
+        totals = cut_accumulations[:, -1, :]
+        counts = samples.counts
+        seasonal_pctls = samples.values_at(TERCILE_PERCENTILES)
+        self.observed_terciles[block, year] = np.where(valid_seasons, get_observed_terciles(totals[:, year_index], seasonal_pctls), -1)
+
+        # ensemble sums of shape (places, cut-offs, members), accumulated in
+        # float64, the last cut-off is the whole season
+        current_accumulations = cut_accumulations[:, :, year_index]
+        ensemble_sums = np.repeat(current_accumulations[:, :, np.newaxis].astype(np.float64), members.shape[1], axis=2)
+        for sub_period in range(1, season_length):
+            ensemble_sums[:, :sub_period] += cut_seasons[:, sub_period, np.newaxis, :]
+        ensemble_sums = ensemble_sums.astype(cut_accumulations.dtype, copy=False)
+        ensemble_sums[~np.broadcast_to(members[:, np.newaxis, :], ensemble_sums.shape)] = np.nan
+        ensemble_sums = ensemble_sums.reshape(block_size * season_length, -1)
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            probabilities = get_ensemble_probabilities(ensemble_sums, np.repeat(seasonal_pctls, season_length, axis=0),
+                                                       np.repeat(counts, season_length))
+        ensemble_medians = get_sorted_median(SortedSamples(ensemble_sums, ignore_nan=True)).reshape(block_size, season_length)
+        probabilities = probabilities.reshape(block_size, season_length, 3)
+        median_pctls = samples.percentiles_of(ensemble_medians)
+        scores = get_ranked_probability_scores(probabilities, self.observed_terciles[block, year, np.newaxis])
+
+        # the cut-offs of an invalid season or with a missing accumulation
+        # have no outlook
+        unknown = ~valid_seasons[:, np.newaxis] | np.isnan(current_accumulations)
+        self.stats['E. Probabilities'][block, year] = np.where(unknown[:, :, np.newaxis], np.nan, probabilities)
+        self.stats['Ensemble Med.'][block, year] = np.where(unknown, np.nan, ensemble_medians)
+        self.stats['Ensemble Med. Pctl.'][block, year] = np.where(unknown, np.nan, median_pctls)
+        self.stats['RPS'][block, year] = np.where(unknown, np.nan, scores)
+
+    def get_place_stats(self, place_id: str) -> dict[str, ndarray]:
+        """Returns the cube rows of a place, of shape (years, sub-periods)."""
+        row = self.place_ids.index(place_id)
+        return {name: values[row] for name, values in self.stats.items()}
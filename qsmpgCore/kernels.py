@@ -0,0 +1,114 @@
+import numpy as np
+from numpy import ndarray
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+# Number of similarity criteria of `get_similar_year_rankings`: the distances
+# between the curves, the accumulation curves and the season totals, and
+# 1 - r^2 of the Pearson correlation
+SIMILARITY_CRITERIA = 4
+
+def is_available() -> bool:
+    """Whether the compiled kernels can be used, which requires numba."""
+    return numba is not None
+
+def jit(**options):
+    """Compiles a kernel with numba, or leaves it as Python code when numba
+    is not installed."""
+    if numba is None:
+        return lambda function: function
+    return numba.njit(**options)
+
+prange = range if numba is None else numba.prange
+
+@jit(parallel=True, cache=True, error_model='numpy')
+def similarity_distances(current_years, year_lists, use_pearson):
+    """See `get_similarity_distances`."""
+    place_count, year_count = year_lists.shape[0], year_lists.shape[1]
+    length = current_years.shape[1]
+    distances = np.full((SIMILARITY_CRITERIA, place_count, year_count), np.nan)
+    if length == 0:
+        return distances
+    for place in prange(place_count):
+        current_total = 0.0
+        for i in range(length):
+            current_total += np.float64(current_years[place, i])
+        current_mean = current_total / length
+        for year in range(year_count):
+            curve_distance = 0.0
+            accumulation_distance = 0.0
+            current_accumulation = 0.0
+            year_accumulation = 0.0
+            for i in range(length):
+                current = np.float64(current_years[place, i])
+                value = np.float64(year_lists[place, year, i])
+                curve_distance += (value - current) ** 2
+                current_accumulation += current
+                year_accumulation += value
+                accumulation_distance += (year_accumulation - current_accumulation) ** 2
+            distances[0, place, year] = curve_distance
+            distances[1, place, year] = accumulation_distance
+            distances[2, place, year] = (year_accumulation - current_accumulation) ** 2
+            if use_pearson:
+                year_mean = year_accumulation / length
+                covariance = 0.0
+                year_variance = 0.0
+                current_variance = 0.0
+                for i in range(length):
+                    current_deviation = np.float64(current_years[place, i]) - current_mean
+                    year_deviation = np.float64(year_lists[place, year, i]) - year_mean
+                    covariance += year_deviation * current_deviation
+                    year_variance += year_deviation ** 2
+                    current_variance += current_deviation ** 2
+                correlation = covariance / np.sqrt(year_variance * current_variance)
+                if correlation > 1:
+                    correlation = 1.0
+                elif correlation < -1:
+                    correlation = -1.0
+                distances[3, place, year] = 1 - correlation ** 2
+    return distances
+
+@jit(parallel=True, cache=True)
+def fill_ensembles(current_accumulations, seasons, ensembles):
+    """See `get_ensembles`."""
+    place_count, year_count, length = seasons.shape
+    current_length = current_accumulations.shape[1]
+    for place in prange(place_count):
+        for year in range(year_count):
+            total = 0.0
+            for i in range(current_length):
+                ensembles[place, year, i] = current_accumulations[place, i]
+                total = np.float64(current_accumulations[place, i])
+            for i in range(current_length, length):
+                total += np.float64(seasons[place, year, i])
+                ensembles[place, year, i] = total
+
+def get_similarity_distances(current_years: ndarray, year_lists: ndarray, use_pearson: bool) -> ndarray:
+    """Computes the similarity criteria of `get_similar_year_rankings` in one
+    pass over the seasons, without the temporary arrays of the NumPy version.
+
+    The sums are added in a single loop rather than in the pairwise order of
+    NumPy, so the distances match the NumPy ones up to rounding, and the
+    rankings only differ between years whose distances are that close.
+
+    Args:
+        current_years (ndarray): Array of shape (places, sub-periods).
+        year_lists (ndarray): Array of shape (places, years, sub-periods),
+            with at least as many sub-periods as `current_years`.
+        use_pearson (bool): Whether to compute the Pearson criterion, which
+            is NaN otherwise.
+
+    Returns:
+        ndarray: Float64 array of shape (SIMILARITY_CRITERIA, places, years).
+    """
+    return similarity_distances(current_years, year_lists, use_pearson)
+
+def get_ensembles(current_accumulations: ndarray, seasons: ndarray) -> ndarray:
+    """Compiled version of `engine.get_ensembles`, which writes the traces
+    in one pass with no temporary tails."""
+    ensembles = np.empty(seasons.shape, dtype=current_accumulations.dtype)
+    fill_ensembles(current_accumulations, seasons, ensembles)
+    return ensembles
@@ -0,0 +1,126 @@
+import os
+import sys
+import multiprocessing
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+
+# Executors that can run the batches of a computation
+EXECUTOR_TYPES = ('serial', 'thread', 'process')
+# Executor of the computations started from the plugin dialog, which runs in 
+# the QGIS process, so the process executor is left to scripts
+DIALOG_EXECUTOR = 'thread'
+
+def find_python_executable() -> str | None:
+    """Returns the Python interpreter that can run worker processes.
+
+    An embedded interpreter, such as the one of QGIS, has the application as 
+    `sys.executable`, and spawned workers would start the application again, 
+    so the interpreter is looked for in the Python installation instead.
+
+    Returns:
+        str | None: Path of the interpreter, or None if it was not found.
+    """
+    if os.path.basename(sys.executable).lower().startswith('python'):
+        return sys.executable
+    version = f'{sys.version_info.major}.{sys.version_info.minor}'
+    for candidate in (os.path.join(sys.exec_prefix, 'python.exe'),
+                      os.path.join(sys.exec_prefix, 'bin', f'python{version}'),
+                      os.path.join(sys.exec_prefix, 'bin', 'python3')):
+        if os.path.isfile(candidate):
+            return candidate
+    return None
+
+def get_process_pool(max_workers: int) -> ProcessPoolExecutor:
+    """Returns a pool of worker processes run by a Python interpreter.
+
+    In an embedded interpreter, the workers are spawned with the interpreter 
+    of `find_python_executable`.
+
+    Args:
+        max_workers (int): Maximum number of processes.
+
+    Raises:
+        RuntimeError: If no Python interpreter can run the workers.
+
+    Returns:
+        ProcessPoolExecutor: The pool, to be used as a context manager.
+    """
+    executable = find_python_executable()
+    if executable is None:
+        raise RuntimeError(f'No Python interpreter was found to run worker processes from {sys.executable}, '
+                           'use threads instead.')
+    if executable == sys.executable:
+        return ProcessPoolExecutor(max_workers=max_workers)
+    multiprocessing.set_executable(executable)
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn'))
+
+def share_array(array: np.ndarray) -> tuple[SharedMemory, tuple]:
+    """Copies an array to a new block of shared memory.
+
+    The block must be released with `shared_memory.close()` and
+    `shared_memory.unlink()` once the workers are done.
+
+    Args:
+        array (np.ndarray): The array to be shared.
+
+    Returns:
+        shared_memory (SharedMemory): The block of shared memory.
+        handle (tuple): The name, shape and dtype of the array, which are
+            passed to the workers to attach it with `attach_shared_array`.
+    """
+    shared_memory = SharedMemory(create=True, size=max(array.nbytes, 1))
+    shared_array = np.ndarray(array.shape, dtype=array.dtype, buffer=shared_memory.buf)
+    shared_array[...] = array
+    del shared_array
+    return shared_memory, (shared_memory.name, array.shape, array.dtype.str)
+
+def attach_shared_array(handle: tuple) -> tuple[SharedMemory, np.ndarray]:
+    """Attaches, in a worker, an array shared with `share_array`.
+
+    Args:
+        handle (tuple): The handle returned by `share_array`.
+
+    Returns:
+        shared_memory (SharedMemory): The block of shared memory, to be closed
+            once the array is no longer used.
+        array (np.ndarray): The shared array, without copying it.
+    """
+    name, shape, dtype = handle
+    # the workers share the resource tracker of the process that created the
+    # block, which unlinks it once
+    shared_memory = SharedMemory(name=name)
+    return shared_memory, np.ndarray(shape, dtype=np.dtype(dtype), buffer=shared_memory.buf)
+
+def map_batches(function, batches: list, executor='serial', max_workers: int=None):
+    """Applies a function to every batch of a computation.
+
+    Args:
+        function (Callable): Function applied to each batch. For the process
+            executor, it must be a picklable module-level function or
+            `functools.partial`.
+        batches (list): Arguments of each call.
+        executor (str, optional): One of `EXECUTOR_TYPES`. The thread executor
+            suits the NumPy operations that release the GIL. The process 
+            executor is meant for scripts and headless runs, see 
+            `get_process_pool`. Defaults to 'serial'.
+        max_workers (int, optional): Maximum number of workers. Defaults to
+            the number of CPUs.
+
+    Raises:
+        ValueError: If the executor is unknown.
+        RuntimeError: If no Python interpreter can run the process workers.
+
+    Yields:
+        The result of each batch, in the order of `batches` whatever the order
+            in which they finish.
+    """
+    if executor not in EXECUTOR_TYPES:
+        raise ValueError(f'Unknown executor: {executor}, expected one of {", ".join(EXECUTOR_TYPES)}.')
+    worker_count = min(len(batches), max_workers or os.cpu_count() or 1)
+    if executor == 'serial' or worker_count <= 1:
+        yield from map(function, batches)
+        return
+    pool = ThreadPoolExecutor(max_workers=worker_count) if executor == 'thread' else get_process_pool(worker_count)
+    with pool:
+        yield from pool.map(function, batches)
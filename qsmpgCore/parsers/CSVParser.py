@@ -1,42 +1,438 @@
+import os
+import glob
+import numpy as np
 import pandas as pd
+from functools import partial
+from .DatasetCache import load_cache, save_cache, read_cache_metadata, is_cache_valid
+from ..structures import TimeSeriesMatrix
+from ..parallel import map_batches
 
-def parse_csv(filename:str):
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+except ImportError:
+    pa = pa_csv = None
+
+# Default number of rows read at a time by the streaming parser
+DEFAULT_CHUNK_SIZE = 10000
+
+def parse_csv(filename:str | list[str], use_cache=True, chunk_size:int=None, engine:str=None, 
+              namespace_places=False, max_workers:int=None, dtype=np.float64, executor='thread') -> TimeSeriesMatrix:
     """
-    Reads a CSV file and returns a dictionary of numpy arrays representing the 
-    time series data.
+    Reads a CSV file and returns a matrix of places by timestamps representing
+    the time series data.
+
+    `filename` can also be a list of files or a folder of CSV files, in which 
+    case they are parsed in parallel and merged into one dataset (see 
+    `parse_csv_files`).
+
+    When `use_cache` is enabled, the parsed data is stored in a sidecar cache
+    next to the file, and later calls with an unchanged file memory-map the
+    cached data instead of parsing the CSV again.
+
+    When `chunk_size` or `engine` is given, the file is streamed in chunks of
+    rows into a preallocated matrix (see `stream_csv`), which keeps the peak
+    memory close to the size of the parsed data.
 
     Args:
-        filename (str): Path to the CSV file to be read.
+        filename (str | list[str]): Path to the CSV file to be read, list of 
+            paths, or path to a folder of CSV files.
+        use_cache (bool, optional): Whether to read and write the sidecar
+            cache. Defaults to True.
+        chunk_size (int, optional): Number of rows read at a time in streaming
+            mode. Defaults to None.
+        engine (str, optional): CSV engine used in streaming mode, either 'c'
+            or 'pyarrow'. Defaults to None.
+        namespace_places (bool, optional): When reading several files, whether 
+            to prefix the place IDs with the name of their file. 
+            Defaults to False.
+        max_workers (int, optional): When reading several files, the maximum 
+            number of workers. Defaults to the number of CPUs.
+        dtype (np.dtype, optional): Floating-point type of the value matrix.
+            A cache of lower precision is parsed again. Defaults to np.float64.
+        executor (str, optional): When reading several files, how they are 
+            parsed, see `parse_csv_files`. Defaults to 'thread'.
 
     Returns:
-        dataset (dict): Dictionary of numpy arrays representing the time series 
-            data.
-        timestamps (list[str]): List of column names that represent the 
-            timestamps in the dataset.
-        has_duplicates (bool): Whether or not there are duplicates in the 
+        TimeSeriesMatrix: The value matrix of the dataset, along with the place
+            IDs, the timestamps and whether or not there are duplicates in the
             dataset.
     """
-    df = pd.read_csv(filename, header=0, index_col=0)
+    if isinstance(filename, (list, tuple)) or os.path.isdir(filename):
+        return parse_csv_files(list_csv_files(filename), use_cache, chunk_size, engine, 
+                               namespace_places, max_workers, dtype, executor)
+
+    if use_cache:
+        cached_data = load_cache(filename)
+        if cached_data is not None and cached_data[0].dtype.itemsize >= np.dtype(dtype).itemsize:
+            values, *metadata = cached_data
+            return TimeSeriesMatrix(values.astype(dtype, copy=False), *metadata)
+
+    if chunk_size is None and engine is None:
+        df = pd.read_csv(filename, header=0, index_col=0)
+
+        has_duplicates = not df.index.is_unique
+        timestamps = df.columns.to_list()
+        values, place_ids = matrix_from_dataframe(df, has_duplicates, dtype)
+    else:
+        values, place_ids, timestamps, has_duplicates = stream_csv(
+            filename, chunk_size or DEFAULT_CHUNK_SIZE, engine or 'c', dtype)
+    if use_cache:
+        save_cache(filename, values, place_ids, timestamps, has_duplicates)
+    return TimeSeriesMatrix(values, place_ids, timestamps, has_duplicates)
+
+def list_csv_files(source:str | list[str]) -> list[str]:
+    """Returns the CSV files of a folder, or the given list of files.
+
+    Args:
+        source (str | list[str]): Path to a folder or list of file paths.
+
+    Returns:
+        list[str]: Paths of the CSV files, sorted by name for folders.
+    """
+    if isinstance(source, (list, tuple)):
+        return list(source)
+    filenames = sorted(glob.glob(os.path.join(source, '*.csv')))
+    if len(filenames) == 0:
+        raise FileNotFoundError(f'No CSV files were found in {source}.')
+    return filenames
+
+def parse_csv_files(filenames:list[str], use_cache=True, chunk_size:int=None, engine:str=None, 
+                    namespace_places=False, max_workers:int=None, dtype=np.float64, 
+                    executor='thread') -> TimeSeriesMatrix:
+    """
+    Parses several CSV files in parallel and merges them into one dataset.
+
+    Each file is parsed by a worker with `parse_csv`, so every file keeps its 
+    own sidecar cache. The workers are threads by default, since pandas 
+    parses without holding the GIL, and worker processes are only used when 
+    they are requested, from a script (see `parallel.get_process_pool`). All the files must have the same timestamps. 
+    Places that appear in more than one file are merged keeping the first 
+    valid value of each column, in the order of `filenames`, unless 
+    `namespace_places` is set, in which case every place ID is prefixed with 
+    the name of its file, as in `file_name/place_id`.
 
+    Args:
+        filenames (list[str]): Paths to the CSV files to be read.
+        use_cache (bool, optional): Whether to read and write the sidecar
+            caches. Defaults to True.
+        chunk_size (int, optional): Number of rows read at a time in streaming
+            mode. Defaults to None.
+        engine (str, optional): CSV engine used in streaming mode. 
+            Defaults to None.
+        namespace_places (bool, optional): Whether to prefix the place IDs 
+            with the name of their file. Defaults to False.
+        max_workers (int, optional): Maximum number of workers. 
+            Defaults to the number of CPUs.
+        dtype (np.dtype, optional): Floating-point type of the value matrix.
+            Defaults to np.float64.
+        executor (str, optional): One of `parallel.EXECUTOR_TYPES`. 
+            Defaults to 'thread'.
+
+    Returns:
+        TimeSeriesMatrix: The merged dataset.
+    """
+    if len(filenames) == 0:
+        raise ValueError('No dataset files were given.')
+    function = partial(parse_csv, use_cache=use_cache, chunk_size=chunk_size, engine=engine, dtype=dtype)
+    parsed_files = list(map_batches(function, filenames, executor, max_workers))
+
+    timestamps = parsed_files[0].timestamps
+    for filename, parsed_file in zip(filenames[1:], parsed_files[1:]):
+        if parsed_file.timestamps != timestamps:
+            raise ValueError(f'The timestamps of {filename} do not match those of {filenames[0]}.')
+
+    place_ids = []
+    for filename, parsed_file in zip(filenames, parsed_files):
+        if namespace_places:
+            file_id = os.path.splitext(os.path.basename(filename))[0]
+            place_ids.extend(f'{file_id}/{place_id}' for place_id in parsed_file.place_ids)
+        else:
+            place_ids.extend(parsed_file.place_ids)
+    values = np.concatenate([parsed_file.values for parsed_file in parsed_files])
+    parsed_files = None
+    # integer IDs are sorted numerically, as when a single file is parsed
+    try:
+        index = pd.Index(np.array(place_ids, dtype=np.int64))
+    except (ValueError, OverflowError):
+        index = pd.Index(place_ids)
+    df = pd.DataFrame(values, index=index, columns=timestamps, copy=False)
     has_duplicates = not df.index.is_unique
-    timestamps = df.columns.to_list()
-    dataset_context = dict_of_nparrays(df)
-    return dataset_context, timestamps, has_duplicates
+    values, place_ids = matrix_from_dataframe(df, has_duplicates, dtype)
+    return TimeSeriesMatrix(values, place_ids, timestamps, has_duplicates)
+
+def probe_csv(filename:str | list[str], use_cache=True):
+    """
+    Reads the metadata of a CSV file without parsing its values.
 
-def dict_of_nparrays(df:pd.DataFrame):
-    """Converts a Pandas DataFrame to a dictionary of NumPy arrays.
+    Only the header row is parsed, and the rows are counted by scanning the
+    file for line breaks. If a valid sidecar cache exists, the metadata is
+    read from it instead.
 
     Args:
-        df (pd.DataFrame): The Pandas DataFrame to be converted.
+        filename (str | list[str]): Path to the CSV file to be read, list of 
+            paths, or path to a folder of CSV files.
+        use_cache (bool, optional): Whether to read the metadata from the
+            sidecar cache when it is valid. Defaults to True.
 
     Returns:
-        dataset (dict): Dictionary of NumPy arrays representing the data in the 
-            DataFrame.
+        timestamps (list[str]): List of column names that represent the
+            timestamps in the dataset.
+        row_count (int): Number of places in the dataset. Without a cache,
+            duplicated places are counted once per row.
     """
-    dataset = {}
-    df = df.groupby(level=0).first() # remove duplicates
-    dft = df.T
-    for col_index in dft.columns:
-        dataset[str(col_index)] = dft[col_index].to_numpy()
+    if isinstance(filename, (list, tuple)) or os.path.isdir(filename):
+        filenames = list_csv_files(filename)
+        probes = [probe_csv(source, use_cache) for source in filenames]
+        for source, (timestamps, _) in zip(filenames[1:], probes[1:]):
+            if timestamps != probes[0][0]:
+                raise ValueError(f'The timestamps of {source} do not match those of {filenames[0]}.')
+        return probes[0][0], sum(row_count for _, row_count in probes)
+    if use_cache:
+        metadata = read_cache_metadata(filename)
+        if metadata is not None and is_cache_valid(filename, metadata):
+            return metadata['timestamps'], len(metadata['place_ids'])
+    return read_csv_header(filename)[1:], count_csv_rows(filename)
 
+def append_csv(dataset:TimeSeriesMatrix, source:str | pd.DataFrame | pd.Series) -> TimeSeriesMatrix:
+    """
+    Appends new sub-periods to a parsed dataset without parsing its history.
+
+    The new data usually comes from a small CSV file with the same place IDs 
+    and only the new timestamp columns. Places missing from the new data get 
+    NaN values. See `TimeSeriesMatrix.append_columns` for the validation of 
+    the new timestamps.
+
+    Args:
+        dataset (TimeSeriesMatrix): A parsed dataset, e.g. loaded from the 
+            sidecar cache. It is modified in place.
+        source (str | pd.DataFrame | pd.Series): Path to a CSV file with the 
+            new columns, a DataFrame indexed by place ID, or a single named 
+            column.
+
+    Returns:
+        TimeSeriesMatrix: The updated dataset.
+    """
+    if isinstance(source, pd.Series):
+        new_data = source.to_frame()
+    elif isinstance(source, pd.DataFrame):
+        new_data = source
+    else:
+        new_data = pd.read_csv(source, header=0, index_col=0)
+    new_data.index = new_data.index.map(str)
+    if not new_data.index.is_unique:
+        new_data = new_data.groupby(level=0).first() # remove duplicates
+    unknown_places = new_data.index.difference(dataset.place_ids)
+    if len(unknown_places) > 0:
+        raise ValueError(f'{len(unknown_places)} places of the new data are not in the dataset '
+                         f'(e.g. {unknown_places[0]}), the whole dataset has to be parsed again.')
+    new_values = new_data.reindex(dataset.place_ids).to_numpy(dtype=np.float64)
+    dataset.append_columns(new_values, [str(timestamp) for timestamp in new_data.columns])
     return dataset
+
+def matrix_from_dataframe(df:pd.DataFrame, has_duplicates=True, dtype=np.float64):
+    """Converts a Pandas DataFrame to a contiguous matrix of float values.
+
+    Duplicated places are merged keeping the first valid value of each column,
+    and places are sorted by ID.
+
+    Args:
+        df (pd.DataFrame): The Pandas DataFrame to be converted.
+        has_duplicates (bool, optional): Whether the index of `df` has
+            duplicates. When False, the grouping step is skipped.
+            Defaults to True.
+        dtype (np.dtype, optional): Floating-point type of the matrix.
+            Defaults to np.float64.
+
+    Returns:
+        values (np.ndarray): C-contiguous 2-D array of shape
+            (places, timestamps).
+        place_ids (list[str]): IDs of the places, one per row of `values`.
+    """
+    if has_duplicates or df.index.hasnans:
+        df = df.groupby(level=0).first() # remove duplicates
+    elif not df.index.is_monotonic_increasing:
+        df = df.sort_index()
+    values = np.ascontiguousarray(df.to_numpy(dtype=dtype))
+    place_ids = [str(place_id) for place_id in df.index]
+    return values, place_ids
+
+def read_csv_header(filename:str) -> list[str]:
+    """Reads only the header row of a CSV file.
+
+    Args:
+        filename (str): Path to the CSV file to be read.
+
+    Returns:
+        list[str]: Names of all the columns, starting with the place ID column.
+    """
+    return pd.read_csv(filename, header=0, nrows=0).columns.to_list()
+
+def count_csv_rows(filename:str, block_size:int=1 << 20) -> int:
+    """Counts the data rows of a CSV file without parsing them.
+
+    Args:
+        filename (str): Path to the CSV file.
+        block_size (int, optional): Number of bytes read at a time.
+            Defaults to 1 MiB.
+
+    Returns:
+        int: Number of lines after the header row, empty lines excluded.
+    """
+    line_count = 0
+    empty_line_count = 0
+    previous_byte = b'\n'
+    with open(filename, 'rb') as source_file:
+        for block in iter(lambda: source_file.read(block_size), b''):
+            line_count += block.count(b'\n')
+            empty_line_count += block.count(b'\n\n') + block.count(b'\n\r\n')
+            if previous_byte == b'\n' and block[:1] in (b'\n', b'\r'):
+                empty_line_count += 1
+            previous_byte = block[-1:]
+    if previous_byte != b'\n':
+        line_count += 1
+    return max(line_count - empty_line_count - 1, 0)
+
+def iter_csv_chunks(filename:str, header:list[str], chunk_size:int, engine='c'):
+    """Reads a CSV file in chunks of rows with string place IDs and float
+    value columns.
+
+    Args:
+        filename (str): Path to the CSV file to be read.
+        header (list[str]): Names of the columns, as returned by
+            `read_csv_header`.
+        chunk_size (int): Approximate number of rows per chunk.
+        engine (str, optional): Either 'c' (pandas) or 'pyarrow'.
+            Defaults to 'c'.
+
+    Yields:
+        tuple: A list with the place IDs of the chunk and a 2-D float array
+            with their values.
+    """
+    if engine == 'pyarrow':
+        if pa_csv is None:
+            raise ImportError('The pyarrow engine was requested, but pyarrow is not installed.')
+        # pyarrow reads blocks of bytes, so the block size is estimated from
+        # the average length of a row
+        row_count = max(count_csv_rows(filename), 1)
+        row_bytes = max(os.path.getsize(filename) // row_count, 1)
+        reader = pa_csv.open_csv(
+            filename,
+            read_options=pa_csv.ReadOptions(block_size=max(row_bytes * chunk_size, 1 << 16)),
+            convert_options=pa_csv.ConvertOptions(
+                column_types={header[0]: pa.string(),
+                              **{timestamp: pa.float64() for timestamp in header[1:]}}),
+        )
+        for batch in reader:
+            chunk_values = np.empty((batch.num_rows, len(header) - 1), dtype=np.float64)
+            for i, column in enumerate(batch.columns[1:]):
+                chunk_values[:, i] = column.to_numpy(zero_copy_only=False)
+            yield batch.column(0).to_pylist(), chunk_values
+        return
+
+    reader = pd.read_csv(filename, header=0, index_col=0, engine=engine,
+                         chunksize=chunk_size,
+                         dtype={header[0]: str, **{timestamp: np.float64 for timestamp in header[1:]}})
+    with reader:
+        for chunk in reader:
+            yield chunk.index.to_list(), chunk.to_numpy(dtype=np.float64)
+
+def stream_csv(filename:str, chunk_size=DEFAULT_CHUNK_SIZE, engine='c', dtype=np.float64):
+    """Parses a CSV file in chunks into a preallocated matrix.
+
+    The number of rows is counted beforehand, so the value matrix is
+    allocated once and filled chunk by chunk. The place IDs are read first 
+    with the type inference of pandas, as when it parses the whole file, so 
+    e.g. '007' and '7' are the same integer ID and '1.0' is a float ID. 
+    Duplicated places are detected while reading and merged keeping the first 
+    valid value of each column, and the rows are finally sorted in place by 
+    place ID. The result is the same as the one of `matrix_from_dataframe`. 
+    The chunks are parsed as float64 and stored in the matrix with type 
+    `dtype`.
+
+    Args:
+        filename (str): Path to the CSV file to be read.
+        chunk_size (int, optional): Number of rows read at a time.
+            Defaults to DEFAULT_CHUNK_SIZE.
+        engine (str, optional): Either 'c' (pandas) or 'pyarrow'.
+            Defaults to 'c'.
+        dtype (np.dtype, optional): Floating-point type of the matrix.
+            Defaults to np.float64.
+
+    Returns:
+        values (np.ndarray): C-contiguous 2-D array of shape
+            (places, timestamps).
+        place_ids (list[str]): IDs of the places, one per row of `values`.
+        timestamps (list[str]): List of column names that represent the 
+            timestamps in the dataset.
+        has_duplicates (bool): Whether or not there are duplicates in the 
+            dataset.
+    """
+    header = read_csv_header(filename)
+    timestamps = header[1:]
+    row_ids = pd.read_csv(filename, header=0, usecols=[0]).iloc[:, 0].tolist()
+    values = np.empty((len(row_ids), len(timestamps)), dtype=dtype)
+    place_index = {}
+    place_ids = []
+    has_duplicates = False
+    row_count = 0
+    for chunk_ids, chunk_values in iter_csv_chunks(filename, header, chunk_size, engine):
+        new_rows = []
+        for i, place_id in enumerate(row_ids[row_count:row_count + len(chunk_ids)]):
+            if pd.isna(place_id):
+                continue
+            row = place_index.get(place_id)
+            if row is None:
+                place_index[place_id] = len(place_ids)
+                place_ids.append(place_id)
+                new_rows.append(i)
+                continue
+            # a duplicate must be merged after the rows that precede it
+            has_duplicates = True
+            if new_rows:
+                values = _store_rows(values, len(place_ids) - len(new_rows), chunk_values, new_rows)
+                new_rows = []
+            values[row] = np.where(np.isnan(values[row]), chunk_values[i], values[row])
+        values = _store_rows(values, len(place_ids) - len(new_rows), chunk_values, new_rows)
+        row_count += len(chunk_ids)
+    if row_count != len(row_ids):
+        raise ValueError(f'{filename} has {row_count} rows of values for {len(row_ids)} place IDs.')
+    values = values[:len(place_ids)]
+
+    order = np.argsort(np.array(place_ids), kind='stable')
+    place_ids = [str(place_id) for place_id in place_ids]
+    if np.any(order != np.arange(order.size)):
+        _permute_rows(values, order)
+        place_ids = [place_ids[i] for i in order]
+    return values, place_ids, timestamps, has_duplicates
+
+def _store_rows(values:np.ndarray, start:int, chunk_values:np.ndarray, rows:list[int]) -> np.ndarray:
+    """Copies rows of a chunk into the value matrix, growing it if needed."""
+    if not rows:
+        return values
+    end = start + len(rows)
+    if end > values.shape[0]:
+        values = np.resize(values, (max(end, values.shape[0] * 2), values.shape[1]))
+    if rows[-1] - rows[0] == len(rows) - 1:
+        values[start:end] = chunk_values[rows[0]:rows[-1] + 1]
+    else:
+        values[start:end] = chunk_values[rows]
+    return values
+
+def _permute_rows(values:np.ndarray, order:np.ndarray) -> None:
+    """Reorders the rows of a matrix in place, so that row i becomes row
+    order[i], using a single row of extra memory."""
+    visited = np.zeros(order.size, dtype=bool)
+    for start in range(order.size):
+        if visited[start] or order[start] == start:
+            continue
+        saved_row = values[start].copy()
+        current = start
+        while True:
+            visited[current] = True
+            source = order[current]
+            if source == start:
+                values[current] = saved_row
+                break
+            values[current] = values[source]
+            current = source
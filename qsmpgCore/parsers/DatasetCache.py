@@ -0,0 +1,174 @@
+import os
+import json
+import hashlib
+import numpy as np
+
+# Bump this value whenever the layout of the cache files changes, so that old
+# caches are discarded instead of being misread.
+CACHE_FORMAT_VERSION = 1
+CACHE_FOLDER_NAME = '.qsmpg_cache'
+VALUES_FILENAME = 'values.npy'
+METADATA_FILENAME = 'metadata.json'
+
+def get_cache_path(filename: str) -> str:
+    """Returns the path of the sidecar cache folder of a dataset file.
+
+    The cache is stored next to the source file, inside a hidden folder that
+    holds one subfolder per cached file.
+
+    Args:
+        filename (str): Path to the source dataset file.
+
+    Returns:
+        str: Path to the cache folder of the dataset file.
+    """
+    source_path = os.path.abspath(filename)
+    return os.path.join(os.path.dirname(source_path), CACHE_FOLDER_NAME,
+                        os.path.basename(source_path))
+
+def get_content_hash(filename: str, block_size: int=1 << 20) -> str:
+    """Computes a hash of the contents of a file.
+
+    Args:
+        filename (str): Path to the file.
+        block_size (int, optional): Number of bytes read at a time.
+            Defaults to 1 MiB.
+
+    Returns:
+        str: Hexadecimal digest of the file contents.
+    """
+    content_hash = hashlib.blake2b(digest_size=20)
+    with open(filename, 'rb') as source_file:
+        for block in iter(lambda: source_file.read(block_size), b''):
+            content_hash.update(block)
+    return content_hash.hexdigest()
+
+def get_file_key(filename: str, content_hash: str=None) -> dict:
+    """Returns the values that identify a version of a file.
+
+    Args:
+        filename (str): Path to the file.
+        content_hash (str, optional): Precomputed hash of the file contents.
+            If not given, it is computed from the file. Defaults to None.
+
+    Returns:
+        dict: The path, size, modification time and content hash of the file.
+    """
+    stat = os.stat(filename)
+    return {
+        'path': os.path.abspath(filename),
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'hash': get_content_hash(filename) if content_hash is None else content_hash,
+    }
+
+def read_cache_metadata(filename: str) -> dict | None:
+    """Reads the metadata of the cache of a dataset file.
+
+    Args:
+        filename (str): Path to the source dataset file.
+
+    Returns:
+        dict | None: The cache metadata, or None if there is no readable cache.
+    """
+    metadata_path = os.path.join(get_cache_path(filename), METADATA_FILENAME)
+    try:
+        with open(metadata_path, 'r') as metadata_file:
+            metadata = json.load(metadata_file)
+    except (OSError, ValueError):
+        return None
+    if metadata.get('version') != CACHE_FORMAT_VERSION:
+        return None
+    return metadata
+
+def is_cache_valid(filename: str, metadata: dict) -> bool:
+    """Checks whether a cache still corresponds to its source file.
+
+    The size and modification time are checked first. The content hash is
+    only computed when the size matches but the modification time does not,
+    which happens when a file is copied or touched without being modified.
+
+    Args:
+        filename (str): Path to the source dataset file.
+        metadata (dict): The cache metadata.
+
+    Returns:
+        bool: True if the cached data can be used for the source file.
+    """
+    cached_key = metadata['key']
+    stat = os.stat(filename)
+    if cached_key['path'] != os.path.abspath(filename) or cached_key['size'] != stat.st_size:
+        return False
+    if cached_key['mtime_ns'] == stat.st_mtime_ns:
+        return True
+    return cached_key['hash'] == get_content_hash(filename)
+
+def load_cache(filename: str) -> tuple | None:
+    """Loads the cached parsed data of a dataset file.
+
+    The value matrix is memory-mapped, so loading does not depend on the size
+    of the dataset. Stale caches are ignored.
+
+    Args:
+        filename (str): Path to the source dataset file.
+
+    Returns:
+        tuple | None: The value matrix, place IDs, timestamps and duplicates
+            flag of the dataset, or None if there is no valid cache.
+    """
+    metadata = read_cache_metadata(filename)
+    if metadata is None or not is_cache_valid(filename, metadata):
+        return None
+    values_path = os.path.join(get_cache_path(filename), VALUES_FILENAME)
+    try:
+        values = np.load(values_path, mmap_mode='r')
+    except (OSError, ValueError):
+        return None
+    if values.shape != (len(metadata['place_ids']), len(metadata['timestamps'])):
+        return None
+    return values, metadata['place_ids'], metadata['timestamps'], metadata['has_duplicates']
+
+def save_cache(filename: str, values: np.ndarray, place_ids: list[str],
+               timestamps: list[str], has_duplicates: bool) -> bool:
+    """Stores the parsed data of a dataset file in its sidecar cache.
+
+    Files are written under temporary names and then moved into place, so an
+    interrupted write never leaves a cache that looks valid. Failing to write
+    the cache (e.g. on a read-only folder) is not an error.
+
+    Args:
+        filename (str): Path to the source dataset file.
+        values (np.ndarray): Deduplicated value matrix (places x timestamps).
+        place_ids (list[str]): Place IDs, in the same order as the rows of
+            `values`.
+        timestamps (list[str]): Column names of the dataset.
+        has_duplicates (bool): Whether the source file had duplicated places.
+
+    Returns:
+        bool: True if the cache was written.
+    """
+    cache_path = get_cache_path(filename)
+    metadata = {
+        'version': CACHE_FORMAT_VERSION,
+        'key': get_file_key(filename),
+        'place_ids': list(place_ids),
+        'timestamps': list(timestamps),
+        'has_duplicates': bool(has_duplicates),
+    }
+    values_path = os.path.join(cache_path, VALUES_FILENAME)
+    metadata_path = os.path.join(cache_path, METADATA_FILENAME)
+    try:
+        os.makedirs(cache_path, exist_ok=True)
+        # the metadata is removed first, so the cache is never valid with
+        # partially written values
+        if os.path.exists(metadata_path):
+            os.remove(metadata_path)
+        with open(values_path + '.tmp', 'wb') as values_file:
+            np.save(values_file, np.ascontiguousarray(values))
+        os.replace(values_path + '.tmp', values_path)
+        with open(metadata_path + '.tmp', 'w') as metadata_file:
+            json.dump(metadata, metadata_file)
+        os.replace(metadata_path + '.tmp', metadata_path)
+    except OSError:
+        return False
+    return True
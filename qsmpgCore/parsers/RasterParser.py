@@ -0,0 +1,222 @@
+import os
+import re
+import glob
+import numpy as np
+from osgeo import gdal
+from ..structures import GridTimeSeriesMatrix
+
+gdal.UseExceptions()
+
+# Extensions of single-date rasters that are read as a stack, one file per
+# timestamp, and of multi-band cubes, one band per timestamp
+STACK_EXTENSIONS = ('.tif', '.tiff', '.bil', '.img')
+CUBE_EXTENSIONS = ('.nc', '.nc4')
+# Approximate size in bytes of the windows read from each raster
+WINDOW_BYTES = 1 << 24
+
+def is_raster_source(source: str | list[str]) -> bool:
+    """Checks whether a dataset source should be read with this parser.
+
+    Args:
+        source (str | list[str]): Path to a file or folder, or list of paths.
+
+    Returns:
+        bool: True if the source is a raster stack or cube.
+    """
+    if isinstance(source, (list, tuple)):
+        return len(source) > 0 and all(is_raster_source(filename) for filename in source)
+    if os.path.isdir(source):
+        return len(list_raster_files(source)) > 0
+    return os.path.splitext(source)[1].lower() in STACK_EXTENSIONS + CUBE_EXTENSIONS
+
+def get_timestamp_key(filename: str) -> str:
+    """Returns the six-digit year and sub-period number in a file name."""
+    match = re.search(r"\d{6}", os.path.basename(filename))
+    if match is None:
+        raise(RuntimeError(f'The name of {filename} must contain a six digit number indicating the year and sub-period number.'))
+    return match.group()
+
+def list_raster_files(source: str | list[str]) -> list[str]:
+    """Returns the rasters of a stack sorted by their timestamps.
+
+    Args:
+        source (str | list[str]): Path to a folder of rasters, or list of
+            raster paths.
+
+    Returns:
+        list[str]: Paths of the rasters, sorted by the six-digit number in
+            their names.
+    """
+    if isinstance(source, (list, tuple)):
+        filenames = list(source)
+    else:
+        filenames = [filename for filename in glob.glob(os.path.join(source, '*'))
+                     if os.path.splitext(filename)[1].lower() in STACK_EXTENSIONS]
+    return sorted(filenames, key=get_timestamp_key)
+
+def open_layers(source: str | list[str], timestamps: list[str]=None):
+    """Opens the rasters of a stack or the bands of a cube.
+
+    Args:
+        source (str | list[str]): Path to a cube file, path to a folder of
+            rasters, or list of raster paths.
+        timestamps (list[str], optional): Timestamps of the layers. By
+            default, they are taken from the file names of a stack, or from
+            the band descriptions of a cube. Defaults to None.
+
+    Returns:
+        datasets (list[gdal.Dataset]): Opened datasets, which must be kept
+            alive while their bands are used.
+        bands (list[gdal.Band]): One band per timestamp.
+        timestamps (list[str]): Timestamps of the bands.
+    """
+    if isinstance(source, str) and os.path.splitext(source)[1].lower() in CUBE_EXTENSIONS:
+        datasets = [gdal.Open(source, gdal.GA_ReadOnly)]
+        if datasets[0].RasterCount == 0 and len(datasets[0].GetSubDatasets()) > 0:
+            # NetCDF files with several variables are read from the first one
+            datasets = [gdal.Open(datasets[0].GetSubDatasets()[0][0], gdal.GA_ReadOnly)]
+        bands = [datasets[0].GetRasterBand(i+1) for i in range(datasets[0].RasterCount)]
+        if timestamps is None:
+            timestamps = [band.GetDescription() for band in bands]
+    else:
+        filenames = list_raster_files(source)
+        datasets = [gdal.Open(filename, gdal.GA_ReadOnly) for filename in filenames]
+        bands = [dataset.GetRasterBand(1) for dataset in datasets]
+        if timestamps is None:
+            timestamps = [os.path.splitext(os.path.basename(filename))[0] for filename in filenames]
+    if len(bands) == 0:
+        raise FileNotFoundError(f'No rasters were found in {source}.')
+    if len(timestamps) != len(bands):
+        raise ValueError(f'{len(timestamps)} timestamps were given for {len(bands)} rasters.')
+    for timestamp in timestamps:
+        if re.search(r"\d{6}", timestamp) is None:
+            raise(RuntimeError(f'The timestamp {timestamp} must contain a six digit number indicating the year and sub-period number.'))
+
+    geotransform = datasets[0].GetGeoTransform()
+    for dataset in datasets[1:]:
+        if (dataset.RasterXSize, dataset.RasterYSize) != (datasets[0].RasterXSize, datasets[0].RasterYSize) \
+                or dataset.GetGeoTransform() != geotransform:
+            raise ValueError(f'The grid of {dataset.GetDescription()} does not match the grid of {datasets[0].GetDescription()}.')
+    return datasets, bands, list(timestamps)
+
+def get_window_rows(band: gdal.Band) -> int:
+    """Returns the number of rows read at a time from a band.
+
+    The windows are aligned to the block height of the band and hold about
+    `WINDOW_BYTES` bytes.
+    """
+    block_rows = max(band.GetBlockSize()[1], 1)
+    row_bytes = band.XSize * np.dtype(np.float64).itemsize
+    return max(WINDOW_BYTES // (row_bytes * block_rows), 1) * block_rows
+
+def map_band(band: gdal.Band) -> np.ndarray | None:
+    """Memory-maps a band when its format stores raw pixels (e.g. BIL).
+
+    Returns:
+        np.ndarray | None: The memory-mapped 2-D array, or None if the
+            format does not allow it.
+    """
+    try:
+        return band.GetVirtualMemAutoArray(gdal.GF_Read)
+    except (RuntimeError, AttributeError):
+        return None
+
+def iter_band_windows(band: gdal.Band, window_rows: int):
+    """Reads a band in windows of full rows.
+
+    Yields:
+        tuple: The index of the first row of the window and the 2-D array of
+            the window.
+    """
+    mapped_band = map_band(band)
+    for row_start in range(0, band.YSize, window_rows):
+        row_count = min(window_rows, band.YSize - row_start)
+        if mapped_band is not None:
+            yield row_start, mapped_band[row_start:row_start+row_count]
+        else:
+            yield row_start, band.ReadAsArray(0, row_start, band.XSize, row_count)
+
+def get_valid_mask(band: gdal.Band, window_rows: int=None) -> np.ndarray:
+    """Returns the mask of the pixels with data in a band.
+
+    Args:
+        band (gdal.Band): The band to be read.
+        window_rows (int, optional): Number of rows read at a time.
+            Defaults to `get_window_rows(band)`.
+
+    Returns:
+        np.ndarray: 2-D boolean array, True for the pixels that have data.
+    """
+    nodata = band.GetNoDataValue()
+    valid_mask = np.empty((band.YSize, band.XSize), dtype=bool)
+    for row_start, window in iter_band_windows(band, window_rows or get_window_rows(band)):
+        window_mask = np.isfinite(window) if np.issubdtype(window.dtype, np.floating) else np.ones(window.shape, dtype=bool)
+        if nodata is not None:
+            window_mask &= window != nodata
+        valid_mask[row_start:row_start+window.shape[0]] = window_mask
+    return valid_mask
+
+def probe_raster_stack(source: str | list[str], timestamps: list[str]=None):
+    """
+    Reads the metadata of a raster stack or cube, reading only the values of
+    its first raster.
+
+    Args:
+        source (str | list[str]): Path to a cube file, path to a folder of
+            rasters, or list of raster paths.
+        timestamps (list[str], optional): Timestamps of the layers.
+            Defaults to None.
+
+    Returns:
+        timestamps (list[str]): List of timestamps of the dataset.
+        row_count (int): Number of places, i.e. pixels with data in the first
+            raster.
+    """
+    datasets, bands, timestamps = open_layers(source, timestamps)
+    return timestamps, int(np.count_nonzero(get_valid_mask(bands[0])))
+
+def parse_raster_stack(source: str | list[str], timestamps: list[str]=None,
+                       window_rows: int=None, dtype=np.float64) -> GridTimeSeriesMatrix:
+    """
+    Reads a stack of rasters or a raster cube into a matrix of places by
+    timestamps, where each pixel with data is a place.
+
+    The places are the pixels with data in the first raster of the stack.
+    Pixels without data in later rasters get NaN values. The rasters are read
+    in windows of rows, and memory-mapped when the format allows it.
+
+    Args:
+        source (str | list[str]): Path to a cube file (e.g. NetCDF), path to a
+            folder of rasters (e.g. GeoTIFF or BIL), or list of raster paths.
+            Stacked rasters must have the six-digit year and sub-period
+            number in their names.
+        timestamps (list[str], optional): Timestamps of the layers. By
+            default, they are taken from the file names of a stack, or from
+            the band descriptions of a cube. Defaults to None.
+        window_rows (int, optional): Number of rows read at a time.
+            Defaults to `get_window_rows`.
+        dtype (np.dtype, optional): Floating-point type of the value matrix.
+            The no-data values are detected before the conversion.
+            Defaults to np.float64.
+
+    Returns:
+        GridTimeSeriesMatrix: The value matrix of the dataset, along with the
+            timestamps and the grid of the places.
+    """
+    datasets, bands, timestamps = open_layers(source, timestamps)
+    window_rows = window_rows or get_window_rows(bands[0])
+    valid_mask = get_valid_mask(bands[0], window_rows)
+    # offset of the first place of each row of the grid
+    row_offsets = np.concatenate(([0], np.cumsum(np.count_nonzero(valid_mask, axis=1))))
+
+    values = np.empty((row_offsets[-1], len(bands)), dtype=dtype)
+    for i, band in enumerate(bands):
+        nodata = band.GetNoDataValue()
+        for row_start, window in iter_band_windows(band, window_rows):
+            row_end = row_start + window.shape[0]
+            window_values = window[valid_mask[row_start:row_end]].astype(np.float64)
+            if nodata is not None:
+                window_values[window_values == nodata] = np.nan
+            values[row_offsets[row_start]:row_offsets[row_end], i] = window_values
+    return GridTimeSeriesMatrix(values, timestamps, valid_mask,
+                                datasets[0].GetGeoTransform(), datasets[0].GetProjection())
@@ -0,0 +1,147 @@
+import numpy as np
+from numpy import ndarray
+
+# Percentiles of the drought severity classes, the last two are the terciles
+DROUGHT_SEVERITY_PERCENTILES = (3, 6, 11, 21, 33, 67)
+TERCILE_PERCENTILES = (33, 67)
+
+def search_sorted(sorted_values: ndarray, counts: ndarray, scores: ndarray, side='left') -> ndarray:
+    """Row-wise version of `np.searchsorted` for many sorted samples at once.
+
+    It runs a binary search over all the rows at the same time.
+
+    Args:
+        sorted_values (ndarray): Array of shape (places, values), sorted
+            along its rows.
+        counts (ndarray): Number of values of each row to be searched, the
+            rest of the row is ignored.
+        scores (ndarray): Array of shape (places, scores) with the values to
+            be searched in each row.
+        side (str, optional): 'left' or 'right', as in `np.searchsorted`.
+            Defaults to 'left'.
+
+    Returns:
+        ndarray: Array of the shape of `scores` with the insertion indexes.
+    """
+    lower = np.zeros(scores.shape, dtype=np.intp)
+    upper = np.broadcast_to(counts[:, np.newaxis], scores.shape).astype(np.intp)
+    last_index = max(sorted_values.shape[1] - 1, 0)
+    for _ in range(int(np.ceil(np.log2(sorted_values.shape[1] + 1)))):
+        active = lower < upper
+        middle = (lower + upper) // 2
+        middle_values = np.take_along_axis(sorted_values, np.minimum(middle, last_index), axis=1)
+        with np.errstate(invalid='ignore'):
+            go_right = middle_values < scores if side == 'left' else middle_values <= scores
+        lower = np.where(active & go_right, middle + 1, lower)
+        upper = np.where(active & ~go_right, middle, upper)
+    return lower
+
+class SortedSamples:
+    """One sample of values per place, sorted once to answer percentile
+    queries for all places in bulk.
+
+    Attributes:
+        sorted_values (ndarray): Array of shape (places, values), sorted along
+            its rows, with the NaN at the end.
+        counts (ndarray): Number of values of each sample.
+        invalid (ndarray): Boolean array, True for the samples whose queries
+            are NaN.
+    """
+    def __init__(self, values: ndarray, ignore_nan=False, is_sorted=False) -> None:
+        """Constructor
+
+        Args:
+            values (ndarray): Array of shape (places, values).
+            ignore_nan (bool, optional): Whether the NaN are padding to be
+                left out of the samples, as in `np.nanpercentile`. If False, a
+                NaN makes the results of its sample NaN, as in `np.percentile`
+                and `scipy.stats.percentileofscore`. Defaults to False.
+            is_sorted (bool, optional): Whether the rows of `values` are
+                already sorted, with the NaN at the end. Defaults to False.
+        """
+        self.sorted_values = values if is_sorted else np.sort(values, axis=1)
+        nan_values = np.isnan(self.sorted_values)
+        if ignore_nan:
+            self.counts = values.shape[1] - np.count_nonzero(nan_values, axis=1)
+            self.invalid = self.counts == 0
+        else:
+            self.counts = np.full(values.shape[0], values.shape[1])
+            self.invalid = nan_values[:, -1] if values.shape[1] > 0 else np.ones(values.shape[0], dtype=bool)
+
+    def values_at(self, percentiles=DROUGHT_SEVERITY_PERCENTILES) -> ndarray:
+        """Returns the values at the given percentiles of each sample.
+
+        It follows `np.percentile` with the 'linear' method.
+
+        Args:
+            percentiles (tuple, optional): Percentiles between 0 and 100.
+                Defaults to DROUGHT_SEVERITY_PERCENTILES.
+
+        Returns:
+            ndarray: Array of shape (places, percentiles).
+        """
+        if self.sorted_values.shape[1] == 0:
+            return np.full((self.sorted_values.shape[0], len(percentiles)), np.nan)
+        quantiles = np.true_divide(np.asarray(percentiles, dtype=np.float64), 100)
+        virtual_indexes = (self.counts[:, np.newaxis] - 1) * quantiles[np.newaxis, :]
+        previous_indexes = np.floor(virtual_indexes)
+        gammas = virtual_indexes - previous_indexes
+        previous_indexes = previous_indexes.astype(np.intp)
+        next_indexes = previous_indexes + 1
+        above_bounds = virtual_indexes >= self.counts[:, np.newaxis] - 1
+        previous_indexes[above_bounds] = next_indexes[above_bounds] = np.broadcast_to(
+            self.counts[:, np.newaxis] - 1, above_bounds.shape)[above_bounds]
+        below_bounds = virtual_indexes < 0
+        previous_indexes[below_bounds] = next_indexes[below_bounds] = 0
+        previous_values = np.take_along_axis(self.sorted_values, np.maximum(previous_indexes, 0), axis=1)
+        next_values = np.take_along_axis(self.sorted_values, np.maximum(next_indexes, 0), axis=1)
+        # same interpolation as numpy, from the closest bound
+        differences = next_values - previous_values
+        values = np.where(gammas >= 0.5, next_values - differences * (1 - gammas), previous_values + differences * gammas)
+        values[self.invalid] = np.nan
+        return values
+
+    def percentiles_of(self, scores: ndarray) -> ndarray:
+        """Returns the percentile rank of scores in each sample.
+
+        It follows `scipy.stats.percentileofscore` with kind='rank'.
+
+        Args:
+            scores (ndarray): Array of shape (places,) or (places, scores).
+
+        Returns:
+            ndarray: Array of shape (places, scores).
+        """
+        scores = scores.reshape(scores.shape[0], -1)
+        left = search_sorted(self.sorted_values, self.counts, scores, 'left')
+        right = search_sorted(self.sorted_values, self.counts, scores, 'right')
+        plus1 = left < right
+        with np.errstate(invalid='ignore', divide='ignore'):
+            percentiles = (left + right + plus1) * (50.0 / self.counts[:, np.newaxis])
+        percentiles[self.invalid] = np.nan
+        percentiles[np.isnan(scores)] = np.nan
+        return percentiles
+
+    def without(self, values: ndarray, removed: ndarray) -> 'SortedSamples':
+        """Returns the samples with a value left out of some of them, without
+        sorting them again.
+
+        The samples must ignore the NaN, see `ignore_nan`.
+
+        Args:
+            values (ndarray): Value to leave out of each sample.
+            removed (ndarray): Boolean array, True for the samples that
+                contain their value and leave it out.
+
+        Returns:
+            SortedSamples: The samples, with as many columns as these ones.
+        """
+        place_count, value_count = self.sorted_values.shape
+        # the rows that keep all their values drop a NaN column instead
+        padded = np.empty((place_count, value_count + 1), dtype=self.sorted_values.dtype)
+        padded[:, :-1] = self.sorted_values
+        padded[:, -1] = np.nan
+        positions = search_sorted(self.sorted_values, self.counts, values[:, np.newaxis])[:, 0]
+        kept = np.ones(padded.shape, dtype=bool)
+        kept[np.arange(place_count), np.where(removed, positions, value_count)] = False
+        return SortedSamples(padded[kept].reshape(place_count, value_count), ignore_nan=True, is_sorted=True)
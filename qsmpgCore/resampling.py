@@ -0,0 +1,77 @@
+import re
+import numpy as np
+from .structures import TimeSeriesMatrix
+from .utils import yearly_periods, parse_timestamps
+
+def get_resampling_units(timestamps: list[str]) -> list[str]:
+    """Returns the period units a dataset can be resampled to.
+
+    A dataset can be aggregated to any unit whose sub-periods are made of a
+    whole number of its own sub-periods, e.g. pentads to dekads or months,
+    as long as it starts at the first sub-period of a year.
+
+    Args:
+        timestamps (list[str]): Timestamps of the dataset.
+
+    Returns:
+        list[str]: The available period units, from the finest to the
+            coarsest, starting with the period unit of the dataset.
+    """
+    period_unit_id = parse_timestamps(timestamps)['period_unit_id']
+    if re.search(r"\d{6}", timestamps[0]).group()[4:] != '01':
+        return [period_unit_id]
+    period_length = yearly_periods[period_unit_id]
+    units = [unit for unit, length in yearly_periods.items()
+             if length <= period_length and period_length % length == 0]
+    return sorted(units, key=lambda unit: -yearly_periods[unit])
+
+def resample_timestamps(timestamps: list[str], period_unit_id: str) -> list[str]:
+    """Returns the timestamps of a dataset aggregated to another period unit.
+
+    The timestamps keep the format of the original ones, with the six-digit
+    number replaced by the year and the sub-period in the new unit. A
+    trailing sub-period that is not complete in the original data is left
+    out.
+
+    Args:
+        timestamps (list[str]): Timestamps of the dataset.
+        period_unit_id (str): The period unit to aggregate to.
+
+    Returns:
+        list[str]: The timestamps in the new period unit.
+    """
+    properties = parse_timestamps(timestamps)
+    if period_unit_id == properties['period_unit_id']:
+        return list(timestamps)
+    if period_unit_id not in get_resampling_units(timestamps):
+        raise ValueError(f'A dataset by {properties["period_unit_id"]} starting at {timestamps[0]} cannot be resampled by {period_unit_id}.')
+    match = re.search(r"\d{6}", timestamps[0])
+    factor = properties['period_length'] // yearly_periods[period_unit_id]
+    target_length = yearly_periods[period_unit_id]
+    first_year = int(match.group()[:4])
+    prefix, suffix = timestamps[0][:match.start()], timestamps[0][match.end():]
+    return [f'{prefix}{first_year + i // target_length:04d}{i % target_length + 1:02d}{suffix}'
+            for i in range(len(timestamps) // factor)]
+
+def resample_dataset(dataset: TimeSeriesMatrix, period_unit_id: str) -> TimeSeriesMatrix:
+    """Aggregates the time axis of a dataset to a coarser period unit.
+
+    Consecutive sub-periods are summed by reshaping the value matrix, so the
+    result looks like a dataset parsed natively in the new unit. Missing
+    values make their aggregated sub-period missing as well.
+
+    Args:
+        dataset (TimeSeriesMatrix): The parsed dataset.
+        period_unit_id (str): The period unit to aggregate to, e.g. 'Month'.
+
+    Returns:
+        TimeSeriesMatrix: The resampled dataset, or `dataset` itself if it
+            already has the requested period unit.
+    """
+    timestamps = resample_timestamps(dataset.timestamps, period_unit_id)
+    if len(timestamps) == len(dataset.timestamps):
+        return dataset
+    factor = parse_timestamps(dataset.timestamps)['period_length'] // yearly_periods[period_unit_id]
+    place_count = len(dataset.place_ids)
+    values = dataset.values[:, :len(timestamps) * factor].reshape(place_count, len(timestamps), factor).sum(axis=2)
+    return dataset.copy_with_values(values, timestamps)
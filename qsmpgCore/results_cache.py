@@ -0,0 +1,539 @@
+import os
+import json
+import hashlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+import numpy as np
+from .structures import Dataset, TimeSeriesMatrix
+from .engine import StatsRequest, get_all_stats_request
+from .utils import Parameters
+
+# Bump this value whenever the stored results change, so that old results
+# are computed again instead of being misread.
+RESULTS_FORMAT_VERSION = 1
+RESULTS_SUFFIX = '.npz'
+METADATA_SUFFIX = '.json'
+
+# Parameters that change the computed statistics. The rest, such as the
+# outputs, the mapping attributes or the executor, do not change the results
+# and are left out of the keys.
+COMPUTATION_PARAMETERS = (
+    'climatology_start', 'climatology_end', 'season_start', 'season_end', 'cross_years', 'period_unit',
+    'mask_missing_data', 'max_missing_periods', 'min_valid_years', 'precision', 'selected_years',
+    'use_pearson', 'is_forecast',
+)
+
+# Parameters of the windows that the normals of the past seasons are
+# computed over. The rest of what they depend on, such as the gap rules of
+# the masked mode, is in the hashed seasons.
+NORMALS_PARAMETERS = (
+    'climatology_start', 'climatology_end', 'season_start', 'season_end', 'cross_years', 'period_unit',
+)
+
+# Rows of the value matrix hashed at a time
+HASH_BLOCK_PLACES = 4096
+
+def get_matrix_hash(dataset: TimeSeriesMatrix) -> str:
+    """Computes a hash of the values, place IDs and timestamps of a dataset.
+
+    Args:
+        dataset (TimeSeriesMatrix): The parsed dataset.
+
+    Returns:
+        str: Hexadecimal digest of the dataset.
+    """
+    matrix_hash = hashlib.blake2b(digest_size=20)
+    values = dataset.values
+    matrix_hash.update(json.dumps([values.dtype.str, values.shape, dataset.place_ids, dataset.timestamps]).encode())
+    for start in range(0, values.shape[0], HASH_BLOCK_PLACES):
+        matrix_hash.update(np.ascontiguousarray(values[start:start + HASH_BLOCK_PLACES]).data)
+    return matrix_hash.hexdigest()
+
+def get_normals_key(dataset: Dataset) -> str:
+    """Computes the key of the normals of a dataset, see
+    `BatchedStats.get_normals`.
+
+    It is a hash of the past seasons of the computed places, their valid
+    seasons in the masked mode and the windows of the normals, so it does not
+    change while the current season goes on.
+
+    Args:
+        dataset (Dataset): The dataset, before its statistics are computed.
+
+    Returns:
+        str: Hexadecimal key.
+    """
+    normals_hash = hashlib.blake2b(digest_size=20)
+    seasons = dataset.values[:, dataset.season_shift:dataset.climatology_end_index]
+    windows = {name: getattr(dataset.parameters, name) for name in NORMALS_PARAMETERS}
+    normals_hash.update(json.dumps([RESULTS_FORMAT_VERSION, seasons.dtype.str, seasons.shape, dataset.properties.place_ids,
+                                    dataset.properties.year_ids, windows, dataset.valid_seasons is None], sort_keys=True).encode())
+    for start in range(0, seasons.shape[0], HASH_BLOCK_PLACES):
+        normals_hash.update(np.ascontiguousarray(seasons[start:start + HASH_BLOCK_PLACES]).data)
+        if dataset.valid_seasons is not None:
+            normals_hash.update(np.ascontiguousarray(dataset.valid_seasons[start:start + HASH_BLOCK_PLACES]).data)
+    return normals_hash.hexdigest()
+
+def get_results_key(matrix_hash: str, parameters: Parameters) -> str:
+    """Returns the key of the results of a dataset with some parameters.
+
+    Args:
+        matrix_hash (str): Hash of the dataset, see `get_matrix_hash`.
+        parameters (Parameters): The computation parameters, only the
+            `COMPUTATION_PARAMETERS` are part of the key.
+
+    Returns:
+        str: Hexadecimal key.
+    """
+    computation_parameters = {name: getattr(parameters, name) for name in COMPUTATION_PARAMETERS}
+    key_source = json.dumps([RESULTS_FORMAT_VERSION, matrix_hash, computation_parameters], sort_keys=True)
+    return hashlib.blake2b(key_source.encode(), digest_size=20).hexdigest()
+
+def get_dataset_nbytes(dataset: Dataset) -> int:
+    """Returns the number of bytes of the arrays of a computed dataset."""
+    results = dataset.stats.get_results()
+    arrays = [dataset.values] + [value for value in results.values() if isinstance(value, np.ndarray)]
+    arrays += list(results['place_stats'].values()) + list(results['selected_years_place_stats'].values())
+    # the statistics shared by both subsets are counted once
+    return sum(array.nbytes for array in {id(array): array for array in arrays}.values())
+
+def prune_folder(folder: str, max_bytes: int) -> None:
+    """Removes the least recently used archives of a folder, with their
+    metadata, past a number of bytes."""
+    try:
+        entries = []
+        for filename in os.listdir(folder):
+            if filename.endswith(RESULTS_SUFFIX):
+                results_path = os.path.join(folder, filename)
+                stat = os.stat(results_path)
+                entries.append((stat.st_mtime_ns, stat.st_size, results_path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, results_path in sorted(entries):
+            if total <= max_bytes:
+                break
+            metadata_path = results_path[:-len(RESULTS_SUFFIX)] + METADATA_SUFFIX
+            if os.path.exists(metadata_path):
+                os.remove(metadata_path)
+            os.remove(results_path)
+            total -= size
+    except OSError:
+        pass
+
+def write_archive(results_path: str, metadata_path: str, arrays: list[np.ndarray], metadata: dict) -> None:
+    """Writes the arrays of an archive and its metadata.
+
+    Files are written under temporary names and then moved into place, and
+    the metadata is written last, so an interrupted write never leaves an
+    archive that looks valid.
+
+    Raises:
+        OSError: If the files cannot be written.
+    """
+    os.makedirs(os.path.dirname(results_path), exist_ok=True)
+    if os.path.exists(metadata_path):
+        os.remove(metadata_path)
+    with open(results_path + '.tmp', 'wb') as results_file:
+        np.savez(results_file, **{f'a{i}': array for i, array in enumerate(arrays)})
+    os.replace(results_path + '.tmp', results_path)
+    with open(metadata_path + '.tmp', 'w') as metadata_file:
+        json.dump(metadata, metadata_file)
+    os.replace(metadata_path + '.tmp', metadata_path)
+
+def read_archive(results_path: str, metadata_path: str) -> tuple[list[np.ndarray], dict] | None:
+    """Reads the arrays of an archive and its metadata, written by
+    `write_archive`.
+
+    Returns:
+        tuple | None: The arrays and the metadata, or None if nothing valid
+            is stored.
+    """
+    try:
+        with open(metadata_path, 'r') as metadata_file:
+            metadata = json.load(metadata_file)
+        if metadata.get('version') != RESULTS_FORMAT_VERSION:
+            return None
+        with np.load(results_path, allow_pickle=False) as archive:
+            arrays = [archive[f'a{i}'] for i in range(len(archive.files))]
+        # the files are touched to track the least recently used ones
+        os.utime(results_path)
+        os.utime(metadata_path)
+    except (OSError, ValueError, KeyError):
+        return None
+    return arrays, metadata
+
+def clear_folder(folder: str) -> None:
+    """Removes the archives of a folder, with their metadata."""
+    try:
+        for filename in os.listdir(folder):
+            if filename.endswith((RESULTS_SUFFIX, METADATA_SUFFIX)):
+                os.remove(os.path.join(folder, filename))
+    except OSError:
+        pass
+
+def save_archive(folder: str, max_folder_bytes: int, results_path: str, metadata_path: str,
+                 arrays: list[np.ndarray], metadata: dict) -> bool:
+    """Writes an archive with `write_archive` and prunes its folder. Failing
+    to write it (e.g. on a read-only folder) is not an error.
+
+    Returns:
+        bool: True if the archive was written.
+    """
+    try:
+        write_archive(results_path, metadata_path, arrays, metadata)
+    except OSError:
+        return False
+    prune_folder(folder, max_folder_bytes)
+    return True
+
+class ArchiveWriter:
+    """Writes the archives of a folder one at a time on a background thread,
+    so that a computation does not wait for the disk.
+
+    The arrays must not be modified until they are written.
+
+    Attributes:
+        pending (list[Future]): The writes that may not be finished.
+    """
+    def __init__(self) -> None:
+        """Constructor"""
+        self.executor: ThreadPoolExecutor | None = None
+        self.pending = []
+
+    def submit(self, *arguments) -> None:
+        """Starts writing an archive, with the arguments of `save_archive`."""
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=1)
+        self.pending = [future for future in self.pending if not future.done()]
+        self.pending.append(self.executor.submit(save_archive, *arguments))
+
+    def wait(self) -> None:
+        """Waits until the archives that were submitted are written."""
+        wait(self.pending)
+        self.pending = []
+
+class NormalsStore:
+    """Normals of the past seasons of datasets, see
+    `BatchedStats.get_normals`, reused by the computations of the following
+    sub-periods of the current season.
+
+    The normals are stored by `get_normals_key`, so they are computed again
+    only when the past seasons or the windows change. They are kept in memory
+    up to a number of bytes, dropping the least recently used ones first, and
+    stored as NumPy archives when a folder is given. The archives are written
+    in the background, see `ArchiveWriter`.
+
+    Attributes:
+        max_bytes (int): Bytes of the normals kept in memory.
+        folder (str | None): Folder of the stored normals, None to keep them
+            only in memory.
+        max_folder_bytes (int): Bytes of the files kept in `folder`.
+        entries (OrderedDict[str, dict[str, ndarray]]): The normals in memory
+            by key, from the least to the most recently used.
+        writer (ArchiveWriter): Writer of the archives.
+        hits (int): Number of loads that found normals.
+        misses (int): Number of loads that found none.
+    """
+    def __init__(self, max_bytes: int=32 << 20, folder: str=None, max_folder_bytes: int=32 << 20) -> None:
+        """Constructor
+
+        Args:
+            max_bytes (int, optional): Bytes of the normals kept in memory.
+                Defaults to 32 MiB.
+            folder (str, optional): Folder of the stored normals. Defaults to
+                None, meaning that they are only kept in memory.
+            max_folder_bytes (int, optional): Bytes of the files kept in
+                `folder`. Defaults to 32 MiB.
+        """
+        self.max_bytes = max_bytes
+        self.folder = folder
+        self.max_folder_bytes = max_folder_bytes
+        self.entries: OrderedDict[str, dict[str, np.ndarray]] = OrderedDict()
+        self.writer = ArchiveWriter()
+        self.hits = 0
+        self.misses = 0
+
+    def get_key(self, dataset: Dataset) -> str:
+        """Returns the key of the normals of a dataset, see
+        `get_normals_key`."""
+        return get_normals_key(dataset)
+
+    def load(self, key: str) -> dict[str, np.ndarray] | None:
+        """Returns the normals of a key, from memory or from `folder`, or
+        None if there are none, and counts the load in `hits` or `misses`."""
+        normals = self.find(key)
+        if normals is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return normals
+
+    def find(self, key: str) -> dict[str, np.ndarray] | None:
+        """Returns the normals of a key as `load`, without counting the
+        load."""
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            return self.entries[key]
+        if self.folder is None:
+            return None
+        stored = read_archive(*self.get_paths(key))
+        if stored is None:
+            return None
+        arrays, metadata = stored
+        normals = {name: arrays[index] for name, index in metadata['normals'].items()}
+        self.store(key, normals)
+        return normals
+
+    def update(self, key: str, normals: dict[str, np.ndarray]) -> None:
+        """Adds computed normals to those of a key.
+
+        Args:
+            key (str): Key of the normals, see `get_normals_key`.
+            normals (dict[str, ndarray]): The normals that were not stored,
+                see `BatchedStats.get_normals`.
+        """
+        if not normals:
+            return
+        normals = {**(self.find(key) or {}), **normals}
+        self.store(key, normals)
+        self.save(key, normals)
+
+    def store(self, key: str, normals: dict[str, np.ndarray]) -> None:
+        """Keeps normals in memory, dropping the least recently used ones
+        past `max_bytes`."""
+        self.entries.pop(key, None)
+        if sum(array.nbytes for array in normals.values()) > self.max_bytes:
+            return
+        self.entries[key] = normals
+        total = sum(array.nbytes for entry in self.entries.values() for array in entry.values())
+        while total > self.max_bytes:
+            _, entry = self.entries.popitem(last=False)
+            total -= sum(array.nbytes for array in entry.values())
+
+    def clear(self) -> None:
+        """Drops the normals kept in memory, the stored files are kept."""
+        self.entries.clear()
+
+    def clear_folder(self) -> None:
+        """Removes the stored normals from `folder`."""
+        self.writer.wait()
+        if self.folder is not None:
+            clear_folder(self.folder)
+
+    def get_paths(self, key: str) -> tuple[str, str]:
+        """Returns the paths of the archive and the metadata of a key."""
+        return (os.path.join(self.folder, key + RESULTS_SUFFIX), os.path.join(self.folder, key + METADATA_SUFFIX))
+
+    def save(self, key: str, normals: dict[str, np.ndarray]) -> bool:
+        """Starts storing the normals of a key in `folder`, see
+        `save_archive`.
+
+        Returns:
+            bool: True if the normals are being written.
+        """
+        if self.folder is None:
+            return False
+        metadata = {'version': RESULTS_FORMAT_VERSION, 'normals': {name: index for index, name in enumerate(normals)}}
+        self.writer.submit(self.folder, self.max_folder_bytes, *self.get_paths(key), list(normals.values()), metadata)
+        return True
+
+class ResultsCache:
+    """Computed datasets, reused when the same data is computed again with
+    the same computation parameters.
+
+    The datasets are kept in memory up to a number of bytes, dropping the
+    least recently used ones first. A dataset computed with other parameters
+    is computed from the most recent one of the same data, reusing the
+    results that do not depend on the changed parameters. When a folder is given, the statistics
+    are also stored there as NumPy archives, written in the background by an
+    `ArchiveWriter`, so they survive a restart, and the least recently used
+    files are removed past another number of bytes. The datasets that are 
+    computed reuse the normals of a `NormalsStore`.
+
+    Attributes:
+        max_bytes (int): Bytes of the datasets kept in memory.
+        folder (str | None): Folder of the stored statistics, None to keep
+            them only in memory.
+        max_folder_bytes (int): Bytes of the files kept in `folder`.
+        normals_store (NormalsStore | None): Normals of the computed datasets.
+        entries (OrderedDict[str, tuple[Dataset, int, str]]): The datasets
+            in memory, their bytes and the hash of their data by key, from
+            the least to the most recently used.
+        writer (ArchiveWriter): Writer of the archives.
+    """
+    def __init__(self, max_bytes: int=64 << 20, folder: str=None, max_folder_bytes: int=64 << 20,
+                 normals_store: NormalsStore=None) -> None:
+        """Constructor
+
+        Args:
+            max_bytes (int, optional): Bytes of the datasets kept in memory.
+                Defaults to 64 MiB.
+            folder (str, optional): Folder of the stored statistics. Defaults
+                to None, meaning that they are only kept in memory.
+            max_folder_bytes (int, optional): Bytes of the files kept in
+                `folder`. Defaults to 64 MiB.
+            normals_store (NormalsStore, optional): Normals reused by the 
+                computed datasets. Defaults to None.
+        """
+        self.max_bytes = max_bytes
+        self.folder = folder
+        self.max_folder_bytes = max_folder_bytes
+        self.normals_store = normals_store
+        self.entries: OrderedDict[str, tuple[Dataset, int, str]] = OrderedDict()
+        self.writer = ArchiveWriter()
+
+    def get_dataset(self, name: str, dataset: TimeSeriesMatrix, col_names: list[str], parameters: Parameters,
+                    required_stats: StatsRequest=None, matrix_hash: str=None) -> Dataset:
+        """Returns the computed dataset, from the cache when it has the
+        required statistics.
+
+        A dataset from memory is returned as a copy with the name and 
+        parameters of the call, since they can differ in what is not 
+        computed, see `Dataset.copy_with_parameters`. When the
+        cached statistics lack some of the required ones, the statistics of
+        both requests are computed and replace them.
+
+        Args:
+            name (str): Name of the dataset.
+            dataset (TimeSeriesMatrix): Data of the dataset.
+            col_names (list[str]): Column names of the dataset.
+            parameters (Parameters): Computation parameters.
+            required_stats (StatsRequest, optional): Statistics read by the
+                outputs. Defaults to None, meaning all of them.
+            matrix_hash (str, optional): Hash of `dataset`, see
+                `get_matrix_hash`. It is computed when not given.
+                Defaults to None.
+
+        Returns:
+            Dataset: The computed dataset.
+        """
+        if required_stats is None:
+            required_stats = get_all_stats_request()
+        if matrix_hash is None:
+            matrix_hash = get_matrix_hash(dataset)
+        key = get_results_key(matrix_hash, parameters)
+        if key in self.entries:
+            cached_dataset = self.entries[key][0]
+            if cached_dataset.stats.required_stats.covers(required_stats):
+                self.entries.move_to_end(key)
+                return cached_dataset.copy_with_parameters(name, parameters)
+            required_stats |= cached_dataset.stats.required_stats
+        stored = self.load(key)
+        if stored is not None and stored[0].covers(required_stats):
+            computed = Dataset(name, dataset, col_names, parameters, *stored)
+        else:
+            if stored is not None:
+                required_stats |= stored[0]
+            previous = self.get_latest_dataset(matrix_hash)
+            computed = Dataset(name, dataset, col_names, parameters, required_stats, previous=previous,
+                               normals_store=self.normals_store)
+            self.save(key, computed)
+        self.store(key, computed, matrix_hash)
+        return computed
+
+    def get_latest_dataset(self, matrix_hash: str) -> Dataset | None:
+        """Returns the most recently used dataset of some data in memory, or 
+        None if there is none."""
+        for dataset, _, entry_hash in reversed(self.entries.values()):
+            if entry_hash == matrix_hash:
+                return dataset
+        return None
+
+    def store(self, key: str, dataset: Dataset, matrix_hash: str) -> None:
+        """Keeps a computed dataset in memory, dropping the least recently
+        used ones past `max_bytes`. A dataset larger than `max_bytes` is not
+        kept."""
+        self.entries.pop(key, None)
+        nbytes = get_dataset_nbytes(dataset)
+        if nbytes > self.max_bytes:
+            return
+        self.entries[key] = (dataset, nbytes, matrix_hash)
+        total = sum(entry[1] for entry in self.entries.values())
+        while total > self.max_bytes:
+            _, (_, entry_bytes, _) = self.entries.popitem(last=False)
+            total -= entry_bytes
+
+    def clear(self) -> None:
+        """Drops the datasets kept in memory, the stored files are kept."""
+        self.entries.clear()
+
+    def clear_folder(self) -> None:
+        """Removes the stored statistics from `folder`."""
+        self.writer.wait()
+        if self.folder is not None:
+            clear_folder(self.folder)
+
+    def get_paths(self, key: str) -> tuple[str, str]:
+        """Returns the paths of the archive and the metadata of a key."""
+        return (os.path.join(self.folder, key + RESULTS_SUFFIX), os.path.join(self.folder, key + METADATA_SUFFIX))
+
+    def load(self, key: str) -> tuple[StatsRequest, dict] | None:
+        """Loads the statistics stored for a key.
+
+        Args:
+            key (str): Key of the results, see `get_results_key`.
+
+        Returns:
+            tuple | None: The request that was computed and the results to be
+                restored by `Dataset`, or None if nothing valid is stored.
+        """
+        if self.folder is None:
+            return None
+        stored = read_archive(*self.get_paths(key))
+        if stored is None:
+            return None
+        arrays, metadata = stored
+        results = {name: arrays[index] for name, index in metadata['arrays'].items()}
+        for table in ('place_stats', 'selected_years_place_stats'):
+            results[table] = {}
+            for name, column in metadata[table].items():
+                if column['kind'] == 'array':
+                    results[table][name] = arrays[column['index']]
+                elif column['kind'] == 'shared':
+                    results[table][name] = results['place_stats'][name]
+                else:
+                    results[table][name] = np.full(column['shape'], None, dtype=object)
+        request = metadata['request']
+        return StatsRequest(request['names'], request['sub_periods']), results
+
+    def save(self, key: str, dataset: Dataset) -> bool:
+        """Starts storing the statistics of a computed dataset in `folder`,
+        see `save_archive`.
+
+        Args:
+            key (str): Key of the results, see `get_results_key`.
+            dataset (Dataset): The computed dataset.
+
+        Returns:
+            bool: True if the statistics are being written.
+        """
+        if self.folder is None:
+            return False
+        results = dataset.stats.get_results()
+        arrays = []
+        metadata = {
+            'version': RESULTS_FORMAT_VERSION,
+            'request': {
+                'names': sorted(dataset.stats.required_stats.names),
+                'sub_periods': None if dataset.stats.required_stats.sub_periods is None else sorted(dataset.stats.required_stats.sub_periods),
+            },
+            'arrays': {},
+        }
+        for name, value in results.items():
+            if isinstance(value, np.ndarray):
+                metadata['arrays'][name] = len(arrays)
+                arrays.append(value)
+        for table in ('place_stats', 'selected_years_place_stats'):
+            metadata[table] = {}
+            for name, value in results[table].items():
+                if table != 'place_stats' and value is results['place_stats'].get(name):
+                    metadata[table][name] = {'kind': 'shared'}
+                elif value.dtype != object:
+                    metadata[table][name] = {'kind': 'array', 'index': len(arrays)}
+                    arrays.append(value)
+                elif all(item is None for item in value.flat):
+                    # the forecast of a dataset without forecast is None
+                    metadata[table][name] = {'kind': 'none', 'shape': list(value.shape)}
+                else:
+                    return False
+        self.writer.submit(self.folder, self.max_folder_bytes, *self.get_paths(key), arrays, metadata)
+        return True
@@ -1,6 +1,175 @@
+import re
+import copy
 from numpy import ndarray
 import numpy as np
 from .utils import *
+from .engine import BatchedStats, StatsRequest, StatsRow, get_invalidated_results, CURRENT_SEASON_RESULTS
+from .parallel import EXECUTOR_TYPES
+
+class TimeSeriesMatrix:
+    """A parsed dataset stored as a single matrix of places by timestamps.
+
+    Every place is a row of `values`, so the time series of a place is a view
+    of the matrix and operations can be vectorized across places.
+
+    Attributes:
+        values (ndarray): 2-D array of shape (places, timestamps).
+        place_ids (list[str]): IDs of the places, in the order of the rows.
+        place_index (dict[str, int]): Row index of each place ID.
+        timestamps (list[str]): Column names of the dataset.
+        has_duplicates (bool): Whether the source had duplicated place IDs.
+    """
+    def __init__(self, values: ndarray, place_ids: list[str], timestamps: list[str], has_duplicates=False) -> None:
+        """Constructor
+
+        Args:
+            values (ndarray): 2-D array of shape (places, timestamps).
+            place_ids (list[str]): IDs of the places, one per row of `values`.
+            timestamps (list[str]): Column names of the dataset.
+            has_duplicates (bool, optional): Whether the source had duplicated
+                place IDs. Defaults to False.
+        """
+        if values.ndim != 2 or values.shape != (len(place_ids), len(timestamps)):
+            raise ValueError(f'The value matrix of shape {values.shape} does not match '
+                             f'{len(place_ids)} places and {len(timestamps)} timestamps.')
+        self.values = values
+        # values is a view of the first columns of the buffer, the rest are
+        # spare columns for `append_columns`
+        self._buffer = values
+        self.place_ids = list(place_ids)
+        self.place_index = {place_id: i for i, place_id in enumerate(self.place_ids)}
+        self.timestamps = list(timestamps)
+        self.has_duplicates = has_duplicates
+
+    def __len__(self) -> int:
+        return len(self.place_ids)
+
+    def __contains__(self, place_id: str) -> bool:
+        return place_id in self.place_index
+
+    def __getitem__(self, place_id: str) -> ndarray:
+        """Returns the time series of a place as a view of the matrix."""
+        return self.values[self.place_index[place_id]]
+
+    def keys(self) -> list[str]:
+        return self.place_ids
+
+    def items(self):
+        """Iterates over (place ID, time series view) pairs."""
+        for i, place_id in enumerate(self.place_ids):
+            yield place_id, self.values[i]
+
+    def copy_with_values(self, values: ndarray, timestamps: list[str]) -> 'TimeSeriesMatrix':
+        """Returns a copy of the dataset with the same places and new columns.
+
+        Other attributes, such as the grid of a `GridTimeSeriesMatrix`, are
+        shared with the copy.
+
+        Args:
+            values (ndarray): 2-D array of shape (places, timestamps).
+            timestamps (list[str]): Timestamps of the new columns.
+
+        Returns:
+            TimeSeriesMatrix: The new dataset.
+        """
+        if values.shape != (len(self.place_ids), len(timestamps)):
+            raise ValueError(f'The value matrix of shape {values.shape} does not match '
+                             f'{len(self.place_ids)} places and {len(timestamps)} timestamps.')
+        dataset = copy.copy(self)
+        dataset.values = dataset._buffer = values
+        dataset.timestamps = list(timestamps)
+        return dataset
+
+    def append_columns(self, new_values: ndarray, new_timestamps: list[str]) -> None:
+        """Appends the values of new sub-periods to the matrix in place.
+
+        The new timestamps must continue the ones of the dataset, i.e. have
+        the same period unit and follow the last sub-period without gaps.
+        The matrix keeps spare columns for a whole year, so most appends
+        do not copy the historical data. When the matrix has to be
+        reallocated (or it is a read-only memory map), time series views
+        taken before the append keep pointing to the previous data.
+
+        Args:
+            new_values (ndarray): Array of shape (places, new timestamps), or
+                of shape (places,) for a single timestamp.
+            new_timestamps (list[str]): Timestamps of the new columns.
+        """
+        new_values = np.asarray(new_values, dtype=self.values.dtype)
+        if new_values.ndim == 1:
+            new_values = new_values[:, np.newaxis]
+        if new_values.shape != (len(self.place_ids), len(new_timestamps)):
+            raise ValueError(f'The new values of shape {new_values.shape} do not match '
+                             f'{len(self.place_ids)} places and {len(new_timestamps)} timestamps.')
+        period_length = parse_timestamps(self.timestamps)['period_length']
+        expected_timestamp = self.timestamps[-1]
+        for timestamp in new_timestamps:
+            expected_timestamp = get_next_timestamp(expected_timestamp, period_length)
+            if re.search(r"\d{6}", timestamp).group() != re.search(r"\d{6}", expected_timestamp).group():
+                raise ValueError(f'The timestamp {timestamp} does not continue the dataset, '
+                                 f'the next sub-period is {expected_timestamp}.')
+
+        column_count = len(self.timestamps)
+        end = column_count + len(new_timestamps)
+        if self._buffer.shape[1] < end or not self._buffer.flags.writeable:
+            self._buffer = np.empty((len(self.place_ids), end + period_length), dtype=self.values.dtype)
+            self._buffer[:, :column_count] = self.values
+        self._buffer[:, column_count:end] = new_values
+        self.values = self._buffer[:, :end]
+        self.timestamps.extend(new_timestamps)
+
+class GridTimeSeriesMatrix(TimeSeriesMatrix):
+    """A parsed stack of rasters, where each valid pixel is a place.
+
+    Attributes:
+        valid_mask (ndarray): 2-D boolean array with the shape of the grid,
+            True for the pixels that are places.
+        pixel_indices (ndarray): Array of shape (places, 2) with the row and
+            column of each place in the grid.
+        coordinates (ndarray): Array of shape (places, 2) with the x and y
+            coordinates of the center of each place's pixel.
+        geotransform (tuple): GDAL geotransform of the grid.
+        projection (str): Projection of the grid as WKT.
+    """
+    def __init__(self, values: ndarray, timestamps: list[str], valid_mask: ndarray,
+                 geotransform: tuple, projection: str) -> None:
+        """Constructor
+
+        Args:
+            values (ndarray): 2-D array of shape (places, timestamps), with
+                the places in row-major pixel order.
+            timestamps (list[str]): Timestamps of the rasters.
+            valid_mask (ndarray): 2-D boolean array, True for the pixels that
+                are places.
+            geotransform (tuple): GDAL geotransform of the grid.
+            projection (str): Projection of the grid as WKT.
+        """
+        self.valid_mask = valid_mask
+        self.pixel_indices = np.argwhere(valid_mask)
+        rows, columns = self.pixel_indices[:, 0] + 0.5, self.pixel_indices[:, 1] + 0.5
+        self.coordinates = np.column_stack((
+            geotransform[0] + columns * geotransform[1] + rows * geotransform[2],
+            geotransform[3] + columns * geotransform[4] + rows * geotransform[5],
+        ))
+        self.geotransform = geotransform
+        self.projection = projection
+        place_ids = [f'r{row}c{column}' for row, column in self.pixel_indices]
+        super().__init__(values, place_ids, timestamps)
+
+    def to_grid(self, place_values: ndarray, fill_value=np.nan) -> ndarray:
+        """Places one value per place back on the grid.
+
+        Args:
+            place_values (ndarray): Array with one value per place.
+            fill_value (optional): Value of the pixels that are not places.
+                Defaults to NaN.
+
+        Returns:
+            ndarray: 2-D array with the shape of the grid.
+        """
+        grid = np.full(self.valid_mask.shape, fill_value, dtype=np.result_type(place_values, fill_value))
+        grid[self.valid_mask] = place_values
+        return grid
 
 # TODO: remove conversion methods from this class to dedicated functions
 class Dataset:
@@ -10,25 +179,205 @@ class Dataset:
         name (str): Name of the dataset.
         timestamps (list[str]): List of column names from the dataset.
         properties (Properties): Properties of the dataset.
+        timestamp_properties (dict): Properties of the timestamps, as returned 
+            by `parse_timestamps`, from which `properties` are set.
         parameters (Parameters): Computation parameters.
+        values (ndarray): Value matrix of the computed places.
+        stats (BatchedStats): Statistics of all places, computed at once.
         places (dict[str, Place]): Dictionary of place objects.
+        valid_seasons (ndarray | None): In the masked mode, boolean array of 
+            shape (places, years), True for the seasons that pass the gap 
+            rules. None otherwise.
+        excluded_place_ids (list[str]): In the masked mode, the places left 
+            out for having too few valid climatology years.
+        sub_period_means (ndarray | None): In the masked mode, mean of each 
+            sub-period over the valid climatology seasons of each place, 
+            which fills the missing values of the current season. None 
+            otherwise.
+        normals_key (str | None): Key of the normals of the dataset in a 
+            `NormalsStore`, see `get_normals_key`, once it was computed.
     """
-    def __init__(self, name: str, dataset: dict, col_names: list[str], parameters: Parameters) -> None:
+    def __init__(self, name: str, dataset: TimeSeriesMatrix, col_names: list[str], parameters: Parameters,
+                 required_stats: StatsRequest=None, results: dict=None, previous: 'Dataset'=None,
+                 normals_store: 'NormalsStore'=None) -> None:
         """Constructor
 
         Args:
             name (str): name of the dataset.
-            dataset (dict): data contained in the dataset.
+            dataset (TimeSeriesMatrix): data contained in the dataset.
             col_names (list[str]): column names from the dataset.
             parameters (Parameters): computation parameters.
+            required_stats (StatsRequest, optional): statistics read by the 
+                outputs, the rest are not computed. Defaults to None, meaning 
+                all of them.
+            results (dict, optional): statistics of a previous computation 
+                with the same data, parameters and request, see 
+                `BatchedStats.get_results`, which are restored instead of 
+                being computed. Defaults to None.
+            previous (Dataset, optional): the same data computed with other 
+                parameters, whose results that do not depend on the changed 
+                parameters are reused, see `RESULT_DEPENDENCIES`. Defaults to 
+                None.
+            normals_store (NormalsStore, optional): normals of the past 
+                seasons, see `BatchedStats.get_normals`, reused when they 
+                were computed before and updated with the computed ones. 
+                Defaults to None.
         """
         self.name = name
         self.timestamps = col_names
-        
-        self.properties = Properties(properties_dict=parse_timestamps(self.timestamps))
         self.parameters = parameters
+        self.set_layout()
+        
+        if self.parameters.precision not in precision_dtypes:
+            raise ValueError(f'Unknown precision: {self.parameters.precision}')
+        if self.parameters.executor not in EXECUTOR_TYPES:
+            raise ValueError(f'Unknown executor: {self.parameters.executor}')
+        if previous is not None and 'seasons' in get_invalidated_results(previous.parameters, self.parameters):
+            previous = None
+
+        self.valid_seasons: ndarray | None = None
+        self.excluded_place_ids: list[str] = []
+        self.sub_period_means: ndarray | None = None
+        # matrix of the values with spare columns, created by `update`
+        self._matrix: TimeSeriesMatrix | None = None
+        if previous is None:
+            dtype = precision_dtypes[self.parameters.precision]
+            if dataset.values.dtype != dtype:
+                dataset = dataset.copy_with_values(dataset.values.astype(dtype), dataset.timestamps)
+            if self.parameters.mask_missing_data:
+                dataset = self.mask_missing_data(dataset)
+            self.properties.place_ids = list(dataset.keys())
+            self.values = dataset.values
+        else:
+            # the seasons do not change, so the values are those of the 
+            # previous computation, already masked
+            self.valid_seasons = previous.valid_seasons
+            self.excluded_place_ids = previous.excluded_place_ids
+            self.sub_period_means = previous.sub_period_means
+            self.properties.place_ids = previous.properties.place_ids
+            self.values = previous.values
+
+        normals = None
+        self.normals_key: str | None = None
+        if normals_store is not None and results is None:
+            self.normals_key = normals_store.get_key(self)
+            normals = normals_store.load(self.normals_key)
+        self.stats = BatchedStats(self, self.values, self.valid_seasons, required_stats, self.parameters.executor,
+                                  self.parameters.max_workers, self.parameters.batch_places, results,
+                                  None if previous is None else previous.stats, normals)
+        if normals_store is not None and results is None:
+            normals_store.update(self.normals_key, self.stats.get_normals())
+        self.places: dict[str, Place] = {}
+        for i, place in enumerate(self.properties.place_ids):
+            self.places[place] = Place(place, i, self)
+
+    def update(self, dataset: TimeSeriesMatrix, normals_store: 'NormalsStore'=None) -> None:
+        """Computes the dataset again, in place, after new sub-periods of the 
+        current season were appended to its data, e.g. by `append_csv`.
+
+        Only the results that depend on the current season are computed 
+        again: the similar and selected years, the current accumulations and 
+        the ensembles, and the statistics over them, see 
+        `CURRENT_SEASON_RESULTS`. The seasons and their accumulations, the 
+        valid seasons of the masked mode, the climatology years, the normals 
+        over them, see `BatchedStats.get_normals`, and the `Place` objects 
+        are kept. The normals are computed at every sub-period of the season 
+        by the first update, so the following ones reuse them.
+
+        Args:
+            dataset (TimeSeriesMatrix): The data of the dataset with the new 
+                sub-periods appended.
+            normals_store (NormalsStore, optional): normals of the past 
+                seasons, loaded before those of the previous computation are 
+                computed, and updated with the computed ones. Defaults to 
+                None.
+
+        Raises:
+            ValueError: If the data does not continue the dataset, or the new 
+                sub-periods start a new season, which has to be computed with 
+                a new `Dataset`.
+        """
+        # the column names can be the list of timestamps of the data, which 
+        # is extended by `append_columns`
+        column_count = self.values.shape[1]
+        timestamps = list(self.timestamps[:column_count])
+        if list(dataset.timestamps[:column_count]) != timestamps:
+            raise ValueError('The data does not continue the timestamps of the dataset.')
+        new_timestamps = list(dataset.timestamps[column_count:])
+        if not new_timestamps:
+            return
+        if self.properties.current_season_length + len(new_timestamps) > yearly_periods[self.properties.period_unit_id]:
+            raise ValueError(f'The timestamp {new_timestamps[-1]} starts a new season, the dataset has to be computed again.')
+
+        rows = np.array([dataset.place_index[place_id] for place_id in self.properties.place_ids], dtype=np.intp)
+        new_values = dataset.values[rows, column_count:].astype(self.values.dtype)
+        if self.sub_period_means is not None:
+            # the gaps of the current season are filled as in `mask_missing_data`
+            start = column_count - self.climatology_end_index
+            new_values = np.where(np.isnan(new_values), self.sub_period_means[:, start:start + len(new_timestamps)], new_values)
+        if self._matrix is None:
+            # the values can be those of the parsed dataset, so they are 
+            # copied by the first append instead of being modified
+            self._matrix = TimeSeriesMatrix(self.values, self.properties.place_ids, timestamps)
+        self._matrix.append_columns(new_values, new_timestamps)
+
+        place_ids = self.properties.place_ids
+        self.timestamps = timestamps + new_timestamps
+        self.values = self._matrix.values
+        self.set_layout(advance_timestamp_properties(self.timestamp_properties, self.timestamps))
+        self.properties.place_ids = place_ids
+        previous = self.stats
+        normals = dict(previous.normals)
+        if normals_store is not None:
+            # the past seasons do not change, so neither does the key
+            if self.normals_key is None:
+                self.normals_key = normals_store.get_key(self)
+            normals.update(normals_store.load(self.normals_key) or {})
+        computed_normals = {name: value for name, value in previous.get_normals('Drought Severity Pctls.' not in normals).items()
+                            if name not in normals}
+        normals.update(computed_normals)
+        self.stats = BatchedStats(self, self.values, self.valid_seasons, previous.required_stats, previous=previous,
+                                  normals=normals, invalidated=set(CURRENT_SEASON_RESULTS))
+        if normals_store is not None:
+            normals_store.update(self.normals_key, computed_normals)
+
+    def copy_with_parameters(self, name: str, parameters: Parameters) -> 'Dataset':
+        """Returns a copy of the dataset with another name and parameters 
+        that give the same statistics, e.g. other outputs.
+
+        The statistics and values are shared with the copy, the places are 
+        those of the copy.
+
+        Args:
+            name (str): Name of the copy.
+            parameters (Parameters): Parameters of the copy.
+
+        Returns:
+            Dataset: The copy.
+        """
+        dataset = copy.copy(self)
+        dataset.name = name
+        dataset.parameters = parameters
+        # the spare columns of the matrix are only appended by this dataset
+        dataset._matrix = None
+        dataset.places = {place_id: Place(place_id, row, dataset) for row, place_id in enumerate(self.places)}
+        return dataset
+
+    def set_layout(self, timestamp_properties: dict=None) -> None:
+        """Sets the properties of the dataset and the indexes of its seasons 
+        from its timestamps and parameters.
+
+        Args:
+            timestamp_properties (dict, optional): Properties of the 
+                timestamps, e.g. advanced with `advance_timestamp_properties`. 
+                Defaults to None, meaning they are parsed from the timestamps.
+        """
+        if timestamp_properties is None:
+            timestamp_properties = parse_timestamps(self.timestamps)
+        self.timestamp_properties = timestamp_properties
+        self.properties = Properties(properties_dict={**timestamp_properties, 'year_ids': list(timestamp_properties['year_ids'])})
         
-        default_sub_seasons = define_seasonal_dict(self.parameters.cross_years)
+        default_sub_seasons = define_seasonal_dict(self.parameters.cross_years, self.properties.period_unit_id)
         if self.parameters.cross_years:
             self.season_shift = (yearly_periods[self.properties.period_unit_id] // 2)
             self.properties.year_ids = get_cross_years(self.properties.year_ids)
@@ -51,16 +400,43 @@ class Dataset:
         self.properties.selected_years = self.parameters.selected_years
         self.properties.sub_season_monitoring_ids = slice_by_element(default_sub_seasons, self.parameters.season_start, self.parameters.season_end)
         self.properties.sub_season_offset = default_sub_seasons.index(self.parameters.season_start)
-        self.properties.place_ids = list(dataset.keys())
 
         self.season_start_index = default_sub_seasons.index(self.parameters.season_start)
         self.season_end_index = default_sub_seasons.index(self.parameters.season_end)+1
-        self.current_season_trim_index = min(self.properties.current_season_length, self.season_end_index) - parameters.is_forecast
-        
+        self.current_season_trim_index = min(self.properties.current_season_length, self.season_end_index) - self.parameters.is_forecast
 
-        self.places: dict[str, Place] = {}
-        for place, timeseries in dataset.items():
-            self.places[place] = Place(place, timeseries, self)
+    def mask_missing_data(self, dataset: TimeSeriesMatrix) -> TimeSeriesMatrix:
+        """Applies the gap rules of the masked computation mode to a dataset.
+
+        The seasons of all places are checked and filled at once with 
+        `fill_missing_seasons`. The places with fewer valid climatology years 
+        than `min_valid_years` are left out and listed in 
+        `excluded_place_ids`, and `valid_seasons` is set for the rest.
+
+        Args:
+            dataset (TimeSeriesMatrix): The parsed dataset.
+
+        Returns:
+            TimeSeriesMatrix: The dataset with the filled values of the places 
+                that are computed.
+        """
+        values = dataset.values
+        seasons = values[:, self.season_shift:self.climatology_end_index].reshape(len(dataset), self.split_quantity, -1)
+        climatology_indexes = [self.properties.year_ids.index(year_id) for year_id in self.properties.climatology_year_ids]
+        seasons, current_seasons, valid_seasons, valid_climatology_counts, sub_period_means = fill_missing_seasons(
+            seasons, values[:, self.climatology_end_index:], climatology_indexes,
+            slice(self.season_start_index, self.season_end_index), self.parameters.max_missing_periods)
+
+        min_valid_years = max(1, min(self.parameters.min_valid_years, len(climatology_indexes)))
+        kept_rows = valid_climatology_counts >= min_valid_years
+        self.excluded_place_ids = [place_id for place_id, kept in zip(dataset.place_ids, kept_rows) if not kept]
+        self.valid_seasons = valid_seasons[kept_rows]
+        self.sub_period_means = sub_period_means[kept_rows]
+        filled_values = values[kept_rows]
+        filled_values[:, self.season_shift:self.climatology_end_index] = seasons[kept_rows].reshape(np.count_nonzero(kept_rows), -1)
+        filled_values[:, self.climatology_end_index:] = current_seasons[kept_rows]
+        return TimeSeriesMatrix(filled_values, [place_id for place_id, kept in zip(dataset.place_ids, kept_rows) if kept],
+                                dataset.timestamps, dataset.has_duplicates)
     
     def place_stats_to_dict(self, type='all'):
         """Convert place statistics to a dictionary.
@@ -71,11 +447,13 @@ class Dataset:
         Returns:
             dict: Dictionary containing place statistics.
         """
+        if type == 'selected': place_stats = self.stats.selected_years_place_stats
+        else: place_stats = self.stats.place_stats
+        # every statistic is converted for all places at once
+        columns = {key: value.tolist() for key, value in place_stats.items()}
         place_data_dict = {}
-        for place_id, place in self.places.items():
-            if type == 'selected': place_stats = place.selected_years_place_stats
-            else: place_stats = place.place_stats
-            place_data_dict[place_id] = dict(map(lambda v: (v[0], v[1].tolist() if isinstance(v[1], np.ndarray) else v), place_stats.items()))
+        for row, place_id in enumerate(self.places):
+            place_data_dict[place_id] = {key: value[row] for key, value in columns.items()}
         return place_data_dict
     
     def season_stats_to_dict(self, type='all'):
@@ -87,167 +465,99 @@ class Dataset:
         Returns:
             dict: Dictionary containing seasonal statistics.
         """
+        year_ids = self.properties.year_ids
+        columns = {key: value.tolist() for key, value in self.stats.seasonal_stats.items()}
         seasonal_data_dict = {}
-        for place_id, place in self.places.items():
-            if type =='selected': season_stats = place.selected_years_seasonal_stats
-            else: season_stats = place.seasonal_stats
-            seasonal_data_dict[place_id] = dict(map(lambda v: (v, {}), season_stats.keys()))
-            for key in season_stats.keys():
-                seasonal_data_dict[place_id][key] = dict(map(lambda v: (v[0], v[1].tolist() if isinstance(v[1], np.ndarray) else v), season_stats[key].items()))
+        for row, place_id in enumerate(self.places):
+            if type == 'selected': indexes = self.stats.selected_indexes[row, :self.stats.selected_counts[row]].tolist()
+            else: indexes = range(len(year_ids))
+            seasonal_data_dict[place_id] = {key: {year_ids[i]: value[row][i] for i in indexes} for key, value in columns.items()}
         return seasonal_data_dict
 
 class Place:
     """Represents a place with associated time series data.
 
+    A place is a view over the rows of the statistics of its parent dataset, 
+    which are computed for all places at once by `BatchedStats`.
+
     Attributes:
         id (str): Unique identifier of the place.
-        timeseries (ndarray): Time series data for the place.
+        row (int): Row of the place in the dataset.
         parent (Dataset): Parent dataset that contains this place.
+        timeseries (ndarray): Time series data for the place.
         current_season (ndarray): Current season's data.
         forecast_value (float or None): Forecast value in the current season.
-        seasons_monitoring (dict[str, ndarray]): Data within the monitoring 
+        current_season_monitoring (ndarray): Current season's data within the 
+            monitoring season.
+        valid_seasons (ndarray): Boolean array, True for the seasons used in 
+            the statistics.
+        similar_seasons (list[str]): Years ranked by similarity to the current 
             season.
-        seasons_monitoring_selected (dict[str, ndarray]): Selected year's data 
-            within the monitoring season.
-        seasons_monitoring_climatology (dict[str, ndarray]): Climatology data 
-            within the monitoring season.
-        place_stats (tuple): Statistics for the place.
-        seasonal_stats (tuple): Seasonal statistics.
-        selected_years_place_stats (tuple): Selected years place statistics.
-        selected_years_seasonal_stats (tuple): Selected years seasonal 
+        selected_years (list[str]): Selected years.
+        place_stats (StatsRow): Statistics for the place.
+        seasonal_stats (dict): Seasonal statistics.
+        selected_years_place_stats (StatsRow): Selected years place statistics.
+        selected_years_seasonal_stats (dict): Selected years seasonal 
             statistics.
     """
-        
-    def __init__(self, place_id: str, timeseries: ndarray, parent: Dataset) -> None:
+    __slots__ = ('id', 'row', 'parent')
+
+    def __init__(self, place_id: str, row: int, parent: Dataset) -> None:
         self.id = place_id
-        self.timeseries = timeseries
+        self.row = row
         self.parent = parent
-        split_seasons: list[ndarray] = np.split(timeseries[parent.season_shift : parent.climatology_end_index], 
-                              parent.split_quantity)
-        self.current_season: ndarray = timeseries[parent.climatology_end_index : ]
-        if parent.parameters.is_forecast: 
-            self.forecast_value = self.current_season[-1]
-            self.current_season = self.current_season[:-1]
-        else: self.forecast_value = None
-        self.current_season_monitoring = self.current_season[parent.season_start_index:parent.current_season_trim_index]
-        
-        self.similar_seasons = get_similar_years(self.current_season, 
-                                            split_seasons, 
-                                            parent.properties.year_ids,
-                                            parent.parameters.use_pearson)
-        if isinstance(parent.properties.selected_years, str):
-            self.selected_years = self.similar_seasons[:int(parent.properties.selected_years)]
-        if isinstance(parent.properties.selected_years, list):
-            self.selected_years = parent.properties.selected_years
-        # build seasons
-        # self.seasons: dict[str, ndarray] = {}
-        self.seasons_climatology: dict[str, ndarray] = {}
-        self.seasons_monitoring: dict[str, ndarray] = {}
-        self.seasons_monitoring_selected: dict[str, ndarray] = {}
-        self.seasons_monitoring_climatology: dict[str, ndarray] = {}
-        for i, data in enumerate(split_seasons):
-            # variables for climatology filter
-            season_id = parent.properties.year_ids[i]
-            # self.seasons[season_id] = data
-            self.seasons_monitoring[season_id] = data[parent.season_start_index:parent.season_end_index]
-            if season_id in self.selected_years:
-                self.seasons_monitoring_selected[season_id] = self.seasons_monitoring[season_id]
-            if season_id in self.parent.properties.climatology_year_ids:
-                self.seasons_monitoring_climatology[season_id] = self.seasons_monitoring[season_id]
-                self.seasons_climatology[season_id] = data
-        self.place_stats, self.seasonal_stats, self.selected_years_place_stats, self.selected_years_seasonal_stats = self.get_stats()
-
-    def get_place_stats(self, seasonal_accumulations, seasonal_ensemble, common_stats):
-        """Calculates and returns the place statistics for a given season.
 
-        Args:
-            seasonal_accumulations (ndarray): The accumulated values.
-            seasonal_ensemble (list or tuple): The ensemble values.
-            common_stats (dict): The common statistics.
+    @property
+    def timeseries(self) -> ndarray:
+        return self.parent.values[self.row]
 
-        Returns:
-            dict: The calculated place statistics.
-        """
-        current_accumulation_mon = np.cumsum(self.current_season_monitoring)
-        current_index = self.current_season_monitoring.__len__()-1
-        seasonal_current_sums = common_stats['seasonal_accumulations'][:, current_index]
-        seasonal_sums = np.array([e[-1] for e in seasonal_accumulations])
-        ensemble_sums = np.array([e[-1] for e in seasonal_ensemble])
-        seasonal_lta = operate_column(seasonal_accumulations, np.average)
-        seasonal_pctls = common_stats['climatology_seasonal_pctls']
-        ensemble_median = operate_column(seasonal_ensemble, np.median)
-        ensemble_lta = operate_column(seasonal_ensemble, np.average)
-        ensemble_pctls = percentiles_to_values(ensemble_sums, [33, 67])
-        ensemble_pctl_probabilities = np.array([
-            np.count_nonzero(ensemble_sums < seasonal_pctls[0]) / len(ensemble_sums),
-            np.count_nonzero((ensemble_sums >= seasonal_pctls[0]) & (ensemble_sums < seasonal_pctls[1])) / len(ensemble_sums),
-            np.count_nonzero(ensemble_sums >= seasonal_pctls[1]) / len(ensemble_sums),
-        ])
-        place_stats = {
-            # 'Pctls. per Year': percentiles_from_values(seasonal_current_sums),
-            'Current Season Pctl.': percentiles_from_values(seasonal_current_sums, [current_accumulation_mon[-1]]),
-            'Drought Severity Pctls.': percentiles_to_values(seasonal_current_sums, (3, 6, 11, 21, 33, 67)),
-            'Pctls.': seasonal_pctls,
-            'Median': operate_column(seasonal_accumulations, np.median),
-            'LTA': seasonal_lta,
-            'C. Dk./LTA': current_accumulation_mon/seasonal_lta[:current_index+1],
-            'Avg.': operate_column(list(self.seasons_climatology.values()), np.average),
-            'Ensemble Med.': ensemble_median,
-            'E. LTA': ensemble_lta,
-            'Ensemble Med./LTA': ensemble_median/seasonal_lta,
-            'Ensemble Med. Pctl.': percentiles_from_values(seasonal_sums, [ensemble_median[-1]]),
-            'E. Pctls.': ensemble_pctls,
-            'E. Probabilities': ensemble_pctl_probabilities,
-            'St. Dev.': operate_column(seasonal_accumulations, np.std),
-            'Current Season': self.current_season,
-            'Current Season Accumulation': current_accumulation_mon,
-            'forecast': np.array([self.forecast_value]),
-        }
-        return place_stats
-
-    def get_seasonal_stats(self, seasonal_accumulations, seasonal_ensemble, year_ids):
-        """Calculates and returns the seasonal statistics.
+    @property
+    def current_season(self) -> ndarray:
+        return self.parent.stats.current_seasons[self.row]
 
-        Args:
-            seasonal_accumulations (ndarray): The accumulated values.
-            seasonal_ensemble (list or tuple): The ensemble values.
-            year_ids (list or tuple): The year IDs.
+    @property
+    def forecast_value(self):
+        return self.parent.stats.forecast_values[self.row, 0]
 
-        Returns:
-            dict: The calculated seasonal statistics.
-        """
-        seasonal_stats = {
-            'Sum': dict(map(lambda v: (v[0], v[1]), zip(year_ids, seasonal_accumulations))),
-            'Ensemble Sum': dict(map(lambda v: (v[0], v[1]), zip(year_ids, seasonal_ensemble))),
-        }
-        return seasonal_stats
+    @property
+    def current_season_monitoring(self) -> ndarray:
+        return self.parent.stats.current_monitoring_seasons[self.row]
+
+    @property
+    def valid_seasons(self) -> ndarray:
+        return self.parent.stats.valid_seasons[self.row]
+
+    @property
+    def similar_seasons(self) -> list[str]:
+        return self.parent.stats.get_similar_seasons(self.row)
+
+    @property
+    def selected_years(self) -> list[str]:
+        return self.parent.stats.get_selected_years(self.row)
+
+    @property
+    def place_stats(self) -> StatsRow:
+        return self.parent.stats.place_stats.row(self.row)
+
+    @property
+    def selected_years_place_stats(self) -> StatsRow:
+        return self.parent.stats.selected_years_place_stats.row(self.row)
+
+    @property
+    def seasonal_stats(self) -> dict:
+        return self.parent.stats.get_seasonal_stats(self.row)
+
+    @property
+    def selected_years_seasonal_stats(self) -> dict:
+        return self.parent.stats.get_seasonal_stats(self.row, selected=True)
 
     def get_stats(self):
-        """Calculates and returns the overall statistics.
+        """Returns the overall statistics.
 
         Returns:
             tuple: A tuple containing the place statistics, seasonal statistics,
                 selected years place statistics, and selected years seasonal 
                 statistics.
         """
-        seasonal_accumulations = np.cumsum(list(self.seasons_monitoring.values()), axis=1)
-        seasonal_ensemble = [get_ensemble(self.current_season_monitoring, s) for s in list(self.seasons_monitoring.values())]
-
-        climatology_seasonal_accumulations = np.cumsum(list(self.seasons_monitoring_climatology.values()), axis=1)
-        climatology_seasonal_ensemble = [get_ensemble(self.current_season_monitoring, s) for s in list(self.seasons_monitoring_climatology.values())]
-        climatology_seasonal_sums = climatology_seasonal_accumulations[:, -1]
-        climatology_seasonal_pctls = percentiles_to_values(climatology_seasonal_sums, [33, 67])
-
-        selected_years_seasonal_accumulations = np.cumsum(list(self.seasons_monitoring_selected.values()), axis=1)
-        selected_years_seasonal_ensemble = [get_ensemble(self.current_season_monitoring, s) for s in list(self.seasons_monitoring_selected.values())]
-
-        common_stats = {
-            'climatology_seasonal_pctls': climatology_seasonal_pctls,
-            'seasonal_accumulations': seasonal_accumulations,
-            'Current Season Full Accumulation': np.cumsum(self.current_season),
-        }
-        return (self.get_place_stats(climatology_seasonal_accumulations, climatology_seasonal_ensemble, common_stats),
-                self.get_seasonal_stats(seasonal_accumulations, seasonal_ensemble, self.seasons_monitoring.keys()),
-                self.get_place_stats(selected_years_seasonal_accumulations, selected_years_seasonal_ensemble, common_stats),
-                self.get_seasonal_stats(selected_years_seasonal_accumulations, selected_years_seasonal_ensemble, self.seasons_monitoring_selected.keys()),
-                )
\ No newline at end of file
+        return (self.place_stats, self.seasonal_stats,
+                self.selected_years_place_stats, self.selected_years_seasonal_stats)
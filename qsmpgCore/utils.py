@@ -2,6 +2,7 @@ import re
 import numpy as np
 import scipy.stats as sp
 from typing import Optional, Union
+from . import kernels
 
 # Dictionary that correlates the period name
 # with the number of periods that fit in a year
@@ -11,6 +12,13 @@ yearly_periods = {
     'Pentad': 72,
 }
 
+# Dictionary that correlates the computation precision
+# with the dtype of the value matrix
+precision_dtypes = {
+    'float64': np.float64,
+    'float32': np.float32,
+}
+
 # TODO: separate computation properties from dataset properties
 class Properties:
     """This class represents the properties of a time series dataset.
@@ -73,6 +81,33 @@ class Parameters:
             Defaults to None.
         cross_years (bool): A boolean indicating whether to use July-June 
             seasons. Defaults to False.
+        period_unit (str): The period unit the dataset is resampled to before 
+            the computation (e.g. 'Month'). When None, the period unit of the 
+            dataset is used. Defaults to None.
+        mask_missing_data (bool): A boolean indicating whether to compute the 
+            statistics of places with missing values, applying the gap rules 
+            below. Defaults to False.
+        max_missing_periods (int): In the masked mode, the maximum number of 
+            missing sub-periods in the monitoring season of a year for it to 
+            be used. Its missing values are filled with the climatological 
+            mean. Defaults to 3.
+        min_valid_years (int): In the masked mode, the minimum number of valid 
+            climatology years of a place for it to be computed, capped at the 
+            number of climatology years. Defaults to 10.
+        precision (str): The precision of the values and statistics, either 
+            'float64' or 'float32'. In 'float32', the long sums are still 
+            accumulated in float64. Defaults to 'float64'.
+        executor (str): How the places are computed, either 'serial', 
+            'thread' (a pool of threads) or 'process' (a pool of processes 
+            reading the values from shared memory, which are copied there at 
+            every computation). The results are the same with all of them. 
+            The process executor is meant for scripts and headless runs, the 
+            dialog uses threads. Defaults to 'serial'.
+        max_workers (int): The maximum number of threads or processes. When 
+            None, the number of CPUs is used. Defaults to None.
+        batch_places (int): The number of places computed by each thread or 
+            process at a time, rounded up to a multiple of 4096. 
+            Defaults to 4096.
         selected_years (list | int): This represents the selected years.
             When it is a list, it is the list of selected years.
             When it is a int, it is the number of similar years. 
@@ -80,6 +115,11 @@ class Parameters:
         use_pearson (bool): A boolean indicating whether to use Pearson's 
             correlation coefficient for selecting similar years. 
             Defaults to False.
+        use_numba (bool): A boolean indicating whether to rank the similar 
+            years and build the ensembles with compiled kernels when numba 
+            is installed. Their sums are rounded differently, so only years 
+            with near-equal distances can be ranked differently, and NumPy 
+            is used when numba is missing. Defaults to False.
         is_forecast (bool): A boolean indicating whether the dataset has a 
             forecast period. Defaults to False.
         output_web (bool): A boolean indicating whether to output the web 
@@ -107,9 +147,22 @@ class Parameters:
         self.season_start: str | None = None
         self.season_end: str | None = None
         self.cross_years = False
+        self.period_unit: str | None = None
+        # missing data defaults
+        self.mask_missing_data = False
+        self.max_missing_periods = 3
+        self.min_valid_years = 10
+        # precision defaults
+        self.precision = 'float64'
+        # parallel computation defaults
+        self.executor = 'serial'
+        self.max_workers: int | None = None
+        self.batch_places = 4096
         # year selection defaults
         self.selected_years: list[str] | int | None = None
         self.use_pearson = False
+        # compiled kernels defaults
+        self.use_numba = False
         # forecasting defaults
         self.is_forecast = False
         # output defaults
@@ -278,6 +331,62 @@ def parse_timestamps(timestamps: list[str]) -> dict:
         'current_season_length': current_season_length,
     }
 
+def get_next_timestamp(timestamp: str, period_length: int) -> str:
+    """
+    Returns the timestamp of the sub-period that follows the given one.
+
+    The text around the six-digit number of the timestamp is kept, so the
+    result has the same format as the column headers of the dataset.
+
+    Args:
+        timestamp (str): A timestamp string with a six-digit number that
+            indicates the year and sub-period.
+        period_length (int): Number of sub-periods in a year.
+
+    Returns:
+        str: The timestamp of the next sub-period.
+    """
+    match = re.search(r"\d{6}", timestamp)
+    if match is None:
+        raise(RuntimeError('Each column must contain a six digit number indicating the year and sub-period number.'))
+    year, sub_period = int(match.group()[:4]), int(match.group()[4:])
+    if sub_period >= period_length:
+        year, sub_period = year + 1, 0
+    return f'{timestamp[:match.start()]}{year:04d}{sub_period+1:02d}{timestamp[match.end():]}'
+
+def advance_timestamp_properties(properties: dict, timestamps: list[str]) -> dict:
+    """
+    Updates the properties returned by `parse_timestamps` after new
+    sub-periods are appended to the dataset, without parsing all the
+    timestamps again.
+
+    Args:
+        properties (dict): Properties of the dataset before the new
+            sub-periods, as returned by `parse_timestamps`.
+        timestamps (list[str]): All the timestamps of the dataset, including
+            the new ones.
+
+    Returns:
+        dict: The updated properties.
+    """
+    period_length = properties['period_length']
+    # a complete current season only becomes historical when the next one starts
+    season_quantity = (len(timestamps) - 1) // period_length
+    current_season_index = season_quantity*period_length
+    year_ids = properties['year_ids']
+    if season_quantity > properties['season_quantity']:
+        first_new_year = int(year_ids[-1]) + 1
+        year_ids = year_ids + [str(y) for y in range(first_new_year, first_new_year+season_quantity-properties['season_quantity'])]
+    match = re.search(r"\d{6}", timestamps[0])
+    return {
+        **properties,
+        'season_quantity': season_quantity,
+        'year_ids': year_ids,
+        'current_season_index': current_season_index,
+        'current_season_id': get_year_slice(timestamps[current_season_index], match.start()),
+        'current_season_length': len(timestamps) - current_season_index,
+    }
+
 def percentiles_from_values(data, values=None) -> np.ndarray:
     """
     Calculate the percentile of each value in the array `data` relative to the 
@@ -360,6 +469,48 @@ def get_ensemble(current_data, post_data) -> np.ndarray:
     """
     return np.cumsum(np.concatenate((current_data, post_data[len(current_data):])))
 
+def fill_missing_seasons(seasons: np.ndarray, current_seasons: np.ndarray, 
+                         climatology_indexes: list[int], monitoring_slice: slice,
+                         max_missing_periods: int) -> tuple:
+    """
+    Apply the gap rules of the masked computation mode to the seasons of all 
+    places at once.
+
+    A season with more than `max_missing_periods` missing values in the 
+    monitoring season is left out, so it is set to NaN. The missing values of 
+    the other seasons and of the current season are filled with the mean of 
+    the same sub-period in the valid climatology seasons of their place.
+
+    Parameters:
+        seasons (np.ndarray): Array of shape (places, years, sub-periods) with 
+            the past seasons.
+        current_seasons (np.ndarray): Array of shape (places, sub-periods) with 
+            the current season, which may be shorter than a year.
+        climatology_indexes (list[int]): Indexes of the climatology years in 
+            the years axis of `seasons`.
+        monitoring_slice (slice): Sub-periods of the monitoring season.
+        max_missing_periods (int): Maximum number of missing sub-periods in 
+            the monitoring season of a valid season.
+
+    Returns:
+        tuple: The filled seasons, the filled current seasons, a boolean array 
+            of shape (places, years) that is True for the valid seasons, the 
+            number of valid climatology seasons of each place, and the means 
+            of shape (places, sub-periods) that fill the current season.
+    """
+    missing = np.isnan(seasons)
+    valid_seasons = np.count_nonzero(missing[:, :, monitoring_slice], axis=2) <= max_missing_periods
+    seasons = np.where(valid_seasons[:, :, np.newaxis], seasons, np.nan)
+    climatology = seasons[:, climatology_indexes]
+    climatology_counts = np.count_nonzero(~np.isnan(climatology), axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        sub_period_means = np.nansum(climatology, axis=1) / climatology_counts
+    seasons = np.where(missing & valid_seasons[:, :, np.newaxis], sub_period_means[:, np.newaxis, :], seasons)
+    current_means = sub_period_means[:, :current_seasons.shape[1]]
+    current_seasons = np.where(np.isnan(current_seasons), current_means, current_seasons)
+    return (seasons, current_seasons, valid_seasons, np.count_nonzero(valid_seasons[:, climatology_indexes], axis=1),
+            sub_period_means)
+
 def slice_by_element(_list: list, start, end=None) -> list:
     """Slice a list by the position of a given element.
 
@@ -418,6 +569,57 @@ def get_similar_years(current_year: np.ndarray, year_list: list[np.ndarray],
     ranked_year_ids = [year_ids[i] for i in ranked_indexes]
     return ranked_year_ids
 
+def get_similar_year_rankings(current_years: np.ndarray, year_lists: np.ndarray, 
+                              use_pearson=False, use_numba=False) -> np.ndarray:
+    """
+    Batched version of `get_similar_years`, which ranks the years of many 
+    places at once with the same criteria.
+
+    The Pearson correlation is computed in closed form over the whole array 
+    instead of calling scipy for each year.
+
+    Parameters:
+        current_years (np.ndarray): Array of shape (places, sub-periods) with 
+            the current year of each place.
+        year_lists (np.ndarray): Array of shape (places, years, sub-periods) 
+            with the years to be compared with `current_years`.
+        use_pearson (bool, optional): Whether or not to use Pearson correlation 
+            as a criteria for similarity. Defaults to False.
+        use_numba (bool, optional): Whether to compute the criteria with the 
+            compiled kernel of `kernels.get_similarity_distances` when numba 
+            is installed. Its distances match up to rounding, so the rankings 
+            can only differ between near-equal years. Defaults to False.
+
+    Returns:
+        np.ndarray: Array of shape (places, years) with the indexes of the 
+            years of each place, from the most to the least similar.
+    """
+    if use_numba and kernels.is_available():
+        distances = kernels.get_similarity_distances(current_years, year_lists, use_pearson)
+        sum_of_rankings = np.argsort(distances[0], axis=1) + np.argsort(distances[1], axis=1) + np.argsort(distances[2], axis=1)
+        if use_pearson:
+            sum_of_rankings += np.argsort(distances[3], axis=1)
+        return np.argsort(sum_of_rankings, axis=1)
+    # the distances are sums of squares, so reduced-precision values are
+    # compared in float64
+    year_lists = year_lists[:, :, :current_years.shape[1]].astype(np.float64, copy=False)
+    current_years = current_years[:, np.newaxis, :].astype(np.float64, copy=False)
+    current_year_accumulations = np.cumsum(current_years, axis=2)
+    accumulations_lists = np.cumsum(year_lists, axis=2)
+    data_curve_rankings = np.argsort(np.sum((year_lists - current_years) ** 2, axis=2), axis=1)
+    accumulation_curve_rankings = np.argsort(np.sum((accumulations_lists - current_year_accumulations) ** 2, axis=2), axis=1)
+    season_total_rankings = np.argsort((accumulations_lists[:, :, -1] - current_year_accumulations[:, :, -1]) ** 2, axis=1)
+    sum_of_rankings = data_curve_rankings + accumulation_curve_rankings + season_total_rankings
+    if use_pearson:
+        year_deviations = year_lists - year_lists.mean(axis=2, keepdims=True)
+        current_deviations = current_years - current_years.mean(axis=2, keepdims=True)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            correlations = np.sum(year_deviations * current_deviations, axis=2) / np.sqrt(
+                np.sum(year_deviations ** 2, axis=2) * np.sum(current_deviations ** 2, axis=2))
+        correlations = np.clip(correlations, -1, 1)
+        sum_of_rankings += np.argsort(1 - correlations ** 2, axis=1)
+    return np.argsort(sum_of_rankings, axis=1)
+
 def get_default_parameters_from_properties(properties: Properties, keys: str = None) -> dict:
     """
     Returns a dictionary of default parameters based on the given properties.
@@ -441,4 +643,4 @@ def get_default_parameters_from_properties(properties: Properties, keys: str = N
         'climatology_end': properties.year_ids[-1],
         'selected_years': properties.year_ids,
     }
-    return dict(map(lambda k: (k, defaults[k]), keys))
\ No newline at end of file
+    return dict(map(lambda k: (k, defaults[k]), keys))
\ No newline at end of file
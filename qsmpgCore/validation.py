@@ -0,0 +1,298 @@
+import re
+import numpy as np
+from .structures import TimeSeriesMatrix
+from .utils import parse_timestamps
+
+# Number of rows scanned at a time, which bounds the memory of the
+# temporary arrays
+SCAN_BLOCK_ROWS = 64
+
+class DataQualityReport:
+    """The issues found by `scan_dataset` in a dataset.
+
+    Attributes:
+        place_count (int): Number of places scanned.
+        missing_count (int): Number of missing values.
+        missing_place_ids (list[str]): Places with at least one missing value.
+        missing_run_place_ids (list[str]): Places with a run of consecutive
+            missing values of at least `max_missing_run` sub-periods.
+        truncated_place_ids (list[str]): Places whose last value is missing,
+            usually rows shorter than the header of the file.
+        negative_count (int): Number of negative values.
+        negative_place_ids (list[str]): Places with negative values.
+        outlier_count (int): Number of implausible values, far from the values
+            of the same sub-period in the other years of their place.
+        outlier_place_ids (list[str]): Places with implausible values.
+        has_duplicates (bool): Whether the source had duplicated place IDs,
+            which the parser merged, see `TimeSeriesMatrix.has_duplicates`.
+        mask (np.ndarray | None): Boolean matrix of shape (places, timestamps),
+            True for the missing, negative and implausible values. None if it
+            was not requested.
+    """
+    def __init__(self) -> None:
+        """Constructor"""
+        self.place_count = 0
+        self.missing_count = 0
+        self.missing_place_ids: list[str] = []
+        self.missing_run_place_ids: list[str] = []
+        self.truncated_place_ids: list[str] = []
+        self.negative_count = 0
+        self.negative_place_ids: list[str] = []
+        self.outlier_count = 0
+        self.outlier_place_ids: list[str] = []
+        self.has_duplicates = False
+        self.mask: np.ndarray | None = None
+
+    @property
+    def has_issues(self) -> bool:
+        """Whether any issue was found."""
+        return bool(self.missing_count or self.negative_count or self.outlier_count
+                    or self.has_duplicates)
+
+    def summary(self, max_ids=5) -> str:
+        """Returns a human-readable summary of the issues.
+
+        Args:
+            max_ids (int, optional): Maximum number of place IDs listed per
+                issue. Defaults to 5.
+
+        Returns:
+            str: One line per issue found, or an empty string.
+        """
+        def ids_text(place_ids):
+            text = ', '.join(place_ids[:max_ids])
+            return text + (f' and {len(place_ids)-max_ids} more' if len(place_ids) > max_ids else '')
+
+        lines = []
+        if self.missing_count:
+            lines.append(f'{self.missing_count} missing values in {len(self.missing_place_ids)} places: {ids_text(self.missing_place_ids)}')
+        if self.missing_run_place_ids:
+            lines.append(f'Long runs of missing values in {len(self.missing_run_place_ids)} places: {ids_text(self.missing_run_place_ids)}')
+        if self.truncated_place_ids:
+            lines.append(f'Truncated rows in {len(self.truncated_place_ids)} places: {ids_text(self.truncated_place_ids)}')
+        if self.negative_count:
+            lines.append(f'{self.negative_count} negative values in {len(self.negative_place_ids)} places: {ids_text(self.negative_place_ids)}')
+        if self.outlier_count:
+            lines.append(f'{self.outlier_count} implausible values in {len(self.outlier_place_ids)} places: {ids_text(self.outlier_place_ids)}')
+        if self.has_duplicates:
+            lines.append('Duplicated place IDs were merged while parsing.')
+        return '\n'.join(lines)
+
+def has_missing_run(missing: np.ndarray, run_length: int) -> np.ndarray:
+    """Flags the rows with a run of at least `run_length` missing values.
+
+    Args:
+        missing (np.ndarray): Boolean matrix, True for the missing values.
+        run_length (int): Length of the runs that are flagged.
+
+    Returns:
+        np.ndarray: Boolean array with an item per row.
+    """
+    column_count = missing.shape[1]
+    if run_length <= 1:
+        return missing.any(axis=1)
+    if run_length > column_count:
+        return np.zeros(missing.shape[0], dtype=bool)
+    # a run starts at the columns where the next `run_length` values are missing
+    starts = missing[:, :column_count-run_length+1].copy()
+    for shift in range(1, run_length):
+        starts &= missing[:, shift:column_count-run_length+1+shift]
+    return starts.any(axis=1)
+
+def split_by_year(values: np.ndarray, sub_period_offset: int, period_length: int):
+    """Splits the columns of a matrix into its incomplete and complete years.
+
+    Args:
+        values (np.ndarray): Matrix of shape (places, timestamps).
+        sub_period_offset (int): Index in the year of the first timestamp.
+        period_length (int): Number of sub-periods in a year.
+
+    Returns:
+        head (np.ndarray): View of the columns before the first complete
+            year, which start at sub-period `sub_period_offset`.
+        body (np.ndarray): View of the complete years, of shape
+            (places, years, period_length).
+        tail (np.ndarray): View of the columns after the last complete year,
+            which start at the first sub-period.
+    """
+    place_count, timestamp_count = values.shape
+    head_length = min((period_length - sub_period_offset) % period_length, timestamp_count)
+    year_count = (timestamp_count - head_length) // period_length
+    body_end = head_length + year_count * period_length
+    body = values[:, head_length:body_end].reshape(place_count, year_count, period_length)
+    return values[:, :head_length], body, values[:, body_end:]
+
+def sum_by_sub_period(values: np.ndarray, sub_period_offset: int, period_length: int) -> np.ndarray:
+    """Sums the columns of a matrix that fall in the same sub-period of a year.
+
+    Args:
+        values (np.ndarray): Matrix of shape (places, timestamps).
+        sub_period_offset (int): Index in the year of the first timestamp.
+        period_length (int): Number of sub-periods in a year.
+
+    Returns:
+        np.ndarray: Matrix of shape (places, period_length).
+    """
+    head, body, tail = split_by_year(values, sub_period_offset, period_length)
+    # einsum reduces the years without the strided loop of `sum(axis=1)`
+    sums = np.einsum('ijk->ik', body, dtype=np.float64)
+    sums[:, sub_period_offset:sub_period_offset+head.shape[1]] += head
+    sums[:, :tail.shape[1]] += tail
+    return sums
+
+def get_outlier_thresholds(filled: np.ndarray, counts: np.ndarray, sub_period_offset: int,
+                           period_length: int, max_deviations: float) -> np.ndarray:
+    """Returns the values above which the values of each place and sub-period
+    are implausible.
+
+    A value is implausible when it is above the mean of its place and
+    sub-period across the years by more than `max_deviations` standard
+    deviations of all the values of its place. Using the spread of the whole
+    series keeps the rare rainy sub-periods of a dry season from being
+    flagged.
+
+    Args:
+        filled (np.ndarray): Matrix of shape (places, timestamps), with the
+            missing values replaced with 0.
+        counts (np.ndarray): Matrix of shape (places, period_length) with the
+            number of values of each sub-period that are not missing.
+        sub_period_offset (int): Index in the year of the first timestamp.
+        period_length (int): Number of sub-periods in a year.
+        max_deviations (float): Number of standard deviations above which a
+            value is implausible.
+
+    Returns:
+        np.ndarray: Matrix of shape (places, period_length), NaN for the
+            sub-periods without values.
+    """
+    sums = sum_by_sub_period(filled, sub_period_offset, period_length)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = sums / counts
+        place_counts = counts.sum(axis=1)
+        place_means = sums.sum(axis=1) / place_counts
+        place_stds = np.sqrt(np.maximum(np.einsum('ij,ij->i', filled, filled) / place_counts - place_means ** 2, 0))
+        return means + max_deviations * place_stds[:, np.newaxis]
+
+def get_outlier_mask(filled: np.ndarray, thresholds: np.ndarray, sub_period_offset: int,
+                     period_length: int) -> np.ndarray:
+    """Flags the values that are above the thresholds of their sub-period.
+
+    Args:
+        filled (np.ndarray): Matrix of shape (places, timestamps), with the
+            missing values replaced with 0, so they are never flagged.
+        thresholds (np.ndarray): Thresholds of shape (places, period_length),
+            see `get_outlier_thresholds`.
+        sub_period_offset (int): Index in the year of the first timestamp.
+        period_length (int): Number of sub-periods in a year.
+
+    Returns:
+        np.ndarray: Boolean matrix of the shape of `filled`.
+    """
+    # the values are compared year by year against the thresholds of their
+    # sub-periods
+    outliers = np.empty(filled.shape, dtype=bool)
+    head, body, tail = split_by_year(filled, sub_period_offset, period_length)
+    outliers_head, outliers_body, outliers_tail = split_by_year(outliers, sub_period_offset, period_length)
+    with np.errstate(invalid='ignore'):
+        np.greater(head, thresholds[:, sub_period_offset:sub_period_offset+head.shape[1]], out=outliers_head)
+        np.greater(body, thresholds[:, np.newaxis, :], out=outliers_body)
+        np.greater(tail, thresholds[:, :tail.shape[1]], out=outliers_tail)
+    return outliers
+
+def scan_dataset(dataset: TimeSeriesMatrix, max_missing_run=3, max_deviations=10.0,
+                 return_mask=False) -> DataQualityReport:
+    """Scans a parsed dataset for values that would spoil the statistics.
+
+    It flags missing values, long runs of them and truncated rows, negative
+    values and implausible outliers per sub-period. The duplicated place IDs 
+    are merged by the parsers, which report them in `has_duplicates`. The 
+    matrix is scanned with whole-array operations over blocks of rows.
+
+    Args:
+        dataset (TimeSeriesMatrix): The parsed dataset.
+        max_missing_run (int, optional): Length of the runs of missing values
+            that are reported. Defaults to 3.
+        max_deviations (float, optional): Number of standard deviations from
+            the mean of the same sub-period above which a value is
+            implausible. Defaults to 10.0.
+        return_mask (bool, optional): Whether to include the mask of the
+            flagged values in the report. Defaults to False.
+
+    Returns:
+        DataQualityReport: The issues found in the dataset.
+    """
+    values = dataset.values
+    place_ids = np.array(dataset.place_ids, dtype=object)
+    period_length = parse_timestamps(dataset.timestamps)['period_length']
+    sub_period_offset = int(re.search(r"\d{6}", dataset.timestamps[0]).group()[4:]) - 1
+
+    report = DataQualityReport()
+    report.place_count = values.shape[0]
+    report.has_duplicates = dataset.has_duplicates
+    if return_mask:
+        report.mask = np.zeros(values.shape, dtype=bool)
+
+    # the blocks are filled into the same buffers, small enough to stay in
+    # the cache while they are reduced, so the matrix is read from memory once
+    block_rows = min(SCAN_BLOCK_ROWS, max(values.shape[0], 1))
+    missing_buffer = np.empty((block_rows, values.shape[1]), dtype=bool)
+    filled_buffer = np.empty((block_rows, values.shape[1]), dtype=values.dtype)
+    all_counts = sum_by_sub_period(np.ones((1, values.shape[1])), sub_period_offset, period_length)
+    missing_rows, run_rows, truncated_rows, negative_rows, outlier_rows = [], [], [], [], []
+    for start in range(0, values.shape[0], block_rows):
+        block = values[start:start+block_rows]
+        row_count = block.shape[0]
+        missing = np.isnan(block, out=missing_buffer[:row_count])
+        # the missing values are few, so they are counted and filled from
+        # their positions rather than from the whole mask
+        positions = np.flatnonzero(missing)
+        missing_row_indexes, missing_columns = np.divmod(positions, block.shape[1])
+        missing_counts = np.bincount(missing_row_indexes, minlength=row_count)
+        if positions.size > 0:
+            filled = filled_buffer[:row_count]
+            np.copyto(filled, block)
+            filled.reshape(-1)[positions] = 0
+            missing_sub_periods = (missing_columns + sub_period_offset) % period_length
+            counts = all_counts - np.bincount(missing_row_indexes * period_length + missing_sub_periods,
+                                              minlength=row_count * period_length).reshape(row_count, period_length)
+        else:
+            filled = block
+            counts = all_counts
+        thresholds = get_outlier_thresholds(filled, counts, sub_period_offset, period_length, max_deviations)
+        # the values are only compared in the rows with a negative value, or
+        # with a maximum above the lowest threshold of the row
+        negative_indexes = np.flatnonzero(filled.min(axis=1) < 0)
+        lowest_thresholds = np.min(thresholds, axis=1, initial=np.inf, where=~np.isnan(thresholds))
+        outlier_indexes = np.flatnonzero(filled.max(axis=1) > lowest_thresholds)
+        negative = filled[negative_indexes] < 0
+        outliers = get_outlier_mask(filled[outlier_indexes], thresholds[outlier_indexes], sub_period_offset, period_length)
+
+        report.missing_count += positions.size
+        missing_rows.append(missing_counts > 0)
+        # the runs are only looked for in the rows with enough missing values
+        long_runs = np.zeros(row_count, dtype=bool)
+        run_indexes = np.flatnonzero(missing_counts >= max(max_missing_run, 1))
+        long_runs[run_indexes] = has_missing_run(missing[run_indexes], max_missing_run)
+        run_rows.append(long_runs)
+        truncated_rows.append(missing[:, -1].copy())
+        negative_counts = np.zeros(row_count, dtype=np.int64)
+        negative_counts[negative_indexes] = np.count_nonzero(negative, axis=1)
+        report.negative_count += int(negative_counts.sum())
+        negative_rows.append(negative_counts > 0)
+        outlier_counts = np.zeros(row_count, dtype=np.int64)
+        outlier_counts[outlier_indexes] = np.count_nonzero(outliers, axis=1)
+        report.outlier_count += int(outlier_counts.sum())
+        outlier_rows.append(outlier_counts > 0)
+        if return_mask:
+            mask = report.mask[start:start+row_count]
+            mask[...] = missing
+            mask[negative_indexes] |= negative
+            mask[outlier_indexes] |= outliers
+
+    if report.place_count > 0:
+        report.missing_place_ids = place_ids[np.concatenate(missing_rows)].tolist()
+        report.missing_run_place_ids = place_ids[np.concatenate(run_rows)].tolist()
+        report.truncated_place_ids = place_ids[np.concatenate(truncated_rows)].tolist()
+        report.negative_place_ids = place_ids[np.concatenate(negative_rows)].tolist()
+        report.outlier_place_ids = place_ids[np.concatenate(outlier_rows)].tolist()
+    return report
@@ -42,6 +42,8 @@ from qgis.PyQt.QtWidgets import (
 )
 
 from qgis.core import (
+    QgsApplication,
+    QgsSettings,
     QgsTask, 
     QgsTaskManager,
 )
@@ -50,16 +52,22 @@ from .map_settings_dialog import MapSettingsDialog
 from .year_selection_dialog import YearSelectionDialog
 from .progress_dialog import ProgressDialog
 
-from .qsmpgCore.parsers.CSVParser import parse_csv
-from .qsmpgCore.structures import Dataset
+from .qsmpgCore.parsers.CSVParser import parse_csv, probe_csv, DEFAULT_CHUNK_SIZE
+from .qsmpgCore.parsers.RasterParser import parse_raster_stack, probe_raster_stack, is_raster_source
+from .qsmpgCore.engine import StatsRequest
+from .qsmpgCore.parallel import DIALOG_EXECUTOR
+from .qsmpgCore.validation import scan_dataset
+from .qsmpgCore.results_cache import NormalsStore, ResultsCache, get_matrix_hash
+from .qsmpgCore.resampling import get_resampling_units, resample_timestamps, resample_dataset
 from .qsmpgCore.utils import (
     Parameters, Properties, define_seasonal_dict, parse_timestamps, 
     get_properties_validated_year_list, get_default_parameters_from_properties,
+    precision_dtypes,
     )
     
-from .qsmpgCore.exporters.WebExporter import export_to_web_files
-from .qsmpgCore.exporters.CSVExporter import export_to_csv_files
-from .qsmpgCore.exporters.ImageExporter import export_to_image_files
+from .qsmpgCore.exporters.WebExporter import export_to_web_files, WEB_REQUIRED_STATS
+from .qsmpgCore.exporters.CSVExporter import export_to_csv_files, CSV_REQUIRED_STATS
+from .qsmpgCore.exporters.ImageExporter import export_to_image_files, IMAGE_REQUIRED_STATS
 from .qsmpgCore.exporters.ParameterExporter import export_parameters
 from .qsmpgCore.exporters.QGISExporter import generate_layers_from_csv
 
@@ -87,6 +95,15 @@ class QSMPGDialog(QDialog, FORM_CLASS):
         # task manager object that executes the processing tasks in threads.
         self.task_manager = QgsTaskManager(self) 
 
+        # computed datasets, reused when only the outputs change, and the 
+        # normals of their past seasons, reused by the following dekads. They 
+        # are also stored in the profile folder to be reused after a restart 
+        # when `storeResultsCheckBox` is checked.
+        self.results_folder = os.path.join(QgsApplication.qgisSettingsDirPath(), 'qsmpg')
+        self.results_cache = ResultsCache(normals_store=NormalsStore())
+        self.parsed_dataset = None
+        self.parsed_dataset_hash = None
+
         # child dialogs
         self.year_selection_dialog = YearSelectionDialog(self)
         self.progress_dialog = ProgressDialog(self)
@@ -106,6 +123,7 @@ class QSMPGDialog(QDialog, FORM_CLASS):
         self.crossYearsCheckBox: QCheckBox
         self.seasonStartComboBox: QComboBox
         self.seasonEndComboBox: QComboBox
+        self.periodUnitComboBox: QComboBox
 
         # year selection group
         self.customYearsRadioButton: QRadioButton
@@ -117,6 +135,9 @@ class QSMPGDialog(QDialog, FORM_CLASS):
         # analysis group
         self.observedDataRadioButton: QRadioButton
         self.forecastRadioButton: QRadioButton
+        self.fillGapsCheckBox: QCheckBox
+        self.singlePrecisionCheckBox: QCheckBox
+        self.storeResultsCheckBox: QCheckBox
 
         # outputs group
         self.exportWebCheckBox: QCheckBox
@@ -143,6 +164,7 @@ class QSMPGDialog(QDialog, FORM_CLASS):
         self.exportStatsCheckBox.stateChanged.connect(self.export_stats_cb_changed_event)
 
         self.crossYearsCheckBox.stateChanged.connect(self.cross_years_cb_changed_event)
+        self.periodUnitComboBox.currentTextChanged.connect(self.period_unit_cb_changed_event)
         self.customYearsRadioButton.toggled.connect(self.year_selection_rb_event)
         self.similarYearsRadioButton.toggled.connect(self.year_selection_rb_event)
         self.selectYearsButton.clicked.connect(self.select_years_btn_event)
@@ -151,6 +173,11 @@ class QSMPGDialog(QDialog, FORM_CLASS):
         self.importParametersButton.clicked.connect(self.import_parameters_btn_event)
         self.processButton.clicked.connect(self.process_btn_event)
 
+        # the stored results are opt-in, and the choice is kept in the settings
+        self.storeResultsCheckBox.setChecked(QgsSettings().value('qsmpg/store_results', False, type=bool))
+        self.set_results_folders(self.storeResultsCheckBox.isChecked())
+        self.storeResultsCheckBox.toggled.connect(self.store_results_cb_changed_event)
+
     def get_parameters_from_widgets(self):
         """Get parameters from widgets and return them as a dictionary."""
         selected_years = None
@@ -165,8 +192,12 @@ class QSMPGDialog(QDialog, FORM_CLASS):
             "season_start": self.seasonStartComboBox.currentText(),
             "season_end": self.seasonEndComboBox.currentText(),
             "cross_years": self.crossYearsCheckBox.isChecked(),
+            "period_unit": self.periodUnitComboBox.currentText(),
             "selected_years": selected_years,
             "is_forecast": self.forecastRadioButton.isChecked(),
+            "mask_missing_data": self.fillGapsCheckBox.isChecked(),
+            "precision": 'float32' if self.singlePrecisionCheckBox.isChecked() else 'float64',
+            "executor": DIALOG_EXECUTOR,
             "use_pearson": self.usePearsonCheckBox.isChecked(),
             "output_web": self.exportWebCheckBox.isChecked(),
             "output_images": self.exportImagesCheckBox.isChecked(),
@@ -186,8 +217,9 @@ class QSMPGDialog(QDialog, FORM_CLASS):
                 settings and values to be set.
         """
         self.crossYearsCheckBox.setChecked(parameters.cross_years)
+        self.set_period_unit(parameters.period_unit)
         year_ids = get_properties_validated_year_list(self.dataset_properties, self.crossYearsCheckBox.isChecked())
-        sub_season_ids = define_seasonal_dict(self.crossYearsCheckBox.isChecked())
+        sub_season_ids = define_seasonal_dict(self.crossYearsCheckBox.isChecked(), self.dataset_properties.period_unit_id)
 
         # update climatology
         self.climatologyStartComboBox.setEnabled(True)
@@ -227,6 +259,7 @@ class QSMPGDialog(QDialog, FORM_CLASS):
         self.customYearsRadioButton.setEnabled(True)
         self.similarYearsRadioButton.setEnabled(True)
         self.crossYearsCheckBox.setEnabled(True)
+        self.periodUnitComboBox.setEnabled(self.periodUnitComboBox.count() > 1)
         self.processButton.setEnabled(True)
 
         # update year selection
@@ -255,6 +288,10 @@ class QSMPGDialog(QDialog, FORM_CLASS):
         self.forecastRadioButton.setEnabled(True)
         if parameters.is_forecast: self.forecastRadioButton.setChecked(True)
         else: self.observedDataRadioButton.setChecked(True)
+        self.fillGapsCheckBox.setEnabled(True)
+        self.fillGapsCheckBox.setChecked(parameters.mask_missing_data)
+        self.singlePrecisionCheckBox.setEnabled(True)
+        self.singlePrecisionCheckBox.setChecked(parameters.precision == 'float32')
 
         # update outputs
         self.exportWebCheckBox.setEnabled(True)
@@ -272,36 +309,45 @@ class QSMPGDialog(QDialog, FORM_CLASS):
         """Event handler for `loadFileButton`, it loads the dataset file.
         
         This is an event handler for when the user clicks the "Load Rainfall 
-        Dataset (.csv)" button. It reads the selected dataset from a file and 
-        parses it to create a structured data object. It also updates the 
-        dialog's fields with default values based on the selected dataset 
-        properties.
+        Dataset (.csv)" button. It reads the header of the selected dataset 
+        to get its properties and updates the dialog's fields with default 
+        values based on them. The values of the dataset are parsed when they 
+        are first needed, see `get_parsed_dataset`.
         """
-        # path reading
-        temp_dataset_source = QFileDialog.getOpenFileName(self, 'Open dataset file', None, "CSV files (*.csv)")[0]
-        if temp_dataset_source == "":
+        # path reading, several CSV files of the same dekad are merged into one 
+        # dataset, several rasters are read as a stack with one raster per dekad
+        temp_dataset_sources = QFileDialog.getOpenFileNames(self, 'Open dataset files', None, 
+                                                            "CSV files (*.csv);;Raster stacks (*.tif *.tiff *.bil *.img *.nc *.nc4)")[0]
+        if len(temp_dataset_sources) == 0:
             QMessageBox.warning(self, "Warning", 
                                 'No dataset was selected.', 
                                 QMessageBox.Ok)
             return
-        self.selected_source = temp_dataset_source
-        self.dataset_source_path = os.path.normpath(os.path.dirname(self.selected_source))
-        self.dataset_filename = ''.join(os.path.basename(self.selected_source).split('.')[:-1])
+        if len(temp_dataset_sources) == 1:
+            self.selected_source = temp_dataset_sources[0]
+            self.dataset_source_path = os.path.normpath(os.path.dirname(self.selected_source))
+            self.dataset_filename = ''.join(os.path.basename(self.selected_source).split('.')[:-1])
+        else:
+            self.selected_source = temp_dataset_sources
+            self.dataset_source_path = os.path.normpath(os.path.dirname(self.selected_source[0]))
+            self.dataset_filename = os.path.basename(self.dataset_source_path)
 
-        # parse dataset
+        # read dataset metadata, the values are parsed on demand
         try:
-            self.parsed_dataset, self.col_names, has_duplicates = parse_csv(self.selected_source)
+            if is_raster_source(self.selected_source):
+                self.native_col_names, self.dataset_place_quantity = probe_raster_stack(self.selected_source)
+            else:
+                self.native_col_names, self.dataset_place_quantity = probe_csv(self.selected_source)
+            self.col_names = self.native_col_names
             self.dataset_properties = Properties(parse_timestamps(self.col_names))
         except Exception as e:
             QMessageBox.critical(self, "Error", f'The dataset could not be read.\n\n{str(e)}\n\n{traceback.format_exc()}', QMessageBox.Ok)
             return
-        if has_duplicates:
-            QMessageBox.warning(self, "Warning", 
-                                'Duplicated place names have been found.\nThe program might produce unexpected results.', 
-                                QMessageBox.Ok)
+        self.parsed_dataset = None
+        self.parsed_dataset_hash = None
 
         # set form fields content from data
-        self.datasetInputLineEdit.setText(self.selected_source)
+        self.datasetInputLineEdit.setText('; '.join(temp_dataset_sources))
         self.importParametersLineEdit.setText('')
         default_parameters = Parameters()
         default_parameters.set_parameters(
@@ -311,6 +357,42 @@ class QSMPGDialog(QDialog, FORM_CLASS):
         self.year_selection_dialog.selected_years = self.dataset_properties.year_ids
         self.update_dialog_info(self.dataset_properties)
 
+    def get_parsed_dataset(self, precision='float64'):
+        """Returns the values of the selected dataset, parsing them if needed.
+
+        The dataset is parsed only once per selected file and precision. A 
+        warning is shown when the data quality scan finds missing, negative or 
+        implausible values, or duplicated places.
+
+        Args:
+            precision (str, optional): The precision of the values, see 
+                `Parameters.precision`. Defaults to 'float64'.
+
+        Returns:
+            TimeSeriesMatrix | None: The parsed dataset, or None if it could 
+                not be read.
+        """
+        dtype = precision_dtypes[precision]
+        if self.parsed_dataset is not None and self.parsed_dataset.values.dtype == dtype:
+            return self.parsed_dataset
+        try:
+            if is_raster_source(self.selected_source):
+                parsed_dataset = parse_raster_stack(self.selected_source, dtype=dtype)
+            else:
+                parsed_dataset = parse_csv(self.selected_source, chunk_size=DEFAULT_CHUNK_SIZE, dtype=dtype,
+                                           executor=DIALOG_EXECUTOR)
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f'The dataset could not be read.\n\n{str(e)}\n\n{traceback.format_exc()}', QMessageBox.Ok)
+            return None
+        quality_report = scan_dataset(parsed_dataset)
+        if quality_report.has_issues:
+            QMessageBox.warning(self, "Warning", 
+                                f'{quality_report.summary()}\n\nThe program might produce unexpected results.', 
+                                QMessageBox.Ok)
+        self.parsed_dataset = parsed_dataset
+        self.parsed_dataset_hash = None
+        return self.parsed_dataset
+
     def process_btn_event(self):
         """Event handler for `processButton`, it outputs the processed data.
         
@@ -357,7 +439,28 @@ class QSMPGDialog(QDialog, FORM_CLASS):
         
         # computation with parameters given from GUI
         parameters = Parameters(self.get_parameters_from_widgets())
-        self.structured_dataset = Dataset(self.dataset_filename, self.parsed_dataset, self.col_names, parameters)
+        parsed_dataset = self.get_parsed_dataset(parameters.precision)
+        if parsed_dataset is None:
+            return
+        # the resampling is part of the computation parameters, so the hash 
+        # of the parsed values identifies the input
+        if self.parsed_dataset_hash is None:
+            self.parsed_dataset_hash = get_matrix_hash(parsed_dataset)
+        parsed_dataset = resample_dataset(parsed_dataset, parameters.period_unit)
+        # only the statistics read by the selected outputs are computed
+        required_stats = StatsRequest(())
+        if self.exportStatsCheckBox.isChecked():
+            required_stats |= CSV_REQUIRED_STATS
+        if self.exportWebCheckBox.isChecked():
+            required_stats |= WEB_REQUIRED_STATS
+        if self.exportImagesCheckBox.isChecked():
+            required_stats |= IMAGE_REQUIRED_STATS
+        self.structured_dataset = self.results_cache.get_dataset(self.dataset_filename, parsed_dataset, self.col_names, parameters,
+                                                                 required_stats, self.parsed_dataset_hash)
+        if self.structured_dataset.excluded_place_ids:
+            QMessageBox.warning(self, "Warning", 
+                                f'{len(self.structured_dataset.excluded_place_ids)} places have too few years with data in the climatology and were left out.', 
+                                QMessageBox.Ok)
         
         # add selected output tasks to a list of tasks
         long_tasks: list[TaskHandler] = []
@@ -464,6 +567,50 @@ class QSMPGDialog(QDialog, FORM_CLASS):
         )
         self.update_fields(parameters)
 
+    def set_period_unit(self, period_unit: str | None):
+        """Sets the period unit the dataset is resampled to.
+
+        It fills `periodUnitComboBox` with the units available for the loaded 
+        dataset and updates the timestamps and properties of the dataset to 
+        the selected unit.
+
+        Args:
+            period_unit (str | None): The period unit. The unit of the dataset 
+                is used when it is None or not available.
+        """
+        period_units = get_resampling_units(self.native_col_names)
+        if period_unit not in period_units:
+            period_unit = period_units[0]
+        self.periodUnitComboBox.blockSignals(True)
+        self.periodUnitComboBox.clear()
+        self.periodUnitComboBox.addItems(period_units)
+        self.periodUnitComboBox.setCurrentText(period_unit)
+        self.periodUnitComboBox.blockSignals(False)
+        self.col_names = resample_timestamps(self.native_col_names, period_unit)
+        self.dataset_properties = Properties(parse_timestamps(self.col_names))
+
+    def period_unit_cb_changed_event(self):
+        """Event handler for `periodUnitComboBox`, it switches the time step.
+
+        The dataset is aggregated to the selected period unit when it is 
+        processed, so the seasons and years available are updated to it.
+        """
+        self.set_period_unit(self.periodUnitComboBox.currentText())
+        parameters = Parameters(
+            {
+                **self.get_parameters_from_widgets(),
+                'climatology_start': None,
+                'climatology_end': None,
+                'season_start': None,
+                'season_end': None,
+                'selected_years': get_properties_validated_year_list(
+                    self.dataset_properties, self.crossYearsCheckBox.isChecked()
+                ),
+            }
+        )
+        self.update_fields(parameters)
+        self.update_dialog_info(self.dataset_properties)
+
     def year_selection_rb_event(self):
         """Event handler for year selection RadioButtons.
         
@@ -489,6 +636,29 @@ class QSMPGDialog(QDialog, FORM_CLASS):
         """
         self.mappingButton.setEnabled(self.exportStatsCheckBox.isChecked())
 
+    def store_results_cb_changed_event(self):
+        """Event handler for `storeResultsCheckBox`.
+        
+        It starts storing the computed statistics in the profile folder, or 
+        stops storing them and removes the stored files.
+        """
+        store_results = self.storeResultsCheckBox.isChecked()
+        QgsSettings().setValue('qsmpg/store_results', store_results)
+        if not store_results:
+            self.results_cache.clear_folder()
+            self.results_cache.normals_store.clear_folder()
+        self.set_results_folders(store_results)
+
+    def set_results_folders(self, store_results: bool):
+        """Sets the folders of the stored statistics and normals, or keeps 
+        them only in memory."""
+        normals_store = self.results_cache.normals_store
+        if store_results:
+            self.results_cache.folder = os.path.join(self.results_folder, 'results')
+            normals_store.folder = os.path.join(self.results_folder, 'normals')
+        else:
+            self.results_cache.folder = normals_store.folder = None
+
     def select_years_btn_event(self):
         """Event handler for `selectYearsButton`.
         
@@ -520,7 +690,8 @@ class QSMPGDialog(QDialog, FORM_CLASS):
 f'''First Year: {dataset_properties.year_ids[0]}
 Last Year: {dataset_properties.year_ids[-1]}
 Current Year: {dataset_properties.current_season_id}
-Dekads in Current Year: {dataset_properties.current_season_length}'''
+{dataset_properties.period_unit_id}s in Current Year: {dataset_properties.current_season_length}
+Places: {self.dataset_place_quantity}'''
         self.datasetInfoLabel.setText(dg_text)
 
 class TaskHandler(QgsTask):
@@ -0,0 +1,90 @@
+"""Compares the NumPy and the compiled (numba) kernels on a synthetic dataset.
+
+Usage, from the plugin folder:
+
+    python scripts/benchmark_kernels.py --places 100000 --pearson
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from qsmpgCore import kernels
+from qsmpgCore.engine import get_ensembles
+from qsmpgCore.structures import Dataset, TimeSeriesMatrix
+from qsmpgCore.utils import Parameters, get_similar_year_rankings
+
+
+def make_dataset(place_count: int, year_count: int, seed=0) -> TimeSeriesMatrix:
+    """Returns a synthetic dekadal rainfall dataset ending in mid 2020."""
+    rng = np.random.default_rng(seed)
+    first_year = 2020 - year_count
+    timestamps = [f'{year}{dekad:02d}' for year in range(first_year, 2020) for dekad in range(1, 37)]
+    timestamps += [f'2020{dekad:02d}' for dekad in range(1, 21)]
+    values = np.round(rng.gamma(0.8, 25.0, (place_count, len(timestamps))), 1)
+    return TimeSeriesMatrix(values, [f'P{i}' for i in range(place_count)], timestamps)
+
+
+def best_time(function, repeat: int) -> float:
+    """Returns the best time of several calls of a function, in seconds."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--places', type=int, default=50000, help='number of places')
+    parser.add_argument('--years', type=int, default=30, help='number of past years')
+    parser.add_argument('--repeat', type=int, default=3, help='number of timed runs')
+    parser.add_argument('--pearson', action='store_true', help='rank with the Pearson correlation too')
+    args = parser.parse_args()
+    if not kernels.is_available():
+        sys.exit('numba is not installed, only the NumPy kernels can be run.')
+
+    dataset = make_dataset(args.places, args.years)
+    parameters = {
+        'climatology_start': str(2020 - args.years),
+        'climatology_end': '2019',
+        'season_start': 'Jan-1',
+        'season_end': 'Dec-3',
+        'selected_years': '10',
+        'use_pearson': args.pearson,
+    }
+    reference = Dataset('benchmark', dataset, dataset.timestamps, Parameters(parameters))
+    current_seasons = reference.stats.current_seasons
+    seasons = reference.stats.seasons
+    current_accumulations = reference.stats.current_accumulations
+    monitoring_seasons = reference.stats.monitoring_seasons
+
+    # the first calls compile the kernels
+    rankings = get_similar_year_rankings(current_seasons, seasons, args.pearson, use_numba=True)
+    ensembles = get_ensembles(current_accumulations, monitoring_seasons, use_numba=True)
+    # the kernels round their sums differently, so near-equal years can swap
+    different_places = np.any(rankings != get_similar_year_rankings(current_seasons, seasons, args.pearson), axis=1)
+    np.testing.assert_allclose(ensembles, get_ensembles(current_accumulations, monitoring_seasons), rtol=1e-6)
+
+    benchmarks = {
+        'similar year rankings': lambda use_numba: get_similar_year_rankings(current_seasons, seasons, args.pearson, use_numba),
+        'ensembles': lambda use_numba: get_ensembles(current_accumulations, monitoring_seasons, use_numba),
+        'dataset': lambda use_numba: Dataset('benchmark', dataset, dataset.timestamps,
+                                             Parameters({**parameters, 'use_numba': use_numba})),
+    }
+    print(f'{args.places} places, {args.years} years, best of {args.repeat} runs')
+    print(f'{np.count_nonzero(different_places)} places with different similar year rankings')
+    print(f'{"":<24}{"NumPy (s)":>12}{"numba (s)":>12}{"speedup":>10}')
+    for name, function in benchmarks.items():
+        numpy_time = best_time(lambda: function(False), args.repeat)
+        numba_time = best_time(lambda: function(True), args.repeat)
+        print(f'{name:<24}{numpy_time:>12.3f}{numba_time:>12.3f}{numpy_time / numba_time:>9.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+# coding=utf-8
+"""Synthetic datasets shared by the tests of the statistics.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+import numpy as np
+
+
+def make_rainfall(place_count, first_year, last_year, last_dekad=36, missing_fraction=0.0, seed=0):
+    """Returns synthetic dekadal rainfall values and their timestamps.
+
+    :param place_count: Number of places (rows).
+    :param first_year: First year, starting at its first dekad.
+    :param last_year: Last year, ending at `last_dekad`.
+    :param last_dekad: Last dekad of the last year.
+    :param missing_fraction: Fraction of values replaced with NaN.
+    :param seed: Seed of the random generator.
+    :returns: The values rounded to 0.1 and their timestamps.
+    :rtype: (numpy.ndarray, list)
+    """
+    rng = np.random.default_rng(seed)
+    timestamps = [f'{year}{dekad:02d}' for year in range(first_year, last_year) for dekad in range(1, 37)]
+    timestamps += [f'{last_year}{dekad:02d}' for dekad in range(1, last_dekad + 1)]
+    values = np.round(rng.gamma(0.8, 25.0, (place_count, len(timestamps))), 1)
+    if missing_fraction:
+        values[rng.random(values.shape) < missing_fraction] = np.nan
+    return values, timestamps
+
+
+def make_place_ids(place_count):
+    """Returns the IDs of the synthetic places."""
+    return [f'P{i:05d}' for i in range(place_count)]
+
+
+def make_rainfall_dataset(place_count, first_year, last_year, last_dekad=36, missing_fraction=0.0, seed=0):
+    """Returns a synthetic dekadal rainfall dataset, see `make_rainfall`."""
+    from qsmpgCore.structures import TimeSeriesMatrix
+    values, timestamps = make_rainfall(place_count, first_year, last_year, last_dekad, missing_fraction, seed)
+    return TimeSeriesMatrix(values, make_place_ids(place_count), timestamps)
@@ -0,0 +1,144 @@
+# coding=utf-8
+"""CSV parser test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from qsmpgCore.parsers import CSVParser
+from qsmpgCore.parsers.CSVParser import parse_csv
+
+
+class CSVParserTest(unittest.TestCase):
+    """Test the CSV parsing modes."""
+
+    def setUp(self):
+        """Runs before each test."""
+        self.folder = tempfile.mkdtemp()
+        self.rng = np.random.default_rng(0)
+        self.timestamps = [f'2020{dekad:02d}' for dekad in range(1, 37)]
+
+    def tearDown(self):
+        """Runs after each test."""
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def write_csv(self, name, place_ids, values, timestamps=None):
+        """Writes a CSV file with empty cells for the NaN values."""
+        filename = os.path.join(self.folder, name)
+        with open(filename, 'w') as csv_file:
+            csv_file.write(','.join(['ID'] + (timestamps or self.timestamps)) + '\n')
+            for place_id, row in zip(place_ids, values):
+                csv_file.write(','.join([str(place_id)] + ['' if np.isnan(value) else str(value) for value in row]) + '\n')
+        return filename
+
+    def make_values(self, place_count):
+        """Returns values rounded to 0.1 with some NaN."""
+        values = np.round(self.rng.gamma(0.8, 25.0, (place_count, len(self.timestamps))), 1)
+        values[self.rng.random(values.shape) < 0.1] = np.nan
+        return values
+
+    def assert_same_dataset(self, actual, expected):
+        """Checks that two parsed datasets are equal."""
+        self.assertEqual(actual.place_ids, expected.place_ids)
+        self.assertEqual(actual.timestamps, expected.timestamps)
+        self.assertEqual(actual.has_duplicates, expected.has_duplicates)
+        self.assertEqual(actual.values.dtype, expected.values.dtype)
+        np.testing.assert_array_equal(actual.values, expected.values)
+
+    def test_streaming(self):
+        """Test that the chunks give the dataset of the whole file, with
+        duplicated and unsorted places."""
+        engines = ['c'] + (['pyarrow'] if CSVParser.pa_csv is not None else [])
+        id_lists = {
+            'numeric': [int(place_id) for place_id in self.rng.permutation(60) * 7 + 3],
+            'text': [f'P{place_id}' for place_id in self.rng.permutation(60)],
+        }
+        for kind, place_ids in id_lists.items():
+            place_ids = place_ids + place_ids[5:15] + place_ids[40:42]
+            filename = self.write_csv(f'{kind}.csv', place_ids, self.make_values(len(place_ids)))
+            expected = parse_csv(filename, use_cache=False)
+            self.assertTrue(expected.has_duplicates)
+            for engine in engines:
+                for chunk_size in (1, 7, 10000):
+                    for dtype in (np.float64, np.float32):
+                        actual = parse_csv(filename, use_cache=False, chunk_size=chunk_size, engine=engine, dtype=dtype)
+                        if dtype == np.float32:
+                            self.assertEqual(actual.values.dtype, np.float32)
+                            np.testing.assert_array_equal(actual.values, expected.values.astype(np.float32))
+                        else:
+                            self.assert_same_dataset(actual, expected)
+
+    def test_streaming_unique(self):
+        """Test the chunks of a file with no duplicates."""
+        filename = self.write_csv('unique.csv', range(20, 0, -1), self.make_values(20))
+        expected = parse_csv(filename, use_cache=False)
+        self.assertFalse(expected.has_duplicates)
+        self.assert_same_dataset(parse_csv(filename, use_cache=False, chunk_size=3), expected)
+
+    def test_streaming_id_types(self):
+        """Test that the chunks merge and sort the IDs in the form given by
+        the whole-file parsing, with zero-padded, float and mixed IDs."""
+        engines = ['c'] + (['pyarrow'] if CSVParser.pa_csv is not None else [])
+        id_lists = {
+            'padded': ['007', '7', '10', '010', '2', '0002', '1'],
+            'float': ['1.0', '2', '1', '0.5', '10', '2.50', '2.5'],
+            'mixed': ['P7', '7', '007', '10', 'a', '10', '2'],
+        }
+        for kind, place_ids in id_lists.items():
+            filename = self.write_csv(f'{kind}.csv', place_ids, self.make_values(len(place_ids)))
+            expected = parse_csv(filename, use_cache=False)
+            for engine in engines:
+                for chunk_size in (1, 3, 10000):
+                    self.assert_same_dataset(parse_csv(filename, use_cache=False, chunk_size=chunk_size, engine=engine),
+                                             expected)
+        self.assertEqual(parse_csv(self.write_csv('padded.csv', id_lists['padded'], self.make_values(7)), use_cache=False,
+                                   chunk_size=2).place_ids, ['1', '2', '7', '10'])
+
+    def test_merge(self):
+        """Test that several files are merged as one file with all their
+        rows."""
+        files = {'north.csv': (range(0, 30), self.make_values(30)), 'south.csv': (range(25, 50), self.make_values(25))}
+        filenames = [self.write_csv(name, place_ids, values) for name, (place_ids, values) in files.items()]
+        combined = self.write_csv('combined.csv', [place_id for place_ids, _ in files.values() for place_id in place_ids],
+                                  np.concatenate([values for _, values in files.values()]))
+        expected = parse_csv(combined, use_cache=False)
+        self.assertTrue(expected.has_duplicates)
+        for executor in ('serial', 'thread', 'process'):
+            self.assert_same_dataset(parse_csv(filenames, use_cache=False, executor=executor), expected)
+        os.remove(combined)
+        self.assert_same_dataset(parse_csv(self.folder, use_cache=False, max_workers=1), expected)
+
+    def test_namespace(self):
+        """Test that the places of each file are prefixed with its name."""
+        north = self.write_csv('north.csv', [1, 2], self.make_values(2))
+        south = self.write_csv('south.csv', [2, 3], self.make_values(2))
+        merged = parse_csv([north, south], use_cache=False, max_workers=1)
+        self.assertEqual(merged.place_ids, ['1', '2', '3'])
+        self.assertTrue(merged.has_duplicates)
+        namespaced = parse_csv([north, south], use_cache=False, namespace_places=True, max_workers=1)
+        self.assertEqual(namespaced.place_ids, ['north/1', 'north/2', 'south/2', 'south/3'])
+        self.assertFalse(namespaced.has_duplicates)
+        np.testing.assert_array_equal(namespaced['south/2'], parse_csv(south, use_cache=False)['2'])
+
+    def test_timestamp_mismatch(self):
+        """Test that files with other timestamps are not merged."""
+        north = self.write_csv('north.csv', [1], self.make_values(1))
+        south = self.write_csv('south.csv', [2], self.make_values(1)[:, 1:], self.timestamps[1:])
+        with self.assertRaises(ValueError):
+            parse_csv([north, south], use_cache=False, max_workers=1)
+        with self.assertRaises(ValueError):
+            parse_csv([], use_cache=False)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+# coding=utf-8
+"""Dataset cache test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from qsmpgCore.parsers.CSVParser import parse_csv
+from qsmpgCore.parsers.DatasetCache import get_cache_path, load_cache
+
+
+class DatasetCacheTest(unittest.TestCase):
+    """Test the sidecar cache of the parsed CSV files."""
+
+    def setUp(self):
+        """Runs before each test."""
+        self.folder = tempfile.mkdtemp()
+        self.filename = os.path.join(self.folder, 'dataset.csv')
+        self.write_csv(['ID,202001,202002,202003', '3,1.5,2.0,', '1,0.5,,4.0', '2,7.0,8.0,9.0', '1,,3.0,5.0'])
+
+    def tearDown(self):
+        """Runs after each test."""
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def write_csv(self, lines):
+        """Writes the CSV file."""
+        with open(self.filename, 'w') as csv_file:
+            csv_file.write('\n'.join(lines) + '\n')
+
+    def test_hit(self):
+        """Test that a cached file is memory-mapped with the parsed data."""
+        expected = parse_csv(self.filename, use_cache=False)
+        self.assertFalse(os.path.exists(get_cache_path(self.filename)))
+        parse_csv(self.filename)
+        self.assertIsNotNone(load_cache(self.filename))
+        cached = parse_csv(self.filename)
+        self.assertIsInstance(cached.values, np.memmap)
+        self.assertEqual(cached.place_ids, expected.place_ids)
+        self.assertEqual(cached.place_ids, ['1', '2', '3'])
+        self.assertEqual(cached.timestamps, expected.timestamps)
+        self.assertEqual(cached.has_duplicates, expected.has_duplicates)
+        self.assertTrue(cached.has_duplicates)
+        np.testing.assert_array_equal(cached.values, expected.values)
+
+    def test_edit(self):
+        """Test that an edited file is parsed again."""
+        parse_csv(self.filename)
+        # same size, new contents and modification time
+        stat = os.stat(self.filename)
+        self.write_csv(['ID,202001,202002,202003', '3,1.5,2.0,', '1,0.5,,4.0', '2,7.0,8.0,6.0', '1,,3.0,5.0'])
+        os.utime(self.filename, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        self.assertIsNone(load_cache(self.filename))
+        edited = parse_csv(self.filename)
+        self.assertNotIsInstance(edited.values, np.memmap)
+        self.assertEqual(edited.values[1, 2], 6.0)
+        # new size
+        self.write_csv(['ID,202001,202002,202003', '4,1.0,1.0,1.0'])
+        self.assertIsNone(load_cache(self.filename))
+        self.assertEqual(parse_csv(self.filename).place_ids, ['4'])
+
+    def test_touch(self):
+        """Test that a file touched without being edited is still cached."""
+        parse_csv(self.filename)
+        stat = os.stat(self.filename)
+        os.utime(self.filename, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        self.assertIsNotNone(load_cache(self.filename))
+        self.assertIsInstance(parse_csv(self.filename).values, np.memmap)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+# coding=utf-8
+"""Partial recomputation test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+import unittest
+
+import numpy as np
+
+from qsmpgCore.engine import get_invalidated_results
+from qsmpgCore.structures import Dataset
+from qsmpgCore.utils import Parameters
+
+from .fixtures import make_rainfall_dataset
+
+
+class DependenciesTest(unittest.TestCase):
+    """Test that a dataset computed from a previous one has the results of a
+    full computation."""
+
+    def setUp(self):
+        """Runs before each test."""
+        self.dataset = make_rainfall_dataset(300, 1991, 2011, last_dekad=20, missing_fraction=0.01)
+        self.parameters = {
+            'climatology_start': '1991',
+            'climatology_end': '2010',
+            'season_start': 'Mar-1',
+            'season_end': 'Oct-3',
+            'selected_years': '5',
+            'mask_missing_data': True,
+        }
+
+    def compute(self, parameters, previous=None):
+        """Computes the dataset with some parameters."""
+        return Dataset('test', self.dataset, self.dataset.timestamps, Parameters(parameters), previous=previous)
+
+    def assert_same_stats(self, actual, expected):
+        """Checks that two datasets have the same statistics."""
+        for key in ('similar_indexes', 'selected_indexes', 'climatology_indexes', 'seasonal_ensembles'):
+            np.testing.assert_array_equal(getattr(actual.stats, key), getattr(expected.stats, key))
+        for subset in ('place_stats', 'selected_years_place_stats'):
+            actual_stats = getattr(actual.stats, subset)
+            expected_stats = getattr(expected.stats, subset)
+            self.assertEqual(list(actual_stats), list(expected_stats))
+            for key in expected_stats:
+                np.testing.assert_array_equal(actual_stats[key], expected_stats[key], f'{subset} {key}')
+
+    def test_invalidated_results(self):
+        """Test the parts of the results that depend on each parameter."""
+        parameters = Parameters(self.parameters)
+        self.assertEqual(get_invalidated_results(parameters, Parameters({**self.parameters, 'output_web': False})), set())
+        self.assertEqual(get_invalidated_results(parameters, Parameters({**self.parameters, 'selected_years': '7'})),
+                         {'selected years', 'selected stats'})
+        self.assertIn('seasons', get_invalidated_results(parameters, Parameters({**self.parameters, 'climatology_start': '1995'})))
+        unmasked = Parameters({**self.parameters, 'mask_missing_data': False})
+        self.assertEqual(get_invalidated_results(unmasked, Parameters({**self.parameters, 'mask_missing_data': False, 'climatology_start': '1995'})),
+                         {'climatology years', 'climatology stats', 'selected stats'})
+        self.assertEqual(get_invalidated_results(unmasked, Parameters({**self.parameters, 'mask_missing_data': False, 'season_end': 'Sep-3'})),
+                         {'accumulations', 'current accumulations', 'climatology stats', 'selected stats'})
+
+    def test_selected_years(self):
+        """Test that only the selected years statistics are computed again."""
+        previous = self.compute(self.parameters)
+        for selected_years in ('8', ['1993', '1999', '2004']):
+            parameters = {**self.parameters, 'selected_years': selected_years}
+            updated = self.compute(parameters, previous)
+            self.assertIs(updated.stats.similar_indexes, previous.stats.similar_indexes)
+            self.assertIs(updated.stats.place_stats['LTA'], previous.stats.place_stats['LTA'])
+            self.assert_same_stats(updated, self.compute(parameters))
+
+    def test_other_parameters(self):
+        """Test the results after changing other parameters."""
+        previous = self.compute({**self.parameters, 'mask_missing_data': False})
+        for changes in ({'use_pearson': True}, {'climatology_start': '1995'}, {'season_end': 'Sep-3'}, {'is_forecast': True}):
+            parameters = {**self.parameters, 'mask_missing_data': False, **changes}
+            self.assert_same_stats(self.compute(parameters, previous), self.compute(parameters))
+
+
+if __name__ == '__main__':
+    unittest.main()
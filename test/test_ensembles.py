@@ -0,0 +1,74 @@
+# coding=utf-8
+"""Ensembles test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+import unittest
+
+import numpy as np
+
+from qsmpgCore.engine import get_ensembles
+from qsmpgCore.structures import Dataset, TimeSeriesMatrix
+from qsmpgCore.utils import Parameters, get_ensemble, percentiles_from_values
+
+# seasons from Mar-1 to Apr-3 whose ensemble median ties with the total of
+# 2004, unless the ensembles are summed in the order of `get_ensemble`
+TIE_SEASONS = np.array([
+    [16.2, 29.5, 23.6, 2.7, 16.7, 8.4],
+    [3.1, 1.3, 2.9, 38.0, 5.3, 5.9],
+    [20.7, 7.2, 111.6, 10.2, 5.6, 61.4],
+    [18.7, 11.9, 0.0, 6.9, 2.0, 56.2],
+    [29.0, 68.3, 10.3, 1.3, 7.0, 6.1],
+])
+TIE_CURRENT_SEASON = np.array([21.5, 22.1])
+
+
+class EnsemblesTest(unittest.TestCase):
+    """Test that the ensembles are those of the per-place computation."""
+
+    def test_get_ensembles(self):
+        """Test the traces for every current season length."""
+        rng = np.random.default_rng(0)
+        seasons = np.round(rng.gamma(0.8, 25.0, (30, 20, 21)), 1)
+        for current_length in range(22):
+            current_seasons = np.round(rng.gamma(0.8, 25.0, (30, current_length)), 1)
+            ensembles = get_ensembles(np.cumsum(current_seasons, axis=1), seasons)
+            expected = [[get_ensemble(current, season) for season in place_seasons]
+                        for current, place_seasons in zip(current_seasons, seasons)]
+            np.testing.assert_array_equal(ensembles, expected, str(current_length))
+
+    def test_median_tie(self):
+        """Test the percentile of an ensemble median equal to a season total."""
+        values = np.zeros((1, 5 * 36 + 8))
+        for year, season in enumerate(TIE_SEASONS):
+            values[0, year * 36 + 6:year * 36 + 12] = season
+        values[0, -2:] = TIE_CURRENT_SEASON
+        timestamps = [f'{year}{dekad:02d}' for year in range(2001, 2006) for dekad in range(1, 37)]
+        timestamps += [f'2006{dekad:02d}' for dekad in range(1, 9)]
+        parameters = Parameters({
+            'climatology_start': '2001',
+            'climatology_end': '2005',
+            'season_start': 'Mar-1',
+            'season_end': 'Apr-3',
+            'selected_years': '3',
+        })
+        dataset = Dataset('test', TimeSeriesMatrix(values, ['P0'], timestamps), timestamps, parameters)
+        place_stats = dataset.places['P0'].place_stats
+
+        ensemble = [get_ensemble(TIE_CURRENT_SEASON, season) for season in TIE_SEASONS]
+        ensemble_median = np.median(ensemble, axis=0)
+        np.testing.assert_array_equal(place_stats['Ensemble Med.'], ensemble_median)
+        np.testing.assert_array_equal(place_stats['E. LTA'], np.average(ensemble, axis=0))
+        self.assertIn(ensemble_median[-1], TIE_SEASONS.sum(axis=1))
+        season_sums = np.cumsum(TIE_SEASONS, axis=1)[:, -1]
+        np.testing.assert_array_equal(place_stats['Ensemble Med. Pctl.'], percentiles_from_values(season_sums, [ensemble_median[-1]]))
+        self.assertEqual(place_stats['Ensemble Med. Pctl.'][0], 40)
+
+
+if __name__ == '__main__':
+    unittest.main()
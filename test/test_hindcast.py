@@ -0,0 +1,117 @@
+# coding=utf-8
+"""Hindcast test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from qsmpgCore.exporters.CSVExporter import export_hindcast_to_csv_file
+from qsmpgCore.hindcast import Hindcast, get_ranked_probability_scores
+from qsmpgCore.structures import Dataset, TimeSeriesMatrix
+from qsmpgCore.utils import Parameters
+
+from .fixtures import make_place_ids, make_rainfall
+
+YEAR_COUNT = 20
+
+
+class HindcastTest(unittest.TestCase):
+    """Test the outlooks of the past seasons."""
+
+    def setUp(self):
+        """Runs before each test."""
+        self.values, self.timestamps = make_rainfall(200, 1991, 1991 + YEAR_COUNT, last_dekad=10)
+        self.place_ids = make_place_ids(len(self.values))
+        self.parameters = {
+            'climatology_start': '1991',
+            'climatology_end': str(1990 + YEAR_COUNT),
+            'season_start': 'Mar-1',
+            'season_end': 'Oct-3',
+            'selected_years': '5',
+        }
+
+    def compute(self, **parameters):
+        """Computes the dataset."""
+        dataset = TimeSeriesMatrix(self.values, self.place_ids, self.timestamps)
+        return Dataset('test', dataset, self.timestamps, Parameters({**self.parameters, **parameters}))
+
+    def test_current_season(self):
+        """Test that an outlook is the one of a dataset ending at its
+        cut-off, with the other years as past seasons."""
+        hindcast = Hindcast(self.compute())
+        self.assertEqual(hindcast.stats['E. Probabilities'].shape, (len(self.values), YEAR_COUNT, 24, 3))
+        for year in (0, 12):
+            for cut_off in (0, 9, 23):
+                other_years = [self.values[:, i * 36:(i + 1) * 36] for i in range(YEAR_COUNT) if i != year]
+                values = np.concatenate(other_years + [self.values[:, year * 36:year * 36 + 7 + cut_off]], axis=1)
+                timestamps = [f'{1991 + i}{dekad:02d}' for i in range(YEAR_COUNT - 1) for dekad in range(1, 37)]
+                timestamps += [f'{1990 + YEAR_COUNT}{dekad:02d}' for dekad in range(1, 8 + cut_off)]
+                parameters = Parameters({**self.parameters, 'climatology_end': str(1989 + YEAR_COUNT)})
+                expected = Dataset('test', TimeSeriesMatrix(values, self.place_ids, timestamps), timestamps, parameters).stats.place_stats
+                np.testing.assert_array_equal(hindcast.stats['E. Probabilities'][:, year, cut_off], expected['E. Probabilities'])
+                np.testing.assert_array_equal(hindcast.stats['Ensemble Med.'][:, year, cut_off], expected['Ensemble Med.'][:, -1])
+                np.testing.assert_array_equal(hindcast.stats['Ensemble Med. Pctl.'][:, year, cut_off], expected['Ensemble Med. Pctl.'][:, 0])
+
+    def test_observed_terciles(self):
+        """Test the observed terciles and their scores."""
+        hindcast = Hindcast(self.compute(), ['1995', '2001'])
+        self.assertEqual(hindcast.year_ids, ['1995', '2001'])
+        self.assertTrue(np.isin(hindcast.observed_terciles, (0, 1, 2)).all())
+        # the whole season is known at the last cut-off
+        probabilities = hindcast.stats['E. Probabilities'][:, :, -1]
+        np.testing.assert_array_equal(probabilities.argmax(axis=2), hindcast.observed_terciles)
+        np.testing.assert_array_equal(hindcast.stats['RPS'][:, :, -1], 0)
+        scores = hindcast.stats['RPS']
+        self.assertTrue(((scores >= 0) & (scores <= 1)).all())
+
+    def test_ranked_probability_scores(self):
+        """Test the scores of some outlooks."""
+        probabilities = np.array([[1, 0, 0], [0, 0, 1], [1 / 3, 1 / 3, 1 / 3], [0.2, 0.3, 0.5]])
+        scores = get_ranked_probability_scores(probabilities, np.array([0, 0, 1, -1]))
+        np.testing.assert_allclose(scores, [0, 1, 1 / 9, np.nan])
+
+    def test_masked(self):
+        """Test that the invalid seasons have no outlook."""
+        self.values[:5, 36 * 3 + 10:36 * 3 + 14] = np.nan
+        dataset = self.compute(mask_missing_data=True, max_missing_periods=2)
+        hindcast = Hindcast(dataset)
+        self.assertFalse(dataset.stats.valid_seasons[:5, 3].any())
+        self.assertTrue(np.isnan(hindcast.stats['Ensemble Med.'][:5, 3]).all())
+        self.assertTrue((hindcast.observed_terciles[:5, 3] == -1).all())
+        self.assertFalse(np.isnan(hindcast.stats['Ensemble Med.'][:5, 4]).any())
+
+    def test_export(self):
+        """Test the CSV file of the outlooks."""
+        self.values[:5, 36 * 3 + 10:36 * 3 + 14] = np.nan
+        hindcast = Hindcast(self.compute(mask_missing_data=True, max_missing_periods=2), ['1994', '1995'])
+        folder = tempfile.mkdtemp()
+        try:
+            path = export_hindcast_to_csv_file(folder, hindcast, 'test')
+            self.assertEqual(os.path.basename(path), 'hindcast [test].csv')
+            table = pd.read_csv(path, dtype={'ID': str, 'Year': str, 'Sub-period': str})
+        finally:
+            shutil.rmtree(folder, ignore_errors=True)
+        self.assertEqual(len(table), len(self.values) * 2 * 24)
+        rows = table.set_index(['ID', 'Year', 'Sub-period'])
+        row = rows.loc[('P00007', '1995', hindcast.sub_period_ids[9])]
+        probabilities = hindcast.get_place_stats('P00007')['E. Probabilities'][1, 9]
+        self.assertEqual(row['Probability Below Normal'], round(probabilities[0] * 100))
+        self.assertEqual(row['Observed Tercile'], hindcast.observed_terciles[7, 1])
+        self.assertAlmostEqual(row['RPS'], hindcast.stats['RPS'][7, 1, 9], places=3)
+        unknown = rows.loc[('P00002', '1994')]
+        self.assertTrue(unknown.isna().all().all())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+# coding=utf-8
+"""Compiled kernels test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+import unittest
+
+import numpy as np
+
+from qsmpgCore import kernels
+from qsmpgCore.engine import get_ensembles
+from qsmpgCore.utils import get_similar_year_rankings
+
+
+def get_numpy_distances(current_years, year_lists, use_pearson):
+    """Computes the criteria of `kernels.similarity_distances` with NumPy."""
+    year_lists = year_lists[:, :, :current_years.shape[1]].astype(np.float64)
+    current_years = current_years[:, np.newaxis, :].astype(np.float64)
+    accumulation_differences = np.cumsum(year_lists, axis=2) - np.cumsum(current_years, axis=2)
+    distances = np.full((kernels.SIMILARITY_CRITERIA,) + year_lists.shape[:2], np.nan)
+    distances[0] = np.sum((year_lists - current_years) ** 2, axis=2)
+    distances[1] = np.sum(accumulation_differences ** 2, axis=2)
+    distances[2] = accumulation_differences[:, :, -1] ** 2
+    if use_pearson:
+        year_deviations = year_lists - year_lists.mean(axis=2, keepdims=True)
+        current_deviations = current_years - current_years.mean(axis=2, keepdims=True)
+        correlations = np.sum(year_deviations * current_deviations, axis=2) / np.sqrt(
+            np.sum(year_deviations ** 2, axis=2) * np.sum(current_deviations ** 2, axis=2))
+        distances[3] = 1 - np.clip(correlations, -1, 1) ** 2
+    return distances
+
+
+def rank_similar_years(distances, use_pearson):
+    """Ranks the years from the distances, as `get_similar_year_rankings`."""
+    sum_of_rankings = sum(np.argsort(criterion, axis=1) for criterion in distances[:3 + use_pearson])
+    return np.argsort(sum_of_rankings, axis=1)
+
+
+class KernelsTest(unittest.TestCase):
+    """Test that the kernels give the NumPy results up to rounding. The
+    kernels are run as Python code, see `CompiledKernelsTest` for the
+    compiled ones."""
+
+    def setUp(self):
+        """Runs before each test."""
+        self.rng = np.random.default_rng(0)
+
+    def get_python_kernel(self, kernel):
+        """Returns the Python version of a kernel."""
+        return kernel.py_func if kernels.is_available() else kernel
+
+    def test_similar_year_rankings(self):
+        """Test the distances and rankings for every season length and
+        precision."""
+        kernel = self.get_python_kernel(kernels.similarity_distances)
+        for length in range(1, 37):
+            for dtype in (np.float64, np.float32):
+                current_years = self.rng.gamma(0.8, 25.0, (10, length)).astype(dtype)
+                year_lists = self.rng.gamma(0.8, 25.0, (10, 20, 36)).astype(dtype)
+                for use_pearson in (False, True):
+                    message = f'{length} {dtype.__name__} {use_pearson}'
+                    with np.errstate(invalid='ignore', divide='ignore'):
+                        expected = get_numpy_distances(current_years, year_lists, use_pearson)
+                        actual = kernel(current_years, year_lists, use_pearson)
+                        np.testing.assert_allclose(actual, expected, rtol=1e-9, atol=1e-12, err_msg=message)
+                        # a correlation of 2 values is +-1, which leaves the
+                        # Pearson criterion to rounding
+                        if length > 2 or not use_pearson:
+                            expected_rankings = get_similar_year_rankings(current_years, year_lists, use_pearson)
+                            np.testing.assert_array_equal(rank_similar_years(actual, use_pearson), expected_rankings, message)
+
+    def test_empty_season(self):
+        """Test that an empty current season gives NaN distances."""
+        kernel = self.get_python_kernel(kernels.similarity_distances)
+        distances = kernel(np.empty((10, 0)), self.rng.gamma(0.8, 25.0, (10, 20, 36)), True)
+        self.assertEqual(distances.shape, (kernels.SIMILARITY_CRITERIA, 10, 20))
+        self.assertTrue(np.isnan(distances).all())
+
+    def test_ensembles(self):
+        """Test the ensembles for every current season length and precision."""
+        kernel = self.get_python_kernel(kernels.fill_ensembles)
+        for current_length in range(37):
+            for dtype in (np.float64, np.float32):
+                seasons = self.rng.gamma(0.8, 25.0, (10, 20, 36)).astype(dtype)
+                current_accumulations = np.cumsum(self.rng.gamma(0.8, 25.0, (10, current_length)), axis=1).astype(dtype)
+                expected = get_ensembles(current_accumulations, seasons)
+                actual = np.empty(seasons.shape, dtype=dtype)
+                kernel(current_accumulations, seasons, actual)
+                np.testing.assert_allclose(actual, expected, rtol=1e-6 if dtype == np.float32 else 1e-12,
+                                           err_msg=f'{current_length} {dtype.__name__}')
+
+
+@unittest.skipUnless(kernels.is_available(), 'numba is not installed')
+class CompiledKernelsTest(unittest.TestCase):
+    """Test the compiled kernels through the functions that use them."""
+
+    def setUp(self):
+        """Runs before each test."""
+        self.rng = np.random.default_rng(0)
+
+    def test_similar_year_rankings(self):
+        """Test the compiled rankings against the NumPy ones."""
+        for length in (3, 12, 36):
+            for dtype in (np.float64, np.float32):
+                current_years = self.rng.gamma(0.8, 25.0, (100, length)).astype(dtype)
+                year_lists = self.rng.gamma(0.8, 25.0, (100, 30, 36)).astype(dtype)
+                for use_pearson in (False, True):
+                    expected = get_similar_year_rankings(current_years, year_lists, use_pearson)
+                    actual = get_similar_year_rankings(current_years, year_lists, use_pearson, use_numba=True)
+                    np.testing.assert_array_equal(actual, expected, f'{length} {dtype.__name__} {use_pearson}')
+                    distances = kernels.get_similarity_distances(current_years, year_lists, use_pearson)
+                    np.testing.assert_allclose(distances, get_numpy_distances(current_years, year_lists, use_pearson),
+                                               rtol=1e-9, atol=1e-12)
+
+    def test_ensembles(self):
+        """Test the compiled ensembles against the NumPy ones."""
+        for current_length in (0, 1, 18, 36):
+            for dtype in (np.float64, np.float32):
+                seasons = self.rng.gamma(0.8, 25.0, (100, 30, 36)).astype(dtype)
+                current_accumulations = np.cumsum(self.rng.gamma(0.8, 25.0, (100, current_length)), axis=1).astype(dtype)
+                expected = get_ensembles(current_accumulations, seasons)
+                actual = get_ensembles(current_accumulations, seasons, use_numba=True)
+                self.assertEqual(actual.dtype, expected.dtype)
+                np.testing.assert_allclose(actual, expected, rtol=1e-6 if dtype == np.float32 else 1e-12)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+# coding=utf-8
+"""Normals store test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from qsmpgCore.exporters.CSVExporter import CSV_REQUIRED_STATS
+from qsmpgCore.results_cache import NormalsStore
+from qsmpgCore.structures import Dataset, TimeSeriesMatrix
+from qsmpgCore.utils import Parameters
+
+from .fixtures import make_place_ids, make_rainfall
+
+
+class NormalsStoreTest(unittest.TestCase):
+    """Test that the normals of the past seasons are reused by the following
+    dekads."""
+
+    def setUp(self):
+        """Runs before each test."""
+        self.values, self.timestamps = make_rainfall(300, 1991, 2011, missing_fraction=0.01)
+        self.parameters = {
+            'climatology_start': '1991',
+            'climatology_end': '2010',
+            'season_start': 'Mar-1',
+            'season_end': 'Oct-3',
+            'selected_years': '5',
+            'mask_missing_data': True,
+        }
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """Runs after each test."""
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def compute(self, dekads, parameters=None, required_stats=None, normals_store=None):
+        """Computes the dataset up to a dekad of 2011."""
+        column_count = 20 * 36 + dekads
+        dataset = TimeSeriesMatrix(self.values[:, :column_count].copy(), make_place_ids(len(self.values)),
+                                   self.timestamps[:column_count])
+        parameters = Parameters({**self.parameters, **(parameters or {})})
+        return Dataset('test', dataset, dataset.timestamps, parameters, required_stats, normals_store=normals_store)
+
+    def assert_same_stats(self, actual, expected):
+        """Checks that two datasets have the same statistics."""
+        for subset in ('place_stats', 'selected_years_place_stats'):
+            actual_stats = getattr(actual.stats, subset)
+            expected_stats = getattr(expected.stats, subset)
+            self.assertEqual(list(actual_stats), list(expected_stats))
+            for key in expected_stats:
+                self.assertEqual(actual_stats[key].dtype, expected_stats[key].dtype, f'{subset} {key}')
+                np.testing.assert_array_equal(actual_stats[key], expected_stats[key], f'{subset} {key}')
+
+    def test_following_dekads(self):
+        """Test that the following dekads reuse the normals."""
+        store = NormalsStore()
+        self.compute(15, normals_store=store)
+        self.assertEqual(len(store.entries), 1)
+        normals = next(iter(store.entries.values()))
+        self.assertEqual(set(normals), {'Pctls.', 'Median', 'LTA', 'Avg.', 'St. Dev.', 'Drought Severity Pctls.'})
+        for dekads in (16, 20):
+            for required_stats in (None, CSV_REQUIRED_STATS):
+                updated = self.compute(dekads, required_stats=required_stats, normals_store=store)
+                self.assertIs(updated.stats.normals, normals)
+                self.assert_same_stats(updated, self.compute(dekads, required_stats=required_stats))
+        self.assertEqual(len(store.entries), 1)
+
+    def test_float32(self):
+        """Test the normals of the float32 precision."""
+        store = NormalsStore()
+        self.compute(15, {'precision': 'float32'}, normals_store=store)
+        self.assert_same_stats(self.compute(18, {'precision': 'float32'}, normals_store=store),
+                               self.compute(18, {'precision': 'float32'}))
+
+    def test_invalidation(self):
+        """Test that other windows or past values have other normals."""
+        store = NormalsStore()
+        first = self.compute(15, normals_store=store)
+        self.compute(15, {'climatology_start': '1995'}, normals_store=store)
+        self.compute(15, {'season_end': 'Sep-3'}, normals_store=store)
+        self.assertEqual(len(store.entries), 3)
+        self.values[0, 100] += 1
+        changed = self.compute(16, normals_store=store)
+        self.assertEqual(len(store.entries), 4)
+        self.assertIsNot(changed.stats.normals, first.stats.normals)
+        self.assert_same_stats(changed, self.compute(16))
+
+    def test_folder(self):
+        """Test that the stored normals are restored by another store."""
+        first_store = NormalsStore(folder=self.folder)
+        self.compute(15, required_stats=CSV_REQUIRED_STATS, normals_store=first_store)
+        # the archives are written in the background
+        first_store.writer.wait()
+        store = NormalsStore(folder=self.folder)
+        updated = self.compute(16, normals_store=store)
+        self.assertEqual(list(updated.stats.normals), ['Pctls.'])
+        self.assert_same_stats(updated, self.compute(16))
+        # the normals that were missing are added to the stored ones
+        store.writer.wait()
+        restored = NormalsStore(folder=self.folder)
+        self.assertEqual(set(restored.load(store.get_key(updated))), set(store.entries[store.get_key(updated)]))
+        store.clear_folder()
+        self.assertIsNone(NormalsStore(folder=self.folder).load(store.get_key(updated)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+# coding=utf-8
+"""Parallel computation test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from qsmpgCore import parallel
+from qsmpgCore.engine import BLOCK_PLACES
+from qsmpgCore.parallel import DIALOG_EXECUTOR, find_python_executable, get_process_pool
+from qsmpgCore.structures import Dataset
+from qsmpgCore.utils import Parameters
+
+from .fixtures import make_rainfall_dataset
+
+
+class ParallelTest(unittest.TestCase):
+    """Test that the thread and process executors give the serial results."""
+
+    def setUp(self):
+        """Runs before each test."""
+        self.dataset = make_rainfall_dataset(BLOCK_PLACES + 100, 1991, 2011, last_dekad=20)
+        self.parameters = {
+            'climatology_start': '1991',
+            'climatology_end': '2010',
+            'season_start': 'Mar-1',
+            'season_end': 'Oct-3',
+            'selected_years': '5',
+        }
+
+    def compare_executors(self, parameters):
+        """Computes the dataset with every executor and compares the results."""
+        reference = Dataset('test', self.dataset, self.dataset.timestamps, Parameters(parameters))
+        for executor in ('thread', 'process'):
+            parallel = Dataset('test', self.dataset, self.dataset.timestamps,
+                               Parameters({**parameters, 'executor': executor, 'max_workers': 2}))
+            for key in ('similar_indexes', 'selected_indexes', 'climatology_indexes', 'seasonal_accumulations',
+                        'seasonal_ensembles'):
+                np.testing.assert_array_equal(getattr(parallel.stats, key), getattr(reference.stats, key))
+            for subset in ('place_stats', 'selected_years_place_stats'):
+                reference_stats = getattr(reference.stats, subset)
+                parallel_stats = getattr(parallel.stats, subset)
+                self.assertEqual(list(parallel_stats), list(reference_stats))
+                for key in reference_stats:
+                    np.testing.assert_array_equal(parallel_stats[key], reference_stats[key], f'{executor} {subset} {key}')
+
+    def test_executors(self):
+        """Test the statistics of a complete dataset."""
+        self.compare_executors(self.parameters)
+
+    def test_masked_executors(self):
+        """Test the statistics of a dataset with gaps in the masked mode."""
+        rng = np.random.default_rng(1)
+        values = self.dataset.values
+        values[rng.random(values.shape) < 0.01] = np.nan
+        self.compare_executors({**self.parameters, 'mask_missing_data': True})
+
+    def test_unknown_executor(self):
+        """Test that an unknown executor is rejected."""
+        with self.assertRaises(ValueError):
+            Dataset('test', self.dataset, self.dataset.timestamps, Parameters({**self.parameters, 'executor': 'gpu'}))
+
+    def test_dialog_executor(self):
+        """Test that the computations of the dialog never start processes."""
+        self.assertEqual(DIALOG_EXECUTOR, 'thread')
+        parameters = Parameters({**self.parameters, 'executor': DIALOG_EXECUTOR, 'max_workers': 2})
+        with mock.patch.object(parallel, 'get_process_pool', side_effect=AssertionError('a process pool was started')):
+            dataset = Dataset('test', self.dataset, self.dataset.timestamps, parameters)
+        self.assertEqual(dataset.stats.similar_indexes.shape[0], len(self.dataset.place_ids))
+
+    def test_embedded_interpreter(self):
+        """Test that the workers of an embedded interpreter are run by the
+        Python installation, or not started at all."""
+        folder = tempfile.mkdtemp()
+        try:
+            with mock.patch.object(sys, 'executable', os.path.join(folder, 'bin', 'qgis')), \
+                 mock.patch.object(sys, 'exec_prefix', folder):
+                self.assertIsNone(find_python_executable())
+                with self.assertRaises(RuntimeError):
+                    get_process_pool(2)
+                with self.assertRaises(RuntimeError):
+                    Dataset('test', self.dataset, self.dataset.timestamps,
+                            Parameters({**self.parameters, 'executor': 'process', 'max_workers': 2}))
+                os.makedirs(os.path.join(folder, 'bin'))
+                interpreter = os.path.join(folder, 'bin', 'python3')
+                open(interpreter, 'w').close()
+                self.assertEqual(find_python_executable(), interpreter)
+        finally:
+            shutil.rmtree(folder, ignore_errors=True)
+        self.assertEqual(find_python_executable(), sys.executable)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+# coding=utf-8
+"""Percentiles test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+import unittest
+
+import numpy as np
+import scipy.stats as sp
+
+from qsmpgCore.percentiles import DROUGHT_SEVERITY_PERCENTILES, SortedSamples, search_sorted
+
+PERCENTILES = DROUGHT_SEVERITY_PERCENTILES + (0, 50, 99.5, 100)
+
+
+class PercentilesTest(unittest.TestCase):
+    """Test the percentiles of many samples against NumPy and SciPy."""
+
+    def setUp(self):
+        """Runs before each test."""
+        self.rng = np.random.default_rng(0)
+
+    def make_samples(self, length, place_count=200):
+        """Returns samples of integers, so they have many ties."""
+        return self.rng.integers(0, 8, (place_count, length)).astype(np.float64)
+
+    def test_search_sorted(self):
+        """Test the binary search of each row."""
+        for length in range(0, 12):
+            sorted_values = np.sort(self.make_samples(length), axis=1)
+            counts = self.rng.integers(0, length + 1, len(sorted_values))
+            scores = self.rng.integers(-1, 9, (len(sorted_values), 3)).astype(np.float64)
+            for side in ('left', 'right'):
+                expected = [np.searchsorted(row[:count], row_scores, side) for row, count, row_scores in zip(sorted_values, counts, scores)]
+                np.testing.assert_array_equal(search_sorted(sorted_values, counts, scores, side), expected, f'{length} {side}')
+
+    def test_values_at(self):
+        """Test the values at percentiles, with ties."""
+        for length in range(1, 41):
+            values = self.make_samples(length) + self.rng.random((200, 1))
+            expected = np.percentile(values, PERCENTILES, axis=1).T
+            np.testing.assert_array_equal(SortedSamples(values).values_at(PERCENTILES), expected, str(length))
+
+    def test_percentiles_of(self):
+        """Test the percentile ranks of scores in the samples and between
+        their values, with the kind of the per-place computation."""
+        for length in range(1, 41):
+            values = self.make_samples(length)
+            scores = self.rng.integers(-1, 9, (200, 4)) + self.rng.choice([0, 0.5], (200, 4))
+            expected = [sp.percentileofscore(row, row_scores, kind='rank') for row, row_scores in zip(values, scores)]
+            np.testing.assert_array_equal(SortedSamples(values).percentiles_of(scores), expected, str(length))
+
+    def test_nan(self):
+        """Test that a NaN value or score gives NaN, unless the NaN are
+        padding."""
+        values = self.make_samples(20)
+        values[:50, 3] = np.nan
+        values[50:60] = np.nan
+        scores = self.rng.integers(0, 8, (200, 2)).astype(np.float64)
+        scores[100:110, 1] = np.nan
+
+        samples = SortedSamples(values)
+        with np.errstate(invalid='ignore'):
+            np.testing.assert_array_equal(samples.values_at(PERCENTILES), np.percentile(values, PERCENTILES, axis=1).T)
+        expected = [sp.percentileofscore(row, row_scores, kind='rank') for row, row_scores in zip(values, scores)]
+        np.testing.assert_array_equal(samples.percentiles_of(scores), expected)
+
+        padded = SortedSamples(values, ignore_nan=True)
+        with np.errstate(invalid='ignore'), self.assertWarns(RuntimeWarning):
+            expected = np.nanpercentile(values, PERCENTILES, axis=1).T
+        np.testing.assert_array_equal(padded.values_at(PERCENTILES), expected)
+        expected = [sp.percentileofscore(row[~np.isnan(row)], row_scores, kind='rank') if not np.isnan(row).all() else [np.nan] * 2
+                    for row, row_scores in zip(values, scores)]
+        np.testing.assert_array_equal(padded.percentiles_of(scores), expected)
+
+    def test_without(self):
+        """Test that leaving a value out of the samples gives the samples
+        of the other values."""
+        values = self.make_samples(20)
+        values[:50, 3] = np.nan
+        values[50:60, 1:] = np.nan
+        removed = ~np.isnan(values[:, 0]) & (self.rng.random(200) < 0.7)
+        samples = SortedSamples(values, ignore_nan=True).without(values[:, 0], removed)
+        other_values = values.copy()
+        other_values[removed, 0] = np.nan
+        expected = SortedSamples(other_values, ignore_nan=True)
+        np.testing.assert_array_equal(samples.sorted_values, expected.sorted_values)
+        np.testing.assert_array_equal(samples.counts, expected.counts)
+        np.testing.assert_array_equal(samples.invalid, expected.invalid)
+
+    def test_empty(self):
+        """Test the samples with no values."""
+        samples = SortedSamples(np.empty((3, 0)))
+        self.assertTrue(np.isnan(samples.values_at(PERCENTILES)).all())
+        self.assertTrue(np.isnan(samples.percentiles_of(np.ones(3))).all())
+        samples = SortedSamples(np.full((3, 5), np.nan), ignore_nan=True)
+        np.testing.assert_array_equal(samples.counts, 0)
+        self.assertTrue(np.isnan(samples.values_at(PERCENTILES)).all())
+        self.assertTrue(np.isnan(samples.percentiles_of(np.ones(3))).all())
+
+
+if __name__ == '__main__':
+    unittest.main()
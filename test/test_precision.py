@@ -0,0 +1,80 @@
+# coding=utf-8
+"""Reduced precision computation test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+import unittest
+
+import numpy as np
+
+from qsmpgCore.structures import Dataset
+from qsmpgCore.utils import Parameters
+
+from .fixtures import make_rainfall_dataset
+
+# statistics that count years, which can move one year when a value is
+# (nearly) tied with another one
+RANK_STATS = ('Current Season Pctl.', 'Ensemble Med. Pctl.', 'E. Probabilities')
+
+
+class PrecisionTest(unittest.TestCase):
+    """Test that the float32 mode stays close to the float64 results."""
+
+    def setUp(self):
+        """Runs before each test."""
+        self.dataset = make_rainfall_dataset(500, 1981, 2011, last_dekad=20)
+        # the selected years are fixed, since the rankings of similar years
+        # can swap years whose distances are (nearly) tied
+        self.parameters = {
+            'climatology_start': '1981',
+            'climatology_end': '2010',
+            'season_start': 'Jan-1',
+            'season_end': 'Dec-3',
+            'selected_years': ['1985', '1990', '1999', '2004', '2008'],
+        }
+
+    def compare_stats(self, parameters):
+        """Computes the dataset in both precisions and bounds the differences."""
+        reference = Dataset('test', self.dataset, self.dataset.timestamps, Parameters(parameters))
+        reduced = Dataset('test', self.dataset, self.dataset.timestamps,
+                          Parameters({**parameters, 'precision': 'float32'}))
+        self.assertEqual(reduced.values.dtype, np.float32)
+        self.assertEqual(reduced.stats.seasonal_accumulations.dtype, np.float32)
+
+        for subset in ('place_stats', 'selected_years_place_stats'):
+            reference_stats = getattr(reference.stats, subset)
+            reduced_stats = getattr(reduced.stats, subset)
+            year_count = 30 if subset == 'place_stats' else 5
+            for key in reference_stats:
+                if key == 'forecast':
+                    continue
+                expected = np.asarray(reference_stats[key], dtype=np.float64)
+                actual = np.asarray(reduced_stats[key], dtype=np.float64)
+                if key in RANK_STATS:
+                    step = 1 / year_count if key == 'E. Probabilities' else 100 / year_count
+                    tolerance = step * (1 + 1e-9)
+                else:
+                    tolerance = 1e-5 * np.maximum(np.abs(expected), 1)
+                difference = np.abs(actual - expected)
+                self.assertTrue(np.all((difference <= tolerance) | (np.isnan(expected) & np.isnan(actual))),
+                                f'{subset} {key} differs by up to {np.nanmax(difference)}')
+
+    def test_float32_stats(self):
+        """Test the statistics of a complete dataset."""
+        self.compare_stats(self.parameters)
+
+    def test_float32_masked_stats(self):
+        """Test the statistics of a dataset with gaps in the masked mode."""
+        rng = np.random.default_rng(1)
+        values = self.dataset.values
+        values[rng.random(values.shape) < 0.01] = np.nan
+        self.compare_stats({**self.parameters, 'mask_missing_data': True})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+# coding=utf-8
+"""Place statistics regression test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+import os
+import unittest
+
+import numpy as np
+
+from qsmpgCore.structures import Dataset, TimeSeriesMatrix
+from qsmpgCore.utils import Parameters
+
+# statistics of each place saved with the per-place `Place.get_stats`, before
+# the statistics were computed for all places at once
+FIXTURE_PATH = os.path.join(os.path.dirname(__file__), 'per_place_stats.npz')
+
+CALENDAR = {
+    'climatology_start': '1991',
+    'climatology_end': '2006',
+    'season_start': 'Mar-1',
+    'season_end': 'Sep-3',
+    'selected_years': '5',
+}
+CASES = {
+    'calendar': CALENDAR,
+    'pearson': {**CALENDAR, 'use_pearson': True},
+    'forecast': {**CALENDAR, 'is_forecast': True},
+    'selected_years': {**CALENDAR, 'selected_years': ['1993', '1997', '2001', '2004']},
+    'cross_years': {
+        'cross_years': True,
+        'climatology_start': '1991-1992',
+        'climatology_end': '2005-2006',
+        'season_start': 'Oct-1',
+        'season_end': 'May-3',
+        'selected_years': '6',
+        'use_pearson': True,
+    },
+}
+
+
+class RegressionTest(unittest.TestCase):
+    """Test that the statistics are those of the per-place computation."""
+
+    @classmethod
+    def setUpClass(cls):
+        """Runs before the tests."""
+        with np.load(FIXTURE_PATH) as fixture:
+            cls.fixture = dict(fixture)
+
+    def check_case(self, case):
+        """Compares the places of a case with the saved statistics."""
+        values = self.fixture['values']
+        timestamps = self.fixture['timestamps'].tolist()
+        place_ids = [f'P{i}' for i in range(len(values))]
+        dataset = Dataset('test', TimeSeriesMatrix(values, place_ids, timestamps), timestamps, Parameters(CASES[case]))
+        places = [dataset.places[place_id] for place_id in place_ids]
+        expected_keys = {key.split('/', 1)[1] for key in self.fixture if key.startswith(f'{case}/')}
+        actual_keys = {'similar_seasons'}
+
+        np.testing.assert_array_equal([place.similar_seasons for place in places], self.fixture[f'{case}/similar_seasons'])
+        for subset in ('place_stats', 'selected_years_place_stats'):
+            for stat in getattr(places[0], subset):
+                actual_keys.add(f'{subset}/{stat}')
+                actual = [getattr(place, subset)[stat] for place in places]
+                if stat == 'forecast':
+                    actual = [[np.nan if value is None else value for value in row] for row in actual]
+                np.testing.assert_array_equal(np.array(actual, dtype=float), self.fixture[f'{case}/{subset}/{stat}'],
+                                              f'{case} {subset} {stat}')
+        for subset in ('seasonal_stats', 'selected_years_seasonal_stats'):
+            stats = [getattr(place, subset) for place in places]
+            actual_keys.add(f'{subset}/years')
+            for stat in stats[0]:
+                actual_keys.add(f'{subset}/{stat}')
+                np.testing.assert_array_equal([list(place_stats[stat]) for place_stats in stats],
+                                              self.fixture[f'{case}/{subset}/years'], f'{case} {subset} {stat}')
+                np.testing.assert_array_equal([[value for _, value in place_stats[stat].items()] for place_stats in stats],
+                                              self.fixture[f'{case}/{subset}/{stat}'], f'{case} {subset} {stat}')
+        self.assertEqual(actual_keys, expected_keys)
+
+    def test_calendar(self):
+        """Test a season within a calendar year, with the RMSE similar years."""
+        self.check_case('calendar')
+
+    def test_pearson(self):
+        """Test the similar years with the Pearson correlation."""
+        self.check_case('pearson')
+
+    def test_forecast(self):
+        """Test a dataset whose last value is a forecast."""
+        self.check_case('forecast')
+
+    def test_selected_years(self):
+        """Test explicitly selected years."""
+        self.check_case('selected_years')
+
+    def test_cross_years(self):
+        """Test a season over two calendar years."""
+        self.check_case('cross_years')
+
+
+if __name__ == '__main__':
+    unittest.main()
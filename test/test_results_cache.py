@@ -0,0 +1,108 @@
+# coding=utf-8
+"""Results cache test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from qsmpgCore.exporters.CSVExporter import CSV_REQUIRED_STATS
+from qsmpgCore.exporters.WebExporter import WEB_REQUIRED_STATS
+from qsmpgCore.results_cache import ResultsCache
+from qsmpgCore.structures import Dataset
+from qsmpgCore.utils import Parameters
+
+from .fixtures import make_rainfall_dataset
+
+
+class ResultsCacheTest(unittest.TestCase):
+    """Test the reuse of computed datasets."""
+
+    def setUp(self):
+        """Runs before each test."""
+        self.dataset = make_rainfall_dataset(300, 1991, 2011, last_dekad=20)
+        self.parameters = {
+            'climatology_start': '1991',
+            'climatology_end': '2010',
+            'season_start': 'Mar-1',
+            'season_end': 'Oct-3',
+            'selected_years': '5',
+            'is_forecast': True,
+        }
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """Runs after each test."""
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def get_dataset(self, cache, parameters, required_stats=None):
+        """Returns the dataset computed or reused by a cache."""
+        return cache.get_dataset('test', self.dataset, self.dataset.timestamps, Parameters(parameters), required_stats)
+
+    def assert_same_stats(self, actual):
+        """Checks that a dataset has the statistics of a full computation."""
+        expected = Dataset('test', self.dataset, self.dataset.timestamps, Parameters(self.parameters))
+        for subset in ('place_stats', 'selected_years_place_stats'):
+            expected_stats = getattr(expected.stats, subset)
+            for key, value in getattr(actual.stats, subset).items():
+                np.testing.assert_array_equal(value, expected_stats[key], f'{subset} {key}')
+        np.testing.assert_array_equal(actual.stats.selected_indexes, expected.stats.selected_indexes)
+
+    def test_output_parameters(self):
+        """Test that the output parameters do not change the key."""
+        cache = ResultsCache()
+        dataset = self.get_dataset(cache, self.parameters, CSV_REQUIRED_STATS)
+        output_parameters = {**self.parameters, 'output_web': False, 'output_images': True, 'mapping_attributes': ['LTA']}
+        reused = cache.get_dataset('reused', self.dataset, self.dataset.timestamps, Parameters(output_parameters), CSV_REQUIRED_STATS)
+        self.assertIs(reused.stats, dataset.stats)
+        self.assertEqual((reused.name, reused.parameters.mapping_attributes), ('reused', ['LTA']))
+        self.assertIs(reused.places['P00000'].parent, reused)
+        # the earlier result keeps its name and parameters
+        self.assertEqual((dataset.name, dataset.parameters.mapping_attributes), ('test', Parameters(self.parameters).mapping_attributes))
+        self.assertIs(dataset.places['P00000'].parent, dataset)
+        self.assertIsNot(self.get_dataset(cache, {**self.parameters, 'selected_years': '6'}, CSV_REQUIRED_STATS).stats, dataset.stats)
+
+    def test_missing_stats(self):
+        """Test that a request with more statistics computes both requests."""
+        cache = ResultsCache()
+        dataset = self.get_dataset(cache, self.parameters, CSV_REQUIRED_STATS)
+        widened = self.get_dataset(cache, self.parameters, WEB_REQUIRED_STATS)
+        self.assertIsNot(widened.stats, dataset.stats)
+        self.assertIs(self.get_dataset(cache, self.parameters, CSV_REQUIRED_STATS).stats, widened.stats)
+        self.assertTrue(set(dataset.stats.place_stats) <= set(widened.stats.place_stats))
+        self.assert_same_stats(widened)
+
+    def test_folder(self):
+        """Test that the stored statistics are restored by another cache."""
+        cache = ResultsCache(folder=self.folder)
+        self.get_dataset(cache, self.parameters)
+        # the archives are written in the background
+        cache.writer.wait()
+        restored = self.get_dataset(ResultsCache(folder=self.folder), self.parameters, CSV_REQUIRED_STATS)
+        self.assertEqual(restored.stats.required_stats.sub_periods, None)
+        self.assert_same_stats(restored)
+        cache.clear_folder()
+        self.assertEqual(os.listdir(self.folder), [])
+        self.assertIsNone(ResultsCache(folder=self.folder).load(next(iter(cache.entries))))
+
+    def test_max_bytes(self):
+        """Test that the least recently used datasets are dropped."""
+        cache = ResultsCache()
+        first = self.get_dataset(cache, self.parameters)
+        cache.max_bytes = cache.entries[next(iter(cache.entries))][1] * 3 // 2
+        self.get_dataset(cache, {**self.parameters, 'selected_years': '6'})
+        self.assertEqual(len(cache.entries), 1)
+        self.assertIsNot(self.get_dataset(cache, self.parameters).stats, first.stats)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,145 @@
+# coding=utf-8
+"""Dataset update test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from qsmpgCore.engine import BatchedStats
+from qsmpgCore.exporters.CSVExporter import CSV_REQUIRED_STATS
+from qsmpgCore.results_cache import NormalsStore
+from qsmpgCore.structures import Dataset, TimeSeriesMatrix
+from qsmpgCore.utils import Parameters, parse_timestamps
+
+from .fixtures import make_place_ids, make_rainfall
+
+
+class UpdateTest(unittest.TestCase):
+    """Test that an updated dataset has the results of a full computation."""
+
+    def setUp(self):
+        """Runs before each test."""
+        self.values, self.timestamps = make_rainfall(300, 1991, 2012, missing_fraction=0.01)
+        self.place_ids = make_place_ids(len(self.values))
+        self.parameters = {
+            'climatology_start': '1991',
+            'climatology_end': '2010',
+            'season_start': 'Mar-1',
+            'season_end': 'Oct-3',
+            'selected_years': '5',
+        }
+
+    def make_dataset(self, column_count):
+        """Returns the data up to a column."""
+        return TimeSeriesMatrix(self.values[:, :column_count].copy(), self.place_ids, self.timestamps[:column_count])
+
+    def append(self, dataset, column_count):
+        """Appends the next columns to the data."""
+        start = len(dataset.timestamps)
+        dataset.append_columns(self.values[:, start:start + column_count], self.timestamps[start:start + column_count])
+
+    def assert_same_stats(self, actual, expected):
+        """Checks that two datasets have the same results."""
+        self.assertEqual(actual.timestamps, expected.timestamps)
+        self.assertEqual(actual.timestamp_properties, parse_timestamps(expected.timestamps))
+        self.assertEqual(actual.properties.__dict__, expected.properties.__dict__)
+        np.testing.assert_array_equal(actual.values, expected.values)
+        for key in ('similar_indexes', 'selected_indexes', 'current_accumulations', 'seasonal_ensembles'):
+            np.testing.assert_array_equal(getattr(actual.stats, key), getattr(expected.stats, key))
+        for subset in ('place_stats', 'selected_years_place_stats'):
+            actual_stats = getattr(actual.stats, subset)
+            expected_stats = getattr(expected.stats, subset)
+            self.assertEqual(list(actual_stats), list(expected_stats))
+            for key in expected_stats:
+                if expected_stats[key].dtype != object:
+                    self.assertEqual(actual_stats[key].dtype, expected_stats[key].dtype, f'{subset} {key}')
+                    np.testing.assert_array_equal(actual_stats[key], expected_stats[key], f'{subset} {key}')
+
+    def check_updates(self, parameters, start, column_counts, required_stats=None):
+        """Updates a dataset with some columns at a time and compares it with
+        a full computation after each update."""
+        parameters = Parameters({**self.parameters, **parameters})
+        data = self.make_dataset(start)
+        dataset = Dataset('test', data, data.timestamps, parameters, required_stats)
+        places = dataset.places
+        for column_count in column_counts:
+            self.append(data, column_count)
+            dataset.update(data)
+            self.assertIs(dataset.places, places)
+            self.assert_same_stats(dataset, Dataset('test', data, data.timestamps, parameters, required_stats))
+        return dataset, data
+
+    def test_dekads(self):
+        """Test the updates with one or more new dekads."""
+        self.check_updates({}, 21 * 36 + 8, (1, 1, 3))
+        self.check_updates({'precision': 'float32', 'is_forecast': True}, 21 * 36 + 8, (1, 2), CSV_REQUIRED_STATS)
+
+    def test_masked(self):
+        """Test that the gaps of the new dekads are filled."""
+        self.values[:10, 21 * 36 + 9] = np.nan
+        dataset, _ = self.check_updates({'mask_missing_data': True}, 21 * 36 + 8, (1, 1))
+        self.assertFalse(np.isnan(dataset.values[:10, -1]).any())
+
+    def test_cross_years(self):
+        """Test the updates over the end of a calendar year."""
+        parameters = {
+            'cross_years': True,
+            'climatology_start': '1991-1992',
+            'climatology_end': '2009-2010',
+            'season_start': 'Oct-1',
+            'season_end': 'May-3',
+        }
+        self.check_updates(parameters, 20 * 36 + 34, (1, 2, 1))
+
+    def test_normals(self):
+        """Test that the updates reuse the climatology years and the
+        normals instead of computing them again."""
+        parameters = Parameters(self.parameters)
+        store = NormalsStore()
+        data = self.make_dataset(21 * 36 + 8)
+        dataset = Dataset('test', data, data.timestamps, parameters, normals_store=store)
+        self.assertEqual((store.hits, store.misses), (0, 1))
+        normals = store.entries[dataset.normals_key]
+        climatology_indexes = dataset.stats.climatology_indexes
+        with mock.patch.object(BatchedStats, 'get_drought_severity_normals', side_effect=AssertionError):
+            for hits in (1, 2):
+                self.append(data, 1)
+                dataset.update(data, store)
+                self.assertEqual((store.hits, store.misses), (hits, 1))
+                self.assertIs(dataset.stats.climatology_indexes, climatology_indexes)
+                for name, value in normals.items():
+                    self.assertIs(dataset.stats.normals[name], value, name)
+        self.assert_same_stats(dataset, Dataset('test', data, data.timestamps, parameters))
+
+        # without a store, the first update computes the normals at every
+        # sub-period for the following ones
+        data = self.make_dataset(21 * 36 + 8)
+        dataset = Dataset('test', data, data.timestamps, parameters)
+        with mock.patch.object(BatchedStats, 'get_drought_severity_normals', autospec=True,
+                               side_effect=BatchedStats.get_drought_severity_normals) as get_normals:
+            for _ in range(3):
+                self.append(data, 1)
+                dataset.update(data)
+        self.assertEqual(get_normals.call_count, 1)
+        self.assert_same_stats(dataset, Dataset('test', data, data.timestamps, parameters))
+
+    def test_new_season(self):
+        """Test that a new season is not an update."""
+        dataset, data = self.check_updates({}, 20 * 36 + 34, (2,))
+        self.append(data, 1)
+        with self.assertRaises(ValueError):
+            dataset.update(data)
+        with self.assertRaises(ValueError):
+            dataset.update(self.make_dataset(20 * 36 + 10))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+# coding=utf-8
+"""Data quality scan test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from qsmpgCore.parsers.CSVParser import parse_csv
+from qsmpgCore.structures import TimeSeriesMatrix
+from qsmpgCore.validation import scan_dataset
+
+
+class ScanDatasetTest(unittest.TestCase):
+    """Test the issues found in a dataset."""
+
+    def setUp(self):
+        """Runs before each test."""
+        rng = np.random.default_rng(0)
+        # starts at the 5th dekad, so the years are split
+        self.timestamps = [f'{year}{dekad:02d}' for year in range(2001, 2021) for dekad in range(1, 37)][4:-3]
+        self.values = np.round(rng.gamma(0.8, 25.0, (5, len(self.timestamps))), 1)
+
+    def scan(self, **kwargs):
+        """Scans the values."""
+        dataset = TimeSeriesMatrix(self.values, [f'P{i}' for i in range(len(self.values))], self.timestamps)
+        return scan_dataset(dataset, **kwargs)
+
+    def test_clean(self):
+        """Test a dataset with no issues."""
+        report = self.scan(return_mask=True)
+        self.assertFalse(report.has_issues)
+        self.assertEqual(report.place_count, 5)
+        self.assertEqual(report.summary(), '')
+        self.assertFalse(report.mask.any())
+
+    def test_issues(self):
+        """Test the missing, negative and implausible values."""
+        self.values[1, 10:12] = np.nan
+        self.values[2, 40:44] = np.nan
+        self.values[3, -1] = np.nan
+        self.values[4, 7] = -1
+        self.values[0, 50] = 5000
+        report = self.scan(return_mask=True)
+        self.assertTrue(report.has_issues)
+        self.assertEqual(report.missing_count, 7)
+        self.assertEqual(report.missing_place_ids, ['P1', 'P2', 'P3'])
+        self.assertEqual(report.missing_run_place_ids, ['P2'])
+        self.assertEqual(report.truncated_place_ids, ['P3'])
+        self.assertEqual((report.negative_count, report.negative_place_ids), (1, ['P4']))
+        self.assertEqual((report.outlier_count, report.outlier_place_ids), (1, ['P0']))
+        self.assertFalse(report.has_duplicates)
+        self.assertEqual(len(report.summary().splitlines()), 5)
+        expected_mask = np.isnan(self.values) | (self.values < 0) | (self.values == 5000)
+        np.testing.assert_array_equal(report.mask, expected_mask)
+        self.assertEqual(self.scan(max_missing_run=2).missing_run_place_ids, ['P1', 'P2'])
+
+    def test_duplicates(self):
+        """Test that the places merged by the parser are reported."""
+        folder = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(folder, 'dataset.csv')
+            with open(filename, 'w') as csv_file:
+                csv_file.write(','.join(['ID'] + self.timestamps) + '\n')
+                for place_id, row in zip(['1', '2', '1', '3', '2'], self.values):
+                    csv_file.write(','.join([place_id] + [str(value) for value in row]) + '\n')
+            report = scan_dataset(parse_csv(filename, use_cache=False))
+        finally:
+            shutil.rmtree(folder, ignore_errors=True)
+        self.assertEqual(report.place_count, 3)
+        self.assertTrue(report.has_duplicates)
+        self.assertTrue(report.has_issues)
+        self.assertEqual(report.summary(), 'Duplicated place IDs were merged while parsing.')
+
+
+if __name__ == '__main__':
+    unittest.main()